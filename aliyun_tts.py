@@ -3,12 +3,15 @@ from dashscope.audio.tts_v2 import SpeechSynthesizer, ResultCallback, AudioForma
 from pathlib import Path
 import tempfile
 import io
-from typing import Literal, Union, Dict
+from typing import Literal, Union, Dict, Tuple
 from pydub import AudioSegment
+from metrics import observe_synthesis
 
 class AliyunCosyVoiceTTS:
     """阿里云 CosyVoice TTS API 封装类"""
     
+    engine_name = "aliyun"
+    
     def __init__(self, api_key: str):
         """
         初始化 TTS 客户端
@@ -16,6 +19,7 @@ class AliyunCosyVoiceTTS:
         Args:
             api_key: 阿里云API密钥
         """
+        self.api_key = api_key
         dashscope.api_key = api_key
         
         # 阿里云音色列表
@@ -50,6 +54,52 @@ class AliyunCosyVoiceTTS:
         }
         return format_map.get(format_str, AudioFormat.WAV_22050HZ_MONO_16BIT)  # 默认使用22.05kHz WAV格式
         
+    @observe_synthesis
+    def synthesize(
+        self,
+        text: str,
+        voice_name: str = "longxiaochun_v2",
+        model: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "wav",
+        speed: float = 1.0,
+        gain: float = 0.0,
+        stream: bool = False
+    ) -> Tuple[bytes, str]:
+        """
+        将文本转换为语音，直接返回音频数据
+
+        Args:
+            参数含义同 text_to_speech
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 音频格式)
+        """
+        # 参数验证和调整
+        if not (0.5 <= speed <= 2.0):
+            speed = max(0.5, min(speed, 2.0))  # 限制在阿里云支持范围内
+        
+        # 将gain转换为volume (0-100)
+        volume = int(min(max((gain + 1.0) * 50, 0), 100))
+        
+        # 获取正确的音频格式
+        audio_format = self._get_audio_format(response_format)
+            
+        # 实例化合成器
+        synthesizer = SpeechSynthesizer(
+            model=self.model, 
+            voice=voice_name,
+            format=audio_format,  # 使用AudioFormat枚举值
+            speech_rate=speed,        # 语速参数
+            volume=volume     # 音量参
+        )
+        
+        # 调用同步API
+        audio_data = synthesizer.call(text)
+        
+        # PCM 为 22.05kHz，见 _get_audio_format
+        actual_format = "pcm_22050" if response_format == "pcm" else response_format
+        return audio_data, actual_format
+        
     def text_to_speech(
         self,
         text: str,
@@ -80,28 +130,10 @@ class AliyunCosyVoiceTTS:
                 - 第二个元素是str类型，表示实际的音频格式（'mp3'或'wav'等）
         """
         try:
-            # 参数验证和调整
-            if not (0.5 <= speed <= 2.0):
-                speed = max(0.5, min(speed, 2.0))  # 限制在阿里云支持范围内
-            
-            # 将gain转换为volume (0-100)
-            volume = int(min(max((gain + 1.0) * 50, 0), 100))
-            
-            # 获取正确的音频格式
-            audio_format = self._get_audio_format(response_format)
-                
-            # 实例化合成器
-            synthesizer = SpeechSynthesizer(
-                model=self.model, 
-                voice=voice_name,
-                format=audio_format,  # 使用AudioFormat枚举值
-                speech_rate=speed,        # 语速参数
-                volume=volume     # 音量参
+            audio_data, _ = self.synthesize(
+                text, voice_name, model, response_format, speed, gain, stream
             )
             
-            # 调用同步API
-            audio_data = synthesizer.call(text)
-            
             # 写入文件
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -11,6 +11,7 @@ import json
 import time
 import asyncio
 import sys
+from contextlib import asynccontextmanager
 
 from pydub import AudioSegment
 import tempfile
@@ -19,6 +20,19 @@ import os
 from config_manager import config_manager, AppConfig, SettingsResponse  # 添加新的导入
 from tts_factory import TTSFactory
 from multiTTS import DialogueTTS
+from synthesis import synthesis_pool, asynthesize_segment, get_engine_name
+from http_clients import http_clients
+from segment_cache import segment_cache
+from llm_cache import llm_cache
+from rate_limiter import rate_limiter
+from hedging import hedging_policy
+from voice_catalog import voice_catalog
+import audio_encoder
+from executors import run_blocking, loop_lag_monitor
+import metrics
+import tracing
+from render_jobs import render_job_manager, STATUS_DONE
+from audio_stream import wav_stream_header, segment_to_pcm, silence_pcm, WAV_STREAM_MEDIA_TYPE
 from story_converter import StoryConverter
 from translator import Translator
 from elevenlabs_tts import ElevenLabsTTS # <-- 新增导入用于类型检查
@@ -34,14 +48,33 @@ def get_base_path():
 
 BASE_DIR = get_base_path()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享连接池、事件循环延迟监控、渲染任务队列和音色目录刷新，关闭时释放"""
+    http_clients.open()
+    loop_lag_monitor.start()
+    await render_job_manager.start()
+    voice_catalog.start()
+    yield
+    await voice_catalog.stop()
+    await render_job_manager.stop()
+    await loop_lag_monitor.stop()
+    await http_clients.aclose()
+    await story_converter.aclose()
+    synthesis_pool.shutdown(wait=False)
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="AIGossipPodcast - AI狗血故事播客生成器",
     description="专门用于将八卦、狗血故事转换成生动播客对话的AI工具",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS 设置
+# 记录每个请求各阶段耗时，通过 Server-Timing 响应头返回
+app.add_middleware(tracing.ServerTimingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -70,6 +103,10 @@ class TextToSpeechRequest(BaseModel):
     tts_engine: str = config_manager.get_config().DEFAULT_TTS_ENGINE
     stability: Optional[float] = None  # ElevenLabs 参数
     similarity_boost: Optional[float] = None  # ElevenLabs 参数
+    parallel: bool = True  # 是否并行合成各行
+    stream: bool = False  # 是否边合成边返回音频流
+    output_format: str = "wav"  # 输出格式：wav、mp3、opus、flac、aac（流式模式始终为 wav）
+    bitrate: Optional[str] = None  # 有损格式的码率，如 "192k"，不传时使用该格式的默认码率
 
     @validator('speed')
     def validate_speed(cls, v):
@@ -83,6 +120,16 @@ class TextToSpeechRequest(BaseModel):
             raise ValueError("ElevenLabs 参数必须在 0.0 到 1.0 之间")
         return v
 
+    @validator('output_format')
+    def validate_output_format(cls, v):
+        audio_encoder.check_output_formats([v])
+        return v
+
+    @validator('bitrate')
+    def validate_bitrate(cls, v):
+        audio_encoder.check_bitrate(v)
+        return v
+
 class DialogueRequest(BaseModel):
     dialogue_text: str
     host_voice: str = "anna"
@@ -96,6 +143,11 @@ class DialogueRequest(BaseModel):
     host_similarity_boost: Optional[float] = None  # ElevenLabs 主持人参数
     guest_stability: Optional[float] = None  # ElevenLabs 嘉宾参数
     guest_similarity_boost: Optional[float] = None  # ElevenLabs 嘉宾参数
+    parallel: bool = True  # 是否并行合成各片段
+    stream: bool = False  # 是否边合成边返回音频流
+    output_format: str = "wav"  # 输出格式：wav、mp3、opus、flac、aac（流式模式始终为 wav）
+    bitrate: Optional[str] = None  # 有损格式的码率，如 "192k"，不传时使用该格式的默认码率
+    extra_formats: List[str] = []  # 后台渲染任务在同一次拼接中额外输出的格式，如 WAV 母带之外再输出 MP3
 
     @validator('host_speed', 'guest_speed')
     def validate_speed(cls, v):
@@ -109,13 +161,79 @@ class DialogueRequest(BaseModel):
             raise ValueError("ElevenLabs 参数必须在 0.0 到 1.0 之间")
         return v
 
+    @validator('output_format')
+    def validate_output_format(cls, v):
+        audio_encoder.check_output_formats([v])
+        return v
+
+    @validator('bitrate')
+    def validate_bitrate(cls, v):
+        audio_encoder.check_bitrate(v)
+        return v
+
+    @validator('extra_formats')
+    def validate_extra_formats(cls, v):
+        audio_encoder.check_output_formats(v)
+        return v
+
 class StoryRequest(BaseModel):
     story_text: str
     custom_prompt: Optional[str] = None
     use_stream: bool = True
+    use_cache: Optional[bool] = None  # 传 false 时跳过 LLM 响应缓存
+    long_mode: Optional[bool] = None  # 长故事是否分段转换，不传时使用 LONG_STORY_SETTINGS
+
+class StoryAudioRequest(BaseModel):
+    """故事到音频流水线请求：LLM 生成脚本的同时合成音频"""
+    story_text: str
+    custom_prompt: Optional[str] = None
+    use_cache: Optional[bool] = None  # 传 false 时跳过 LLM 响应缓存
+    long_mode: Optional[bool] = None  # 长故事是否分段转换，不传时使用 LONG_STORY_SETTINGS
+    host_voice: str = "anna"
+    guest_voice: str = "alex"
+    host_speed: float = 1.0
+    guest_speed: float = 1.0
+    silence_duration: int = 600
+    host_tts_engine: str = config_manager.get_config().DEFAULT_TTS_ENGINE
+    guest_tts_engine: str = config_manager.get_config().DEFAULT_TTS_ENGINE
+    host_stability: Optional[float] = None  # ElevenLabs 主持人参数
+    host_similarity_boost: Optional[float] = None  # ElevenLabs 主持人参数
+    guest_stability: Optional[float] = None  # ElevenLabs 嘉宾参数
+    guest_similarity_boost: Optional[float] = None  # ElevenLabs 嘉宾参数
+    output_format: str = "wav"  # 输出格式：wav、mp3、opus、flac、aac
+    bitrate: Optional[str] = None  # 有损格式的码率，如 "192k"
+    extra_formats: List[str] = []  # 同一次拼接中额外输出的格式
+
+    @validator('host_speed', 'guest_speed')
+    def validate_speed(cls, v):
+        if not (0.25 <= v <= 4.0):
+            raise ValueError("语速必须在 0.25 到 4.0 之间")
+        return v
+
+    @validator('host_stability', 'host_similarity_boost', 'guest_stability', 'guest_similarity_boost')
+    def validate_elevenlabs_params(cls, v):
+        if v is not None and not (0.0 <= v <= 1.0):
+            raise ValueError("ElevenLabs 参数必须在 0.0 到 1.0 之间")
+        return v
+
+    @validator('output_format')
+    def validate_output_format(cls, v):
+        audio_encoder.check_output_formats([v])
+        return v
+
+    @validator('bitrate')
+    def validate_bitrate(cls, v):
+        audio_encoder.check_bitrate(v)
+        return v
+
+    @validator('extra_formats')
+    def validate_extra_formats(cls, v):
+        audio_encoder.check_output_formats(v)
+        return v
 
 class TranslationRequest(BaseModel):
     text_to_translate: str
+    chunked: Optional[bool] = None  # 是否分块并行翻译，不传时使用 TRANSLATION_SETTINGS
 
 # 路由定义
 @app.get("/", response_class=HTMLResponse)
@@ -124,10 +242,149 @@ async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/api/voices")
-async def get_voices(engine: str = config_manager.get_config().DEFAULT_TTS_ENGINE):
-    """获取指定TTS引擎的音色列表"""
-    voices = TTSFactory.get_voices_for_ui(engine)
-    return voices
+async def get_voices(request: Request, engine: Optional[str] = None):
+    """获取指定TTS引擎的音色列表（预设、账号和自定义音色），支持 If-None-Match 条件请求"""
+    engine = engine or config_manager.get_config().DEFAULT_TTS_ENGINE
+    voices, etag = voice_catalog.get(engine)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(voices, headers=headers)
+
+@app.post("/api/voices/refresh")
+async def refresh_voices():
+    """立即刷新各服务商账号下的音色"""
+    await voice_catalog.refresh()
+    return voice_catalog.stats()
+
+@app.get("/api/segment_cache")
+async def get_segment_cache_stats():
+    """获取TTS片段缓存的命中统计"""
+    return segment_cache.stats()
+
+@app.get("/api/llm_cache")
+async def get_llm_cache_stats():
+    """获取故事转换 LLM 响应缓存的命中统计"""
+    return llm_cache.stats()
+
+@app.get("/api/rate_limits")
+async def get_rate_limits():
+    """获取各引擎（按 API Key）当前的并发上限、令牌余量和限流次数"""
+    return rate_limiter.stats()
+
+@app.get("/api/hedging")
+async def get_hedging_stats():
+    """获取各引擎的请求耗时分位数、当前对冲阈值以及对冲和切换备用引擎的次数"""
+    return hedging_policy.stats()
+
+@app.get("/api/loop_stats")
+async def get_loop_stats():
+    """获取事件循环延迟统计（毫秒），用于确认并发渲染时事件循环仍保持响应"""
+    return loop_lag_monitor.stats()
+
+def collect_runtime_metrics() -> List[metrics.Sample]:
+    """把各模块已有的统计（缓存、事件循环延迟、限流、对冲、任务队列）转换为指标"""
+    samples = []
+    # 同名指标的所有样本放在一组，HELP/TYPE 只能出现一次
+    cache_stats = [("segment", segment_cache.stats()), ("llm", llm_cache.stats())]
+    for name, kind, documentation, key in (
+        ("cache_hits_total", "counter", "Cache hits", "hits"),
+        ("cache_misses_total", "counter", "Cache misses", "misses"),
+        ("cache_hit_ratio", "gauge", "Cache hit ratio since start", "hit_ratio"),
+        ("cache_size_bytes", "gauge", "Cache size on disk", "size_bytes"),
+    ):
+        samples.append((name, kind, documentation, [
+            ({"cache": cache_name}, stats[key]) for cache_name, stats in cache_stats
+        ]))
+
+    loop_stats = loop_lag_monitor.stats()
+    samples.append(("event_loop_lag_seconds", "gauge", "Event loop lag (current, p50, p99, max)", [
+        ({"stat": name}, loop_stats[f"{name}_ms"] / 1000) for name in ("current", "p50", "p99", "max")
+    ]))
+
+    limiters = rate_limiter.stats()["limiters"]
+    samples.extend([
+        ("tts_rate_limit_concurrency", "gauge", "Current adaptive concurrency limit per engine and API key", [
+            ({"engine": s["engine"], "key_id": s["key_id"]}, s["concurrency_limit"]) for s in limiters
+        ]),
+        ("tts_rate_limit_waiting", "gauge", "Requests waiting for a rate limiter slot", [
+            ({"engine": s["engine"], "key_id": s["key_id"]}, s["waiting"]) for s in limiters
+        ]),
+        ("tts_retries_total", "counter", "TTS requests retried after throttling or transient errors", [
+            ({"engine": s["engine"], "key_id": s["key_id"]}, s["retries"]) for s in limiters
+        ]),
+    ])
+
+    hedging = hedging_policy.stats()
+    for name in ("hedges", "hedge_wins", "hedges_skipped", "failovers"):
+        samples.append((f"tts_{name}_total", "counter", f"TTS {name.replace('_', ' ')}", [
+            ({"engine": engine}, stats[name]) for engine, stats in hedging.items()
+        ]))
+
+    samples.extend([
+        ("render_queue_depth", "gauge", "Render jobs waiting in the queue", [({}, render_job_manager.queue_depth)]),
+        ("render_jobs_running", "gauge", "Render jobs currently running", [({}, render_job_manager.running)]),
+    ])
+    return samples
+
+metrics.registry.register_collector(collect_runtime_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    """以 Prometheus 文本格式输出指标"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+def build_basic_params(request: TextToSpeechRequest, lines: List[str]) -> List[Dict]:
+    """为基础模式的每一行构建 TTS 参数"""
+    params_list = []
+    for line in lines:
+        # 构建 TTS 参数
+        tts_params = {
+            "text": line,
+            "voice_name": request.voice,
+            "speed": request.speed,
+            "response_format": "wav"
+        }
+        
+        # 如果是 ElevenLabs，添加特有参数
+        if request.tts_engine == "elevenlabs":
+            if request.stability is not None:
+                tts_params["stability"] = request.stability
+            if request.similarity_boost is not None:
+                tts_params["similarity_boost"] = request.similarity_boost
+        
+        params_list.append(tts_params)
+    return params_list
+
+async def stream_basic_audio(current_tts, params_list: List[Dict], parallel: bool) -> AsyncGenerator[bytes, None]:
+    """基础模式流式输出：按行顺序边合成边发送WAV数据"""
+    engine_name = get_engine_name(current_tts)
+    segment_tasks = [
+        synthesis_pool.create_task(engine_name, asynthesize_segment, current_tts, tts_params)
+        for tts_params in params_list
+    ] if parallel else []
+    try:
+        yield wav_stream_header()
+        for i, tts_params in enumerate(params_list):
+            if parallel:
+                audio_segment = await segment_tasks[i]
+            else:
+                audio_segment = await asynthesize_segment(current_tts, tts_params)
+            if audio_segment is None:
+                # 响应头已发送，无法再返回错误状态，用静音占位
+                print(f"流式转换失败，使用静音代替：{tts_params['text']}")
+                audio_segment = AudioSegment.silent(duration=500)
+            if i > 0:
+                yield silence_pcm(500)
+            yield await run_blocking(segment_to_pcm, audio_segment)
+    finally:
+        for task in segment_tasks:
+            task.cancel()
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
 
 @app.post("/convert")
 async def convert(request: TextToSpeechRequest):
@@ -137,64 +394,68 @@ async def convert(request: TextToSpeechRequest):
         if not lines:
             raise HTTPException(status_code=400, detail="文本内容不能为空")
         
+        current_tts = TTSFactory.create_tts(request.tts_engine)
+        params_list = build_basic_params(request, lines)
+        
+        # 流式模式：前面的行合成完成后立即开始发送音频
+        if request.stream:
+            return StreamingResponse(
+                stream_basic_audio(current_tts, params_list, request.parallel),
+                media_type=WAV_STREAM_MEDIA_TYPE,
+                headers=STREAM_HEADERS
+            )
+        
         # 创建命名临时文件
-        temp_final = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
+        output_ext = audio_encoder.extension(request.output_format)
+        temp_final = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{output_ext}')
         temp_final.close()
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            audio_segments = []
-            current_tts = TTSFactory.create_tts(request.tts_engine)
-            
-            for i, line in enumerate(lines):
-                temp_file = os.path.join(temp_dir, f'temp_{i}.wav')
-                
-                # 构建 TTS 参数
-                tts_params = {
-                    "text": line,
-                    "output_path": temp_file,
-                    "voice_name": request.voice,
-                    "speed": request.speed,
-                    "response_format": "wav"
-                }
-                
-                # 如果是 ElevenLabs，添加特有参数
-                if request.tts_engine == "elevenlabs":
-                    if request.stability is not None:
-                        tts_params["stability"] = request.stability
-                    if request.similarity_boost is not None:
-                        tts_params["similarity_boost"] = request.similarity_boost
-                
-                # --- 新增：修正 ElevenLabs 的音色参数名 ---
-                if isinstance(current_tts, ElevenLabsTTS) and 'voice_name' in tts_params:
-                    tts_params['voice_id'] = tts_params.pop('voice_name')
-                # --- 新增结束 ---
-                
-                success = current_tts.text_to_speech(**tts_params)
-                
-                if not success:
-                    os.unlink(temp_final.name)  # 清理临时文件
-                    raise HTTPException(status_code=500, detail=f"转换失败：{line}")
-                
-                audio_segment = AudioSegment.from_wav(temp_file)
-                audio_segments.append(audio_segment)
+        engine_name = get_engine_name(current_tts)
+        segment_tasks = []
+        exporter = None
+        try:
+            segment_tasks = [
+                synthesis_pool.create_task(engine_name, asynthesize_segment, current_tts, tts_params)
+                for tts_params in params_list
+            ] if request.parallel else []
             
-            silence = AudioSegment.silent(duration=500)
-            final_audio = audio_segments[0]
-            for segment in audio_segments[1:]:
-                final_audio += silence + segment
+            # 按原始行顺序收集结果，每完成一行就送入编码器
+            exporter = await run_blocking(
+                audio_encoder.MultiFormatExporter, [(temp_final.name, request.output_format)], request.bitrate
+            )
+            with tracing.span("synthesize", segments=len(lines)):
+                for i, (line, tts_params) in enumerate(zip(lines, params_list)):
+                    if request.parallel:
+                        audio_segment = await segment_tasks[i]
+                    else:
+                        audio_segment = await asynthesize_segment(current_tts, tts_params)
+                    if audio_segment is None:
+                        raise HTTPException(status_code=500, detail=f"转换失败：{line}")
+                    if i > 0:
+                        await run_blocking(exporter.add_silence, 500)
+                    await run_blocking(exporter.add_segment, audio_segment)
             
-            final_audio.export(temp_final.name, format="wav")
+            with tracing.span("export"):
+                await run_blocking(exporter.close)
+        except BaseException:
+            # 任何失败（包括客户端断开导致的取消）都要取消仍在进行的合成任务并清理临时文件
+            for pending in segment_tasks:
+                pending.cancel()
+            if exporter is not None:
+                await run_blocking(exporter.abort)
+            Path(temp_final.name).unlink(missing_ok=True)
+            raise
             
         return FileResponse(
             path=temp_final.name,
-            media_type="audio/wav",
-            filename="combined_audio.wav",
+            media_type=audio_encoder.media_type(request.output_format),
+            filename=f"combined_audio.{output_ext}",
             background=BackgroundTask(os.unlink, temp_final.name)
         )
             
+    except HTTPException:
+        raise
     except Exception as e:
-        if 'temp_final' in locals():
-            os.unlink(temp_final.name)
         print(f"Error in convert: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -206,37 +467,171 @@ async def convert_dialogue(request: DialogueRequest):
         guest_tts = TTSFactory.create_tts(request.guest_tts_engine)
         dialogue_tts = DialogueTTS(host_tts, guest_tts)
         
+        # 流式模式：按脚本顺序边合成边发送音频
+        if request.stream:
+            tasks = dialogue_tts.prepare_segments(
+                request.dialogue_text,
+                host_voice=request.host_voice,
+                guest_voice=request.guest_voice,
+                host_speed=request.host_speed,
+                guest_speed=request.guest_speed
+            )
+            return StreamingResponse(
+                dialogue_tts.stream_dialogue_audio(
+                    tasks,
+                    silence_duration=request.silence_duration,
+                    parallel=request.parallel
+                ),
+                media_type=WAV_STREAM_MEDIA_TYPE,
+                headers=STREAM_HEADERS
+            )
+        
         # 创建命名临时文件
-        temp_final = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
+        output_ext = audio_encoder.extension(request.output_format)
+        temp_final = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{output_ext}')
         temp_final.close()
         
-        success = dialogue_tts.generate_dialogue_audio(
+        success = await dialogue_tts.generate_dialogue_audio_async(
             dialogue_text=request.dialogue_text,
             output_path=temp_final.name,
             host_voice=request.host_voice,
             guest_voice=request.guest_voice,
             host_speed=request.host_speed,
             guest_speed=request.guest_speed,
-            silence_duration=request.silence_duration
+            silence_duration=request.silence_duration,
+            parallel=request.parallel,
+            output_format=request.output_format,
+            bitrate=request.bitrate
         )
         
         if not success:
-            os.unlink(temp_final.name)
+            if os.path.exists(temp_final.name):
+                os.unlink(temp_final.name)
             raise HTTPException(status_code=500, detail="生成对谈音频失败")
             
         return FileResponse(
             path=temp_final.name,
-            media_type="audio/wav",
-            filename="dialogue_audio.wav",
+            media_type=audio_encoder.media_type(request.output_format),
+            filename=f"dialogue_audio.{output_ext}",
             background=BackgroundTask(os.unlink, temp_final.name)
         )
             
     except Exception as e:
-        if 'temp_final' in locals():
+        if 'temp_final' in locals() and os.path.exists(temp_final.name):
             os.unlink(temp_final.name)
         print(f"Error in convert_dialogue: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """渲染任务的对外表示（不包含原始请求内容）"""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "completed": job["completed"],
+        "total": job["total"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "timings": job["timings"],
+        "formats": [job["request"].get("output_format", "wav")] + list(job["request"].get("extra_formats") or []),
+        "events_url": f"/api/jobs/{job['id']}/events",
+        "download_url": f"/api/jobs/{job['id']}/download",
+        "script_url": f"/api/jobs/{job['id']}/script" if job["kind"] == "story" else None
+    }
+
+def get_job_or_404(job_id: str) -> Dict[str, Any]:
+    job = render_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+@app.post("/api/jobs/dialogue")
+async def create_dialogue_job(request: DialogueRequest):
+    """提交后台对谈音频渲染任务，立即返回任务ID"""
+    if not request.dialogue_text.strip():
+        raise HTTPException(status_code=400, detail="对话内容不能为空")
+    job = render_job_manager.submit("dialogue", request.dict(exclude={"stream"}))
+    return job_response(job)
+
+@app.post("/api/jobs/story")
+async def create_story_job(request: StoryAudioRequest):
+    """
+    提交故事到音频的流水线任务，立即返回任务ID
+
+    LLM 每写完一句 [主持人]/[嘉宾] 对话就立即开始合成，进度中的 total 会随脚本生成不断增加。
+    """
+    if not request.story_text.strip():
+        raise HTTPException(status_code=400, detail="故事内容不能为空")
+    job = render_job_manager.submit("story", request.dict())
+    return job_response(job)
+
+@app.get("/api/jobs")
+async def list_jobs(limit: int = 50):
+    """列出最近的渲染任务"""
+    return [job_response(job) for job in render_job_manager.list(limit)]
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """获取渲染任务状态"""
+    return job_response(get_job_or_404(job_id))
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """以 SSE 推送渲染任务进度：parsed、synthesizing(N/M)、assembling、done/failed"""
+    get_job_or_404(job_id)
+
+    async def event_generator():
+        async for event in render_job_manager.events(job_id):
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        metrics.track_connection("job_events", event_generator()),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.get("/api/jobs/{job_id}/download")
+async def download_job(job_id: str, format: Optional[str] = None):
+    """下载渲染完成的音频，format 可选任务的主输出格式或 extra_formats 中的格式"""
+    job = get_job_or_404(job_id)
+    if job["status"] != STATUS_DONE:
+        raise HTTPException(status_code=409, detail=f"任务尚未完成，当前状态: {job['status']}")
+    formats = job_response(job)["formats"]
+    if format is not None and format not in formats:
+        raise HTTPException(status_code=404, detail=f"任务没有 {format} 格式的输出，可选 {', '.join(formats)}")
+    fmt = format or formats[0]
+    output_path = render_job_manager.output_path(job, fmt) if format else Path(job["output_path"])
+    if not output_path.exists():
+        raise HTTPException(status_code=410, detail="输出文件已被删除")
+    return FileResponse(
+        path=str(output_path),
+        media_type=audio_encoder.media_type(fmt),
+        filename=f"dialogue_{job_id}{output_path.suffix}"
+    )
+
+@app.get("/api/jobs/{job_id}/script")
+async def get_job_script(job_id: str):
+    """获取故事任务生成的对话脚本"""
+    job = get_job_or_404(job_id)
+    script_path = render_job_manager.directory / f"{job['id']}.txt"
+    if not script_path.exists():
+        raise HTTPException(status_code=404, detail="脚本尚未生成")
+    return FileResponse(path=str(script_path), media_type="text/plain; charset=utf-8")
+
+@app.delete("/api/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """删除已结束的渲染任务及其输出文件"""
+    get_job_or_404(job_id)
+    if not render_job_manager.delete(job_id):
+        raise HTTPException(status_code=409, detail="任务仍在执行中，无法删除")
+    return {"success": True}
+
 # SSE连接端点
 @app.get("/convert_story")
 async def convert_story_connection():
@@ -255,7 +650,7 @@ async def convert_story_connection():
             print("SSE connection closed")
     
     return StreamingResponse(
-        event_generator(),
+        metrics.track_connection("convert_story", event_generator()),
         media_type="text/event-stream",
         headers={
             'Cache-Control': 'no-cache',
@@ -273,7 +668,9 @@ async def convert_story_process(request: StoryRequest):
             # 非流式模式
             result = await story_converter.convert_story_async(
                 story_text=request.story_text,
-                custom_prompt=request.custom_prompt
+                custom_prompt=request.custom_prompt,
+                use_cache=request.use_cache,
+                long_mode=request.long_mode
             )
             return result
         else:
@@ -286,7 +683,9 @@ async def convert_story_process(request: StoryRequest):
                     
                     async for content in story_converter.convert_story_stream(
                         story_text=request.story_text,
-                        custom_prompt=request.custom_prompt
+                        custom_prompt=request.custom_prompt,
+                        use_cache=request.use_cache,
+                        long_mode=request.long_mode
                     ):
                         if content.strip():
                             yield f"data: {json.dumps({'content': content})}\n\n"
@@ -300,7 +699,7 @@ async def convert_story_process(request: StoryRequest):
                     yield f"data: {json.dumps({'error': error_msg})}\n\n"
             
             return StreamingResponse(
-                generate(),
+                metrics.track_connection("convert_story", generate()),
                 media_type="text/event-stream",
                 headers={
                     'Cache-Control': 'no-cache',
@@ -333,7 +732,7 @@ async def translate_script_stream(request: TranslationRequest):
             yield f"data: {json.dumps({'status': 'start'})}\n\n" 
 
             chunk_count = 0
-            async for content_chunk in translator.translate_stream(request.text_to_translate):
+            async for content_chunk in translator.translate_stream(request.text_to_translate, request.chunked):
                 chunk_count += 1
                 print(f"TRANSLATE STREAM: Received chunk {chunk_count}: {content_chunk[:50]}...")
                 yield f"data: {json.dumps({'content': content_chunk})}\n\n"
@@ -347,7 +746,7 @@ async def translate_script_stream(request: TranslationRequest):
             yield f"data: {json.dumps({'error': error_msg})}\n\n"
 
     return StreamingResponse(
-        generate_translation(),
+        metrics.track_connection("translate_script", generate_translation()),
         media_type="text/event-stream",
         headers={
             'Cache-Control': 'no-cache',
@@ -369,7 +768,8 @@ async def get_settings():
 async def save_settings(updated_settings: AppConfig):
     """保存新的设置"""
     try:
-        current_config = config_manager.get_config()
+        # 在副本上修改，正在进行的渲染仍使用旧配置
+        current_config = config_manager.get_config().copy(deep=True)
         
         # 处理 API Keys：只更新非空的值
         for key, value in updated_settings.API_KEYS.dict().items():
@@ -379,7 +779,11 @@ async def save_settings(updated_settings: AppConfig):
         # 更新其他设置
         current_config.DEFAULT_TTS_ENGINE = updated_settings.DEFAULT_TTS_ENGINE
         current_config.DEFAULT_VOICES = updated_settings.DEFAULT_VOICES
-        current_config.ELEVENLABS_SETTINGS = updated_settings.ELEVENLABS_SETTINGS
+        elevenlabs_settings = updated_settings.ELEVENLABS_SETTINGS
+        if "pcm_sample_rate" not in elevenlabs_settings.__fields_set__:
+            # 设置页面没有采样率选项，保留配置文件中的值
+            elevenlabs_settings.pcm_sample_rate = current_config.ELEVENLABS_SETTINGS.pcm_sample_rate
+        current_config.ELEVENLABS_SETTINGS = elevenlabs_settings
         current_config.MODELS = updated_settings.MODELS
         
         config_manager.update_config(current_config)
@@ -0,0 +1,258 @@
+import re
+import time
+import wave
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pydub import AudioSegment
+from audio_stream import STREAM_FRAME_RATE, STREAM_CHANNELS, STREAM_SAMPLE_WIDTH, segment_to_pcm, silence_pcm
+
+# 支持的最终输出格式：格式名 -> FFmpeg 编码参数、扩展名、媒体类型、默认码率
+OUTPUT_FORMATS: Dict[str, Dict[str, Any]] = {
+    "wav": {"extension": "wav", "media_type": "audio/wav", "codec": None, "container": None, "bitrate": None},
+    "mp3": {"extension": "mp3", "media_type": "audio/mpeg", "codec": "libmp3lame", "container": "mp3", "bitrate": "128k"},
+    # Opus 只支持 48kHz 等少数采样率，编码前由 FFmpeg 重采样
+    "opus": {"extension": "opus", "media_type": "audio/ogg", "codec": "libopus", "container": "ogg", "bitrate": "64k", "args": ["-ar", "48000"]},
+    "flac": {"extension": "flac", "media_type": "audio/flac", "codec": "flac", "container": "flac", "bitrate": None},
+    "aac": {"extension": "aac", "media_type": "audio/aac", "codec": "aac", "container": "adts", "bitrate": "128k"}
+}
+
+def ffmpeg_available() -> bool:
+    """是否安装了 FFmpeg（除 wav 外的格式都需要）"""
+    return shutil.which("ffmpeg") is not None
+
+def check_output_formats(formats: List[str]):
+    """
+    检查输出格式是否受支持、当前环境能否编码
+
+    Raises:
+        ValueError: 不支持的格式，或需要 FFmpeg 但未安装
+    """
+    for fmt in formats:
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {fmt}，可选 {', '.join(OUTPUT_FORMATS)}")
+        if OUTPUT_FORMATS[fmt]["codec"] and not ffmpeg_available():
+            raise ValueError(f"输出 {fmt} 格式需要安装 FFmpeg")
+
+def check_bitrate(bitrate: Optional[str]):
+    """
+    检查码率格式，如 "64k"、"192k"
+
+    Raises:
+        ValueError: 格式不正确
+    """
+    if bitrate is not None and not re.fullmatch(r"\d{2,3}k", bitrate):
+        raise ValueError(f"码率格式不正确: {bitrate}，应为如 128k")
+
+def media_type(fmt: str) -> str:
+    """输出格式对应的媒体类型"""
+    return OUTPUT_FORMATS[fmt]["media_type"]
+
+def extension(fmt: str) -> str:
+    """输出格式对应的文件扩展名（不含点）"""
+    return OUTPUT_FORMATS[fmt]["extension"]
+
+class StreamingEncoder:
+    """
+    增量编码器：PCM 数据边写入边编码
+
+    wav 直接用 wave 模块写入文件；其他格式启动一个 FFmpeg 子进程，
+    PCM 从标准输入逐块送入，编码与后续片段的合成、拼接同时进行，
+    不需要先在内存中拼出整段音频。
+    """
+
+    def __init__(
+        self,
+        output_path: Union[str, Path],
+        fmt: str = "wav",
+        bitrate: Optional[str] = None,
+        frame_rate: int = STREAM_FRAME_RATE,
+        channels: int = STREAM_CHANNELS,
+        sample_width: int = STREAM_SAMPLE_WIDTH
+    ):
+        """
+        打开输出文件或启动 FFmpeg
+
+        Args:
+            output_path: 输出文件路径
+            fmt: 输出格式，见 OUTPUT_FORMATS
+            bitrate: 码率，如 "192k"，为空时使用该格式的默认码率（wav、flac 忽略）
+            frame_rate: 输入PCM的采样率
+            channels: 输入PCM的声道数
+            sample_width: 输入PCM的采样宽度(字节)
+        """
+        check_output_formats([fmt])
+        self.output_path = Path(output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.format = fmt
+        self.bytes_written = 0
+        self._wav: Optional[wave.Wave_write] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr = None
+
+        spec = OUTPUT_FORMATS[fmt]
+        if spec["codec"] is None:
+            self._wav = wave.open(str(self.output_path), "wb")
+            self._wav.setnchannels(channels)
+            self._wav.setsampwidth(sample_width)
+            self._wav.setframerate(frame_rate)
+            return
+
+        command = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", f"s{sample_width * 8}le", "-ar", str(frame_rate), "-ac", str(channels), "-i", "pipe:0",
+            "-c:a", spec["codec"]
+        ]
+        command += spec.get("args", [])
+        if spec["bitrate"]:
+            command += ["-b:a", bitrate or spec["bitrate"]]
+        command += ["-f", spec["container"], str(self.output_path)]
+        # 错误输出写入临时文件，避免管道写满后阻塞 FFmpeg
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr
+        )
+
+    def _error_output(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", errors="replace").strip()
+
+    def write(self, pcm: bytes):
+        """写入一块PCM数据"""
+        if self._wav is not None:
+            self._wav.writeframes(pcm)
+        else:
+            try:
+                self._process.stdin.write(pcm)
+            except BrokenPipeError:
+                self._process.wait()
+                raise RuntimeError(f"FFmpeg 编码 {self.format} 失败: {self._error_output()}")
+        self.bytes_written += len(pcm)
+
+    def close(self):
+        """
+        结束写入并等待编码完成
+
+        Raises:
+            RuntimeError: FFmpeg 编码失败
+        """
+        if self._wav is not None:
+            self._wav.close()  # 关闭时回填WAV头中的长度
+            return
+        self._process.stdin.close()
+        returncode = self._process.wait()
+        error = self._error_output()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"FFmpeg 编码 {self.format} 失败: {error}")
+
+    def abort(self):
+        """放弃编码并删除不完整的输出文件"""
+        try:
+            if self._wav is not None:
+                self._wav.close()
+            else:
+                self._process.kill()
+                self._process.wait()
+                self._stderr.close()
+        except Exception:
+            pass
+        self.output_path.unlink(missing_ok=True)
+
+class MultiFormatExporter:
+    """
+    一次拼接、同时输出多种格式
+
+    每追加一段（add_segment / add_silence）就立即送入各编码器，
+    例如同时生成 WAV 母带和用于分发的 MP3，PCM 只需转换一次，内存中也不保留整段音频。
+    编码器启动时就要确定PCM格式，因此输出固定为 44.1kHz 单声道 16bit（与流式输出一致），
+    各片段先重采样为该格式，不会因为第一个片段的采样率较低（如合成失败时的占位静音）而降低整段音质。
+    """
+
+    def __init__(
+        self,
+        outputs: List[Tuple[Union[str, Path], str]],
+        bitrate: Optional[str] = None,
+        frame_rate: int = STREAM_FRAME_RATE,
+        channels: int = STREAM_CHANNELS,
+        sample_width: int = STREAM_SAMPLE_WIDTH
+    ):
+        """
+        启动所有编码器
+
+        Args:
+            outputs: (输出路径, 格式) 列表
+            bitrate: 有损格式的码率，为空时使用各格式的默认码率
+            frame_rate: 输出采样率
+            channels: 输出声道数
+            sample_width: 输出采样宽度(字节)
+        """
+        if not outputs:
+            raise ValueError("至少需要一个输出")
+        check_output_formats([fmt for _, fmt in outputs])
+        # (采样率, 声道数, 采样宽度)
+        self.pcm_format: Tuple[int, int, int] = (frame_rate, channels, sample_width)
+        self.encoders: List[StreamingEncoder] = []
+        try:
+            for output_path, fmt in outputs:
+                self.encoders.append(StreamingEncoder(output_path, fmt, bitrate, *self.pcm_format))
+        except Exception:
+            self.abort()
+            raise
+        self.segments = 0
+        self.stats: Dict[str, Any] = {}
+        self._started = time.perf_counter()
+
+    def write(self, pcm: bytes):
+        """将一块PCM数据（格式见 pcm_format）写入所有编码器"""
+        for encoder in self.encoders:
+            encoder.write(pcm)
+
+    def add_segment(self, segment: AudioSegment):
+        """追加一个音频片段，先转换为输出格式"""
+        self.write(segment_to_pcm(segment, *self.pcm_format))
+        self.segments += 1
+
+    def add_silence(self, duration: int):
+        """追加指定时长(毫秒)的静音"""
+        if duration > 0:
+            self.write(silence_pcm(duration, *self.pcm_format))
+
+    def close(self) -> Dict[str, Any]:
+        """
+        结束所有编码器并等待编码完成
+
+        Returns:
+            Dict: 片段数、时长和各输出文件的大小
+        """
+        try:
+            for encoder in self.encoders:
+                encoder.close()
+        except Exception:
+            self.abort()
+            raise
+        total_bytes = self.encoders[0].bytes_written
+        frame_rate, channels, sample_width = self.pcm_format
+        self.stats = {
+            "segments": self.segments,
+            "duration_seconds": total_bytes / (frame_rate * channels * sample_width),
+            "frame_rate": frame_rate,
+            "export_seconds": time.perf_counter() - self._started,
+            "outputs": {
+                encoder.format: {"path": str(encoder.output_path), "bytes": encoder.output_path.stat().st_size}
+                for encoder in self.encoders
+            }
+        }
+        sizes = ", ".join(f"{fmt} {item['bytes'] / 1024 / 1024:.1f} MB" for fmt, item in self.stats["outputs"].items())
+        print(
+            f"音频导出完成: {self.segments} 个片段, "
+            f"时长 {self.stats['duration_seconds']:.1f} 秒, {sizes}"
+        )
+        return self.stats
+
+    def abort(self):
+        """放弃所有编码并删除不完整的输出文件"""
+        for encoder in self.encoders:
+            encoder.abort()
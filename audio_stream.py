@@ -0,0 +1,64 @@
+import struct
+from pydub import AudioSegment
+
+# 流式输出统一使用的PCM格式（44.1kHz 单声道 16bit）
+STREAM_FRAME_RATE = 44100
+STREAM_CHANNELS = 1
+STREAM_SAMPLE_WIDTH = 2
+
+WAV_STREAM_MEDIA_TYPE = "audio/wav"
+
+# 流式WAV头中未知长度字段的占位值，播放器会一直读到连接结束
+_UNKNOWN_SIZE = 0xFFFFFFFF
+
+def wav_stream_header(
+    frame_rate: int = STREAM_FRAME_RATE,
+    channels: int = STREAM_CHANNELS,
+    sample_width: int = STREAM_SAMPLE_WIDTH
+) -> bytes:
+    """
+    生成长度不定的WAV文件头
+
+    RIFF 和 data 块的长度字段填为最大值，浏览器和大多数播放器
+    会将其视为流式数据，边接收边播放。
+
+    Args:
+        frame_rate: 采样率
+        channels: 声道数
+        sample_width: 采样宽度(字节)
+
+    Returns:
+        bytes: 44字节的WAV文件头
+    """
+    byte_rate = frame_rate * channels * sample_width
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", _UNKNOWN_SIZE, b"WAVE",
+        b"fmt ", 16, 1, channels, frame_rate, byte_rate, block_align, sample_width * 8,
+        b"data", _UNKNOWN_SIZE
+    )
+
+def segment_to_pcm(
+    segment: AudioSegment,
+    frame_rate: int = STREAM_FRAME_RATE,
+    channels: int = STREAM_CHANNELS,
+    sample_width: int = STREAM_SAMPLE_WIDTH
+) -> bytes:
+    """将任意格式的音频片段转换为指定格式（默认为流式输出统一格式）的PCM数据"""
+    segment = (
+        segment.set_frame_rate(frame_rate)
+        .set_channels(channels)
+        .set_sample_width(sample_width)
+    )
+    return segment.raw_data
+
+def silence_pcm(
+    duration: int,
+    frame_rate: int = STREAM_FRAME_RATE,
+    channels: int = STREAM_CHANNELS,
+    sample_width: int = STREAM_SAMPLE_WIDTH
+) -> bytes:
+    """生成指定时长(毫秒)的静音PCM数据"""
+    frames = int(frame_rate * duration / 1000)
+    return b"\x00" * (frames * channels * sample_width)
@@ -0,0 +1,334 @@
+"""
+渲染流水线基准测试
+
+使用本地模拟引擎（mock）测量各阶段的耗时、内存分配和进程峰值内存，
+结果写入 JSON，并与保存的基准结果比较，耗时或内存明显变差时以非零状态退出。
+
+用法:
+    python benchmark.py                      # 运行全部基准并与 benchmarks/baseline.json 比较
+    python benchmark.py --only parse,assemble
+    python benchmark.py --save-baseline      # 将本次结果保存为新的基准
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# resource 仅在类 Unix 系统上可用
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from config_manager import config_manager, BASE_DIR
+from mock_tts import synthesize_pcm, pcm_to_wav
+from synthesis import decode_audio
+from audio_encoder import MultiFormatExporter
+from multiTTS import DialogueTTS
+
+DEFAULT_OUTPUT = "output/benchmarks/latest.json"
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+SEGMENT_TEXT = "这是一段用于基准测试的对话内容，长度和真实播客中的一句话差不多。"
+
+def peak_rss_mb() -> Optional[float]:
+    """进程启动以来的峰值常驻内存(MB)，不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def measure(fn: Callable[[], Any], repeat: int = 5, **extra) -> Dict[str, Any]:
+    """
+    多次运行 fn 并记录耗时，再单独运行一次统计内存分配
+
+    Args:
+        fn: 被测函数
+        repeat: 计时运行次数
+        extra: 附加到结果中的信息
+
+    Returns:
+        Dict: wall_seconds（中位数）、wall_min_seconds、peak_alloc_bytes、allocated_bytes、peak_rss_mb 等
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc 会拖慢执行，只在计时之外运行一次
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    fn()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_seconds": statistics.median(timings),
+        "wall_min_seconds": min(timings),
+        "runs": repeat,
+        "peak_alloc_bytes": peak - before,
+        "allocated_bytes": after - before,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra
+    }
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+def make_script(turns: int) -> str:
+    """生成指定轮数的对话脚本"""
+    lines = []
+    for i in range(turns):
+        role = "主持人" if i % 2 == 0 else "嘉宾"
+        lines.append(f"[{role}] 第{i}句：{SEGMENT_TEXT}")
+    return "\n".join(lines)
+
+def make_segments(count: int, sample_rate: int = 24000):
+    """生成 count 个时长约 6 秒的音频片段"""
+    pcm = synthesize_pcm(SEGMENT_TEXT, "mock-female", sample_rate)
+    return [decode_audio(pcm, f"pcm_{sample_rate}") for _ in range(count)]
+
+def bench_parse(results: Dict, repeat: int):
+    dialogue_tts = DialogueTTS(None, None)
+    for turns in (1000, 10000):
+        script = make_script(turns)
+        results[f"parse_{turns}_turns"] = measure(
+            lambda: dialogue_tts._parse_dialogue(script), repeat, turns=turns, chars=len(script)
+        )
+
+def bench_decode(results: Dict, repeat: int):
+    sample_rate = 24000
+    pcm = synthesize_pcm(SEGMENT_TEXT, "mock-female", sample_rate)
+    wav = pcm_to_wav(pcm, sample_rate)
+    results["decode_pcm"] = measure(lambda: decode_audio(pcm, f"pcm_{sample_rate}"), repeat * 20, bytes=len(pcm))
+    results["decode_wav"] = measure(lambda: decode_audio(wav, "wav"), repeat * 20, bytes=len(wav))
+    if ffmpeg_available():
+        buffer = io.BytesIO()
+        decode_audio(pcm, f"pcm_{sample_rate}").export(buffer, format="mp3")
+        mp3 = buffer.getvalue()
+        results["decode_mp3"] = measure(lambda: decode_audio(mp3, "mp3"), repeat, bytes=len(mp3))
+    else:
+        results["decode_mp3"] = {"skipped": "未安装 FFmpeg"}
+
+def bench_normalize(results: Dict, repeat: int):
+    segment = make_segments(1)[0]
+    results["normalize_segment"] = measure(segment.normalize, repeat * 10, duration_seconds=segment.duration_seconds)
+
+def bench_assemble(results: Dict, repeat: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "assemble.wav")
+        for count in (10, 100, 1000):
+            segments = make_segments(count)
+
+            def assemble():
+                exporter = MultiFormatExporter([(output_path, "wav")])
+                for segment in segments:
+                    exporter.add_silence(600)
+                    exporter.add_segment(segment)
+                exporter.close()
+
+            results[f"assemble_{count}_segments"] = measure(assemble, repeat, segments=count)
+
+def bench_export(results: Dict, repeat: int):
+    segments = make_segments(100)
+    # 边追加片段边编码，多种格式共用一次 PCM 转换
+    formats = [["wav"]] + ([["mp3"], ["opus"], ["flac"], ["wav", "mp3"]] if ffmpeg_available() else [])
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for output_formats in formats:
+            outputs = [(os.path.join(temp_dir, f"export.{fmt}"), fmt) for fmt in output_formats]
+
+            def export():
+                exporter = MultiFormatExporter(outputs)
+                for segment in segments:
+                    exporter.add_segment(segment)
+                exporter.close()
+
+            name = "+".join(output_formats)
+            results[f"export_100_segments_{name}"] = measure(export, max(1, repeat // 2))
+    if not ffmpeg_available():
+        results["export_100_segments_mp3"] = {"skipped": "未安装 FFmpeg"}
+
+async def _run_dialogue_requests(engine: str, turns: int, concurrency: int, requests: int) -> Dict[str, Any]:
+    """通过 ASGI 直接调用 /convert_dialogue，统计吞吐量"""
+    import httpx
+    from app import app
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(client: httpx.AsyncClient, index: int):
+        nonlocal failures
+        # 每个请求的文本不同，避免命中片段缓存
+        script = make_script(turns).replace("第", f"#{index}-{time.time_ns()} 第")
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/convert_dialogue", json={
+                "dialogue_text": script,
+                "host_voice": "mock-female",
+                "guest_voice": "mock-male",
+                "host_tts_engine": engine,
+                "guest_tts_engine": engine
+            })
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+        wall = time.perf_counter() - start
+
+    return {
+        "wall_seconds": wall,
+        "requests": requests,
+        "concurrency": concurrency,
+        "failures": failures,
+        "requests_per_second": requests / wall,
+        "segments_per_second": requests * turns / wall,
+        "p50_request_seconds": statistics.median(latencies),
+        "max_request_seconds": max(latencies),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def bench_end_to_end(results: Dict, repeat: int, engine: str, turns: int):
+    from segment_cache import segment_cache
+    segment_cache.enabled = False  # 测量的是合成流水线本身，不走片段缓存
+    for concurrency in (1, 4, 16):
+        results[f"e2e_convert_dialogue_c{concurrency}"] = asyncio.run(
+            _run_dialogue_requests(engine, turns, concurrency, requests=max(concurrency * 2, 4))
+        )
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "decode": bench_decode,
+    "normalize": bench_normalize,
+    "assemble": bench_assemble,
+    "export": bench_export,
+    "e2e": bench_end_to_end,
+}
+
+# 比较时使用的指标: 指标名 -> 是否越大越好
+COMPARED_METRICS = {
+    "wall_seconds": False,
+    "peak_alloc_bytes": False,
+    "segments_per_second": True,
+}
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    与基准结果比较
+
+    Args:
+        results: 本次结果
+        baseline: 基准结果
+        tolerance: 允许的相对变化，例如 0.2 表示变差 20% 以内不算回退
+
+    Returns:
+        List[str]: 回退项的说明
+    """
+    regressions = []
+    print(f"\n{'基准项':<36}{'指标':<22}{'基准':>14}{'本次':>14}{'变化':>10}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "skipped" in result or "skipped" in base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in result or metric not in base or not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            worse = -change if higher_is_better else change
+            flag = "  <-- 回退" if worse > tolerance else ""
+            print(f"{name:<36}{metric:<22}{base[metric]:>14.4g}{result[metric]:>14.4g}{change:>+10.1%}{flag}")
+            if flag:
+                regressions.append(f"{name}.{metric}: {base[metric]:.4g} -> {result[metric]:.4g} ({change:+.1%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='渲染流水线基准测试')
+    parser.add_argument('--only', help=f'只运行指定的基准，逗号分隔，可选: {",".join(BENCHMARKS)}')
+    parser.add_argument('--repeat', type=int, default=5, help='每项计时运行次数')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='结果输出路径')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基准结果路径')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基准')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的相对变化，超过视为回退')
+    parser.add_argument('--engine', default='mock', help='端到端测试使用的引擎（PROVIDER_BASE_URLS 指向 mock_tts_server.py 时可用真实客户端）')
+    parser.add_argument('--turns', type=int, default=20, help='端到端测试中每个请求的对话轮数')
+    parser.add_argument('--mock-latency-p50', type=float, default=50, help='模拟引擎请求耗时中位数(毫秒)')
+    parser.add_argument('--mock-latency-p99', type=float, default=200, help='模拟引擎请求耗时 p99(毫秒)')
+    args = parser.parse_args()
+
+    # 仅修改内存中的配置，不写回 config.json
+    config = config_manager.get_config()
+    config.MOCK_TTS.latency_p50_ms = args.mock_latency_p50
+    config.MOCK_TTS.latency_p99_ms = args.mock_latency_p99
+    config.MOCK_TTS.error_rate = 0.0
+    config.MOCK_TTS.throttle_rate = 0.0
+    config.RATE_LIMITS.mock.requests_per_second = 1e6
+    config.RATE_LIMITS.mock.burst = 1000000
+
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    results: Dict[str, Dict] = {}
+    for name in selected:
+        if name not in BENCHMARKS:
+            parser.error(f"未知的基准: {name}")
+        print(f"运行基准: {name}")
+        if name == "e2e":
+            bench_end_to_end(results, args.repeat, args.engine, args.turns)
+        else:
+            BENCHMARKS[name](results, args.repeat)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_available(),
+        "results": results
+    }
+    output_path = Path(args.output)
+    if not output_path.is_absolute():
+        output_path = BASE_DIR / output_path
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"\n结果已写入: {output_path}")
+
+    baseline_path = Path(args.baseline)
+    if not baseline_path.is_absolute():
+        baseline_path = BASE_DIR / baseline_path
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(output_path, baseline_path)
+        print(f"已保存为基准: {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print("没有基准结果，使用 --save-baseline 保存本次结果作为基准")
+        return
+
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项回退:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\n未发现回退")
+
+if __name__ == "__main__":
+    main()
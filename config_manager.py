@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict
+from typing import Optional, Dict, Literal
 import json
 import os
 from pathlib import Path
@@ -45,6 +45,8 @@ class ElevenLabsSettingsModel(BaseModel):
     stability: float = Field(0.75, ge=0, le=1)
     similarity_boost: float = Field(0.75, ge=0, le=1)
     speed: float = Field(1.0, ge=0.7, le=1.2)
+    # 请求 wav/pcm 时的 PCM 采样率，44100 需要 Pro 及以上套餐
+    pcm_sample_rate: Literal[16000, 22050, 24000, 44100] = 24000
 
 class DefaultVoicesModel(BaseModel):
     basic: str = "anna"
@@ -56,12 +58,134 @@ class ModelsConfigModel(BaseModel):
     elevenlabs_default_model: str = "eleven_multilingual_v2"
     elevenlabs_default_voice: str = "21m00Tcm4TlvDq8ikWAM"
 
+class TTSConcurrencyModel(BaseModel):
+    """各TTS引擎同时进行的合成请求数上限"""
+    siliconflow: int = Field(4, ge=1, le=32)
+    minimax: int = Field(2, ge=1, le=32)
+    elevenlabs: int = Field(2, ge=1, le=32)
+    aliyun: int = Field(2, ge=1, le=32)
+    mock: int = Field(8, ge=1, le=32)
+
+class SegmentCacheModel(BaseModel):
+    """TTS片段磁盘缓存配置"""
+    enabled: bool = True
+    directory: str = "cache/segments"  # 相对路径基于项目目录
+    max_size_mb: int = Field(2048, ge=1)
+
+class RenderJobsModel(BaseModel):
+    """后台渲染任务队列配置"""
+    workers: int = Field(2, ge=1, le=16)  # 同时渲染的任务数
+    directory: str = "output/jobs"  # 任务数据库和输出文件目录，相对路径基于项目目录
+
+class TranslationSettingsModel(BaseModel):
+    """长脚本分块并行翻译配置"""
+    chunked: bool = True  # 超过单块上限的脚本是否分块并行翻译
+    max_chunk_tokens: int = Field(1500, ge=100)  # 每块的 token 上限
+    concurrency: int = Field(4, ge=1, le=16)  # 同时翻译的块数
+
+class LLMCacheModel(BaseModel):
+    """故事转换 LLM 响应缓存配置"""
+    enabled: bool = False
+    path: str = "cache/llm_responses.db"  # 相对路径基于项目目录
+    ttl_hours: float = Field(168, gt=0)
+    max_size_mb: int = Field(256, ge=1)
+
+class LongStorySettingsModel(BaseModel):
+    """长故事分段（map-reduce）转换配置"""
+    enabled: bool = True  # 超过单段上限的故事是否分段转换
+    max_section_tokens: int = Field(4000, ge=200)  # 每段原文的 token 上限
+    overlap_tokens: int = Field(200, ge=0)  # 每段附带的上一段结尾原文的 token 上限
+    summary_chars: int = Field(150, ge=20)  # 前情提要中每段概要的字数上限
+    concurrency: int = Field(3, ge=1, le=16)  # 同时转换的段数
+
+class EngineRateLimitModel(BaseModel):
+    """单个TTS引擎（每个 API Key）的请求速率"""
+    requests_per_second: float = Field(2.0, gt=0)
+    burst: int = Field(4, ge=1)  # 令牌桶容量，允许的瞬时突发请求数
+
+class RateLimitsModel(BaseModel):
+    """TTS请求限流与重试配置"""
+    siliconflow: EngineRateLimitModel = EngineRateLimitModel(requests_per_second=5, burst=10)
+    minimax: EngineRateLimitModel = EngineRateLimitModel(requests_per_second=2, burst=4)
+    elevenlabs: EngineRateLimitModel = EngineRateLimitModel(requests_per_second=2, burst=4)
+    aliyun: EngineRateLimitModel = EngineRateLimitModel(requests_per_second=3, burst=6)
+    mock: EngineRateLimitModel = EngineRateLimitModel(requests_per_second=50, burst=50)
+    max_retries: int = Field(3, ge=0, le=10)  # 限流、超时和 5xx 错误的最大重试次数
+    base_backoff: float = Field(0.5, gt=0)  # 指数退避的初始等待时间(秒)
+    max_backoff: float = Field(20.0, gt=0)  # 单次退避的最长等待时间(秒)
+
+class FailoverModel(BaseModel):
+    """主引擎合成失败时改用的备用引擎"""
+    engine: str  # 备用引擎名称
+    voices: Dict[str, str] = {}  # 主引擎音色 -> 备用引擎音色
+    default_voice: Optional[str] = None  # 映射表中没有的音色使用该音色，为空时沿用原音色名
+    model: Optional[str] = None  # 备用引擎使用的模型，为空时使用其默认模型
+
+class ResilienceModel(BaseModel):
+    """慢请求对冲与失败切换配置"""
+    hedging: bool = True  # 请求耗时超过阈值时是否再发一个相同请求，先返回者胜出
+    hedge_percentile: float = Field(0.95, gt=0.5, lt=1)  # 对冲阈值取该引擎近期耗时的分位数
+    hedge_min_samples: int = Field(20, ge=1)  # 样本数不足时使用 hedge_initial_delay
+    hedge_initial_delay: float = Field(10.0, gt=0)  # 初始对冲阈值(秒)
+    hedge_min_delay: float = Field(1.0, ge=0)  # 对冲阈值下限(秒)
+    failover: Dict[str, FailoverModel] = {}  # 主引擎名称 -> 备用引擎配置
+
+class VoiceCatalogModel(BaseModel):
+    """音色目录配置"""
+    remote: bool = True  # 是否在后台获取各服务商账号下的音色
+    refresh_minutes: float = Field(60, gt=0)  # 后台刷新间隔(分钟)
+    page_size: int = Field(100, ge=1, le=100)  # 分页接口每页数量
+    custom_voices_path: str = "voices/custom_voices.json"  # 本地自定义音色登记表，相对路径基于项目目录
+
+class ProviderBaseUrlsModel(BaseModel):
+    """服务商接口地址覆盖（如指向 mock_tts_server.py），为空时使用官方地址"""
+    siliconflow: Optional[str] = None  # 默认 https://api.siliconflow.cn/v1
+    minimax: Optional[str] = None  # 默认 https://api.minimax.chat/v1
+    elevenlabs: Optional[str] = None  # 默认 https://api.elevenlabs.io/v1
+
+class MockTTSModel(BaseModel):
+    """本地模拟TTS引擎（mock）配置"""
+    latency_p50_ms: float = Field(300, ge=0)  # 请求耗时中位数(毫秒)，按对数正态分布抽样
+    latency_p99_ms: float = Field(1500, ge=0)  # 请求耗时 p99(毫秒)
+    error_rate: float = Field(0.0, ge=0, le=1)  # 返回 500 错误的比例
+    throttle_rate: float = Field(0.0, ge=0, le=1)  # 返回 429 限流的比例
+    retry_after: float = Field(1.0, ge=0)  # 429 错误附带的 Retry-After(秒)
+    sample_rate: int = Field(24000, ge=8000)
+    chars_per_second: float = Field(5.0, gt=0)  # 生成音频时每秒朗读的字符数
+    seed: Optional[int] = None  # 随机种子，固定后延迟和错误序列可复现
+
+class StreamingModel(BaseModel):
+    """服务商流式接口配置，开启后边接收边解码，缩短首字节时间并降低单句的峰值内存"""
+    minimax: bool = True  # MiniMax T2A 流式模式（十六进制音频块逐块解码）
+    progressive_segments: bool = True  # 对谈流式输出时直接转发服务商的 PCM 流（SiliconFlow、ElevenLabs），长句合成完成前即可开始播放
+
+class TracingModel(BaseModel):
+    """请求各阶段耗时追踪配置"""
+    enabled: bool = True  # 是否记录追踪
+    server_timing: bool = True  # 是否在响应中返回 Server-Timing 头
+    jsonl_path: Optional[str] = None  # 追踪导出到 JSONL 文件，相对路径基于项目目录，为空时不导出
+    otlp_endpoint: Optional[str] = None  # OTLP/HTTP (JSON) 收集器地址，如 http://127.0.0.1:4318/v1/traces，为空时不导出
+    service_name: str = "ai-gossip-podcast"  # 导出时的 service.name
+
 class AppConfig(BaseModel):
     API_KEYS: ApiKeysModel = ApiKeysModel()
-    DEFAULT_TTS_ENGINE: str = "siliconflow"  # 可选: "siliconflow", "aliyun", "minimax", "elevenlabs"
+    DEFAULT_TTS_ENGINE: str = "siliconflow"  # 可选: "siliconflow", "aliyun", "minimax", "elevenlabs", "mock"
     DEFAULT_VOICES: DefaultVoicesModel = DefaultVoicesModel()
     ELEVENLABS_SETTINGS: ElevenLabsSettingsModel = ElevenLabsSettingsModel()
     MODELS: ModelsConfigModel = ModelsConfigModel()
+    TTS_CONCURRENCY: TTSConcurrencyModel = TTSConcurrencyModel()
+    SEGMENT_CACHE: SegmentCacheModel = SegmentCacheModel()
+    RENDER_JOBS: RenderJobsModel = RenderJobsModel()
+    TRANSLATION_SETTINGS: TranslationSettingsModel = TranslationSettingsModel()
+    LLM_CACHE: LLMCacheModel = LLMCacheModel()
+    LONG_STORY_SETTINGS: LongStorySettingsModel = LongStorySettingsModel()
+    RATE_LIMITS: RateLimitsModel = RateLimitsModel()
+    RESILIENCE: ResilienceModel = ResilienceModel()
+    VOICE_CATALOG: VoiceCatalogModel = VoiceCatalogModel()
+    PROVIDER_BASE_URLS: ProviderBaseUrlsModel = ProviderBaseUrlsModel()
+    MOCK_TTS: MockTTSModel = MockTTSModel()
+    STREAMING: StreamingModel = StreamingModel()
+    TRACING: TracingModel = TracingModel()
 
 class SettingsResponse(BaseModel):
     api_keys_set: Dict[str, bool] = {}
@@ -69,10 +193,12 @@ class SettingsResponse(BaseModel):
     default_voices: DefaultVoicesModel = DefaultVoicesModel()
     elevenlabs_settings: ElevenLabsSettingsModel = ElevenLabsSettingsModel()
     models: ModelsConfigModel = ModelsConfigModel()
+    tts_concurrency: TTSConcurrencyModel = TTSConcurrencyModel()
 
 class ConfigManager:
     _instance = None
     _config: AppConfig = None
+    _version: int = 0  # 配置版本号，每次更新配置时加一，用于判断缓存的客户端实例是否过期
 
     def __new__(cls):
         if cls._instance is None:
@@ -113,9 +239,20 @@ class ConfigManager:
         """获取当前配置"""
         return self._config
 
+    @property
+    def version(self) -> int:
+        """当前配置的版本号"""
+        return self._version
+
     def update_config(self, new_config: AppConfig):
-        """更新配置"""
+        """
+        更新配置并增加版本号
+
+        new_config 应为新的对象而不是在当前配置上原地修改，
+        这样正在进行的渲染持有的旧配置和旧客户端实例保持不变。
+        """
         self._config = new_config
+        self._version += 1
         self.save_config()
 
     def get_settings_response(self) -> SettingsResponse:
@@ -128,7 +265,8 @@ class ConfigManager:
             default_tts_engine=self._config.DEFAULT_TTS_ENGINE,
             default_voices=self._config.DEFAULT_VOICES,
             elevenlabs_settings=self._config.ELEVENLABS_SETTINGS,
-            models=self._config.MODELS
+            models=self._config.MODELS,
+            tts_concurrency=self._config.TTS_CONCURRENCY
         )
 
 # 创建全局配置管理器实例
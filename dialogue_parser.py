@@ -0,0 +1,150 @@
+import re
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# 默认的角色标签
+DEFAULT_ROLES = ("主持人", "嘉宾")
+
+class DialogueTurn(NamedTuple):
+    """一轮对话"""
+    role: str
+    content: str  # 去除首尾空白后的对话内容（保留所有富文本标记）
+    start: int  # content 在全文中的起始偏移
+    end: int  # content 在全文中的结束偏移（不含）
+    line: int  # 角色标签所在行号（从1开始）
+
+class ParseIssue(NamedTuple):
+    """脚本格式问题"""
+    line: int
+    message: str
+
+class DialogueTokenizer:
+    """增量式对话脚本解析器"""
+
+    def __init__(self, roles: Iterable[str] = DEFAULT_ROLES):
+        """
+        初始化解析器
+
+        文本可以分块输入（例如 LLM 的流式输出），遇到下一个角色标签时上一轮对话即告完成并立即返回。
+        每个字符只扫描一次，只有可能被截断的角色标签（不超过最长标签的长度）会留到下一块再看，
+        因此总耗时与文本长度成线性关系。
+
+        Args:
+            roles: 角色标签列表，如 ("主持人", "嘉宾")
+        """
+        self.roles = tuple(roles)
+        if not self.roles:
+            raise ValueError("至少需要一个角色标签")
+        self._tags = tuple(f"[{role}]" for role in self.roles)
+        self._pattern = re.compile(r"\[(" + "|".join(map(re.escape, self.roles)) + r")\]")
+        self._max_tag_len = max(len(tag) for tag in self._tags)
+
+        self.issues: List[ParseIssue] = []
+        self._carry = ""  # 末尾可能是半个角色标签的文本
+        self._offset = 0  # _carry 在全文中的起始偏移
+        self._line = 1  # _offset 处的行号
+        self._role: Optional[str] = None
+        self._role_line = 0
+        self._content_start = 0
+        self._parts: List[str] = []
+        self._closed = False
+
+    def feed(self, chunk: str) -> List[DialogueTurn]:
+        """
+        输入一段文本
+
+        Args:
+            chunk: 文本块
+
+        Returns:
+            List[DialogueTurn]: 本次新完成的对话轮次
+        """
+        if self._closed:
+            raise RuntimeError("解析器已关闭")
+        text = self._carry + chunk
+        base = self._offset
+        turns = []
+        pos = 0
+        for match in self._pattern.finditer(text):
+            self._consume(text[pos:match.start()])
+            turn = self._finish_turn()
+            if turn is not None:
+                turns.append(turn)
+            self._role = match.group(1)
+            self._role_line = self._line
+            self._content_start = base + match.end()
+            pos = match.end()
+
+        # 末尾可能是被截断的角色标签，留到下一块再判断
+        keep = len(text)
+        bracket = text.rfind("[", max(pos, len(text) - self._max_tag_len + 1))
+        if bracket != -1 and any(tag.startswith(text[bracket:]) for tag in self._tags):
+            keep = bracket
+        self._consume(text[pos:keep])
+        self._carry = text[keep:]
+        self._offset = base + keep
+        return turns
+
+    def close(self) -> List[DialogueTurn]:
+        """
+        结束输入，返回最后一轮对话
+
+        Returns:
+            List[DialogueTurn]: 最后一轮对话（没有时为空列表）
+        """
+        if self._closed:
+            return []
+        self._consume(self._carry)
+        self._carry = ""
+        self._closed = True
+        turn = self._finish_turn()
+        return [turn] if turn is not None else []
+
+    def _consume(self, segment: str):
+        """将两个角色标签之间的文本计入当前轮次"""
+        if not segment:
+            return
+        if self._role is None:
+            stripped = segment.lstrip()
+            if stripped:
+                line = self._line + segment.count("\n", 0, len(segment) - len(stripped))
+                self.issues.append(ParseIssue(line, "内容缺少角色标签，已忽略"))
+        else:
+            self._parts.append(segment)
+        self._line += segment.count("\n")
+
+    def _finish_turn(self) -> Optional[DialogueTurn]:
+        """结束当前轮次，内容为空时记录问题并返回 None"""
+        if self._role is None:
+            return None
+        content = "".join(self._parts)
+        self._parts = []
+        stripped = content.strip()
+        if not stripped:
+            self.issues.append(ParseIssue(self._role_line, f"[{self._role}] 标签后没有内容"))
+            return None
+
+        leading = len(content) - len(content.lstrip())
+        first_line = self._role_line + content.count("\n", 0, leading)
+        # 每行都应以角色标签开头，未加标签的行并入上一轮对话（与原有行为一致）
+        for i, text_line in enumerate(stripped.split("\n")[1:], start=1):
+            if text_line.strip():
+                self.issues.append(ParseIssue(first_line + i, "该行缺少角色标签，已并入上一轮对话"))
+
+        start = self._content_start + leading
+        return DialogueTurn(self._role, stripped, start, start + len(stripped), self._role_line)
+
+def parse_dialogue(text: str, roles: Iterable[str] = DEFAULT_ROLES) -> Tuple[List[DialogueTurn], List[ParseIssue]]:
+    """
+    解析完整的对话脚本
+
+    Args:
+        text: 对话脚本
+        roles: 角色标签列表
+
+    Returns:
+        Tuple[List[DialogueTurn], List[ParseIssue]]: 对话轮次和格式问题
+    """
+    tokenizer = DialogueTokenizer(roles)
+    turns = tokenizer.feed(text)
+    turns.extend(tokenizer.close())
+    return turns, tokenizer.issues
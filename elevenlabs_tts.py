@@ -1,18 +1,28 @@
-import requests
 from pathlib import Path
-from typing import Literal, Union, Dict, List, Tuple
-import tempfile
-import os
+from typing import Literal, Optional, Union, Dict, List, Tuple, Iterator, AsyncIterator
+import io
+import wave
 from pydub import AudioSegment
 from config_manager import config_manager
+from http_clients import http_clients
+from tts_errors import raise_for_response
+from metrics import observe_synthesis
 
 class ElevenLabsTTS:
     """ElevenLabs TTS API 封装类"""
     
-    def __init__(self, api_key: str):
-        """初始化 ElevenLabs TTS 客户端"""
+    engine_name = "elevenlabs"
+    
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        """
+        初始化 ElevenLabs TTS 客户端
+
+        Args:
+            api_key: ElevenLabs API 密钥
+            base_url: 接口根地址，默认 https://api.elevenlabs.io/v1
+        """
         self.api_key = api_key
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.base_url = (base_url or "https://api.elevenlabs.io/v1").rstrip("/")
         self.headers = {
             "Accept": "audio/mpeg",
             "Content-Type": "application/json",
@@ -24,6 +34,9 @@ class ElevenLabsTTS:
         self.default_model_id = config.MODELS.elevenlabs_default_model
         # --- 新增结束 ---
         
+        # 请求 wav/pcm 时的 PCM 采样率（ELEVENLABS_SETTINGS.pcm_sample_rate），44100 需要 Pro 及以上套餐
+        self.pcm_sample_rate = config.ELEVENLABS_SETTINGS.pcm_sample_rate
+        
         # 预置音色列表
         self.preset_voices = [
             {'id': 'UgBBYS2sOqTuMpoF3BR0', 'name': 'Mark - 自然对话'},
@@ -39,10 +52,188 @@ class ElevenLabsTTS:
         ]
 
     def _map_format(self, format_str: str) -> str:
-        """将通用格式映射到 ElevenLabs 支持的格式 - 始终请求 MP3"""
-        # 忽略 format_str，总是请求 MP3，后续再转换
+        """
+        将通用格式映射到 ElevenLabs 的 output_format
+
+        wav 和 pcm 直接请求 16bit 单声道 PCM，拼接时无需经过 FFmpeg 解码 MP3，
+        也避免了有损的 MP3 中转；其他格式请求 MP3。
+        """
+        if format_str in ("wav", "pcm"):
+            return f"pcm_{self.pcm_sample_rate}"
         return "mp3_44100_128"
 
+    def stream_format(self, response_format: str) -> str:
+        """synthesize/stream_audio 返回的实际音频格式，如 pcm_44100 或 mp3"""
+        output_format = self._map_format(response_format)
+        return output_format if output_format.startswith("pcm_") else "mp3"
+
+    def _build_request(
+        self,
+        text: str,
+        voice_id: str,
+        model_id: str,
+        stability: float,
+        similarity_boost: float,
+        speed: float,
+        response_format: str = "mp3"
+    ) -> Tuple[str, Dict, Dict]:
+        """校验参数并构建请求，返回 (url, 查询参数, 请求体)"""
+        stability = max(0.0, min(1.0, stability))
+        similarity_boost = max(0.0, min(1.0, similarity_boost))
+        speed = max(0.7, min(1.2, speed))
+        
+        # --- 新增：验证并确定使用的模型 ID --- 
+        # 如果传入的 model_id 无效 (None 或空字符串)，则使用类初始化时加载的默认 ID
+        effective_model_id = model_id if model_id else self.default_model_id 
+        # 可以在此添加更复杂的验证逻辑，例如检查 model_id 是否在已知列表中
+        # --- 新增结束 ---
+        
+        # 流式接口边生成边返回，可以逐块读取响应体
+        url = f"{self.base_url}/text-to-speech/{voice_id}/stream"
+        
+        eleven_api_format = self._map_format(response_format)
+        params = {
+            "output_format": eleven_api_format
+        }
+        
+        payload = {
+            "text": text,
+            "model_id": effective_model_id,
+            "voice_settings": {
+                "stability": stability,
+                "similarity_boost": similarity_boost,
+                "speed": speed
+            }
+        }
+        return url, params, payload
+
+    def _request_headers(self, response_format: str) -> Dict:
+        """请求 PCM 时不能只接受 audio/mpeg"""
+        if self.stream_format(response_format) == "mp3":
+            return self.headers
+        return {**self.headers, "Accept": "*/*"}
+
+    def stream_audio(
+        self,
+        text: str,
+        voice_id: str = "21m00Tcm4TlvDq8ikWAM",
+        model_id: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "pcm",
+        stability: float = 0.75,
+        similarity_boost: float = 0.75,
+        speed: float = 1.0
+    ) -> Iterator[bytes]:
+        """
+        通过流式接口合成，逐块返回音频数据（格式见 stream_format）
+
+        Args:
+            参数含义同 text_to_speech
+
+        Yields:
+            bytes: 音频数据块
+
+        Raises:
+            httpx.HTTPError: 网络请求失败
+            TTSProviderError: API 返回错误状态
+        """
+        url, params, payload = self._build_request(
+            text, voice_id, model_id, stability, similarity_boost, speed, response_format
+        )
+        
+        client = http_clients.get_sync_client(self.engine_name)
+        with client.stream(
+            "POST", url, json=payload, params=params, headers=self._request_headers(response_format)
+        ) as response:
+            if response.is_error:
+                response.read()
+            raise_for_response(self.engine_name, response)
+            yield from response.iter_bytes(chunk_size=8192)
+
+    async def astream_audio(
+        self,
+        text: str,
+        voice_id: str = "21m00Tcm4TlvDq8ikWAM",
+        model_id: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "pcm",
+        stability: float = 0.75,
+        similarity_boost: float = 0.75,
+        speed: float = 1.0
+    ) -> AsyncIterator[bytes]:
+        """stream_audio 的异步版本，使用共享的异步连接池"""
+        url, params, payload = self._build_request(
+            text, voice_id, model_id, stability, similarity_boost, speed, response_format
+        )
+        
+        client = http_clients.get_async_client(self.engine_name)
+        async with client.stream(
+            "POST", url, json=payload, params=params, headers=self._request_headers(response_format)
+        ) as response:
+            if response.is_error:
+                await response.aread()
+            raise_for_response(self.engine_name, response)
+            async for chunk in response.aiter_bytes(chunk_size=8192):
+                yield chunk
+
+    @observe_synthesis
+    def synthesize(
+        self,
+        text: str,
+        voice_id: str = "21m00Tcm4TlvDq8ikWAM",
+        model_id: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "mp3",
+        stability: float = 0.75,
+        similarity_boost: float = 0.75,
+        speed: float = 1.0,
+        stream: bool = False
+    ) -> Tuple[bytes, str]:
+        """
+        将文本转换为语音，直接返回 ElevenLabs 输出的音频数据
+
+        请求 wav 或 pcm 时返回原始 PCM（格式为 "pcm_<采样率>"），其余返回 MP3。
+        始终使用流式接口，stream 参数仅为兼容保留。
+
+        Args:
+            参数含义同 text_to_speech
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 音频格式)
+
+        Raises:
+            httpx.HTTPError: 网络请求失败
+            TTSProviderError: API 返回错误状态
+        """
+        buffer = bytearray()
+        for chunk in self.stream_audio(
+            text, voice_id, model_id, response_format, stability, similarity_boost, speed
+        ):
+            buffer += chunk
+        return bytes(buffer), self.stream_format(response_format)
+
+    @observe_synthesis
+    async def asynthesize(
+        self,
+        text: str,
+        voice_id: str = "21m00Tcm4TlvDq8ikWAM",
+        model_id: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "mp3",
+        stability: float = 0.75,
+        similarity_boost: float = 0.75,
+        speed: float = 1.0,
+        stream: bool = False
+    ) -> Tuple[bytes, str]:
+        """
+        synthesize 的异步版本，使用共享的异步连接池
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 音频格式)
+        """
+        buffer = bytearray()
+        async for chunk in self.astream_audio(
+            text, voice_id, model_id, response_format, stability, similarity_boost, speed
+        ):
+            buffer += chunk
+        return bytes(buffer), self.stream_format(response_format)
+
     def text_to_speech(
         self,
         text: str,
@@ -60,65 +251,36 @@ class ElevenLabsTTS:
         (修改：增加 model_id 验证和回退逻辑)
         """
         try:
-            stability = max(0.0, min(1.0, stability))
-            similarity_boost = max(0.0, min(1.0, similarity_boost))
-            speed = max(0.7, min(1.2, speed))
-            
-            # --- 新增：验证并确定使用的模型 ID --- 
-            # 如果传入的 model_id 无效 (None 或空字符串)，则使用类初始化时加载的默认 ID
-            effective_model_id = model_id if model_id else self.default_model_id 
-            # 可以在此添加更复杂的验证逻辑，例如检查 model_id 是否在已知列表中
-            # --- 新增结束 ---
-            
-            url = f"{self.base_url}/text-to-speech/{voice_id}"
-            
-            eleven_api_format = self._map_format("mp3")
-            params = {
-                "output_format": eleven_api_format
-            }
+            audio_data, audio_format = self.synthesize(
+                text, voice_id, model_id, response_format,
+                stability, similarity_boost, speed, stream
+            )
             
-            payload = {
-                "text": text,
-                "model_id": effective_model_id,
-                "voice_settings": {
-                    "stability": stability,
-                    "similarity_boost": similarity_boost,
-                    "speed": speed
-                }
-            }
+            output_path_obj = Path(output_path)
+            output_path_obj.parent.mkdir(parents=True, exist_ok=True)
             
-            response = requests.post(
-                url,
-                json=payload,
-                params=params,
-                headers=self.headers,
-                stream=True
-            )
-
-            if response.status_code == 200:
-                # --- 修改：先写入临时 MP3，再转换为目标格式 --- 
-                temp_mp3_fd, temp_mp3_path = tempfile.mkstemp(suffix=".mp3")
-                try:
-                    with os.fdopen(temp_mp3_fd, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    
-                    # 使用 pydub 加载 MP3
-                    audio = AudioSegment.from_mp3(temp_mp3_path)
-                    
-                    # 导出为最终请求的格式 (wav 或 mp3)
-                    final_output_format = response_format if response_format in ["wav", "mp3"] else "wav" # 默认转为 wav
-                    output_path_obj = Path(output_path)
-                    output_path_obj.parent.mkdir(parents=True, exist_ok=True)
-                    audio.export(output_path_obj, format=final_output_format)
-                    
-                    return True, final_output_format # 返回实际输出的格式
-                finally:
-                    os.remove(temp_mp3_path) # 清理临时文件
-                # --- 修改结束 ---
+            final_output_format = response_format if response_format in ["wav", "mp3", "pcm"] else "wav" # 默认转为 wav
+            if audio_format.startswith("pcm_") and final_output_format in ("wav", "pcm"):
+                # PCM 加上 WAV 文件头即可，无需经过 FFmpeg
+                with open(output_path_obj, 'wb') as f:
+                    if final_output_format == "pcm":
+                        f.write(audio_data)
+                    else:
+                        with wave.open(f, 'wb') as wav_file:
+                            wav_file.setnchannels(1)
+                            wav_file.setsampwidth(2)
+                            wav_file.setframerate(int(audio_format.split("_")[1]))
+                            wav_file.writeframes(audio_data)
+            elif final_output_format == audio_format:
+                # 格式一致时直接写入，无需重新编码
+                with open(output_path_obj, 'wb') as f:
+                    f.write(audio_data)
             else:
-                print(f"ElevenLabs API Error ({response.status_code}): {response.text}")
-                return False, ""
+                # 在内存中解码 MP3，再导出为最终请求的格式
+                audio = AudioSegment.from_file(io.BytesIO(audio_data), format=audio_format)
+                audio.export(output_path_obj, format=final_output_format)
+            
+            return True, final_output_format # 返回实际输出的格式
 
         except Exception as e:
             print(f"Error occurred during ElevenLabs API call: {e}")
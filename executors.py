@@ -0,0 +1,89 @@
+import os
+import asyncio
+import functools
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Any, Dict, Optional
+
+# 音频解码、音量平衡、拼接导出等阻塞操作使用的线程池
+# pydub 的重活主要在 audioop 和 FFmpeg 子进程中完成，线程池即可避免阻塞事件循环，
+# 同时省去进程池在进程间复制音频数据的开销
+AUDIO_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+
+audio_executor = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="audio")
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """
+    在音频线程池中执行阻塞函数，避免阻塞事件循环
+
+    Args:
+        fn: 要执行的阻塞函数
+
+    Returns:
+        Any: fn 的返回值
+    """
+    loop = asyncio.get_running_loop()
+    # 在当前上下文的副本中执行，线程中记录的追踪区间归入当前请求
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(audio_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+class LoopLagMonitor:
+    """事件循环延迟监控"""
+
+    def __init__(self, interval: float = 0.5, window: int = 240):
+        """
+        初始化监控器
+
+        定期 sleep 一个固定间隔，实际醒来时间比预期晚多少，就是事件循环被阻塞的时长。
+
+        Args:
+            interval: 采样间隔(秒)
+            window: 保留最近多少个采样用于统计
+        """
+        self.interval = interval
+        self._samples = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.current = 0.0
+        self.max = 0.0
+
+    def start(self):
+        """启动监控（需在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """停止监控"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.current = lag
+            self.max = max(self.max, lag)
+            self._samples.append(lag)
+
+    def stats(self) -> Dict[str, float]:
+        """返回延迟统计（毫秒）"""
+        samples = sorted(self._samples)
+        if not samples:
+            return {"current_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "samples": 0}
+        return {
+            "current_ms": self.current * 1000,
+            "p50_ms": samples[len(samples) // 2] * 1000,
+            "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            "max_ms": self.max * 1000,
+            "samples": len(samples)
+        }
+
+# 创建全局事件循环延迟监控实例
+loop_lag_monitor = LoopLagMonitor()
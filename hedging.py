@@ -0,0 +1,154 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from config_manager import config_manager
+
+class HedgingPolicy:
+    """
+    按引擎统计请求耗时，并对慢请求发起对冲
+
+    请求耗时超过该引擎近期耗时的分位数（默认 p95）时，再发送一个相同的请求，
+    先成功返回的结果胜出，另一个请求被取消。耗时只统计服务商往返时间，
+    计时从请求实际发出时开始，不包含限流器的排队、令牌等待和重试退避。
+    """
+
+    def __init__(self, window: int = 200):
+        """
+        Args:
+            window: 每个引擎保留的最近耗时样本数
+        """
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, engine: str, seconds: float):
+        """记录一次成功请求的耗时"""
+        with self._lock:
+            self._latencies.setdefault(engine, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, engine: str, name: str):
+        """累加计数（hedges、hedge_wins、hedges_skipped、failovers）"""
+        with self._lock:
+            counts = self._counts.setdefault(
+                engine, {"hedges": 0, "hedge_wins": 0, "hedges_skipped": 0, "failovers": 0}
+            )
+            counts[name] += 1
+
+    def percentile(self, engine: str, q: float) -> Optional[float]:
+        """返回该引擎近期耗时的分位数，没有样本时返回 None"""
+        with self._lock:
+            samples = sorted(self._latencies.get(engine, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self, engine: str) -> Optional[float]:
+        """
+        计算对冲阈值
+
+        Returns:
+            Optional[float]: 发起对冲前等待的秒数，未启用对冲时返回 None
+        """
+        settings = config_manager.get_config().RESILIENCE
+        if not settings.hedging:
+            return None
+        with self._lock:
+            samples = len(self._latencies.get(engine, ()))
+        if samples < settings.hedge_min_samples:
+            return settings.hedge_initial_delay
+        return max(settings.hedge_min_delay, self.percentile(engine, settings.hedge_percentile))
+
+    def timed(self, engine: str, fn: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """包装异步函数，成功时记录耗时"""
+        async def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            result = await fn(*args, **kwargs)
+            self.record(engine, time.monotonic() - start)
+            return result
+        return wrapper
+
+    async def run(
+        self,
+        engine: str,
+        call: Callable[[], Awaitable],
+        hedge_call: Optional[Callable[[], Awaitable]] = None,
+        can_hedge: Optional[Callable[[], bool]] = None
+    ) -> Any:
+        """
+        执行请求，超过对冲阈值仍未返回时再发起一次相同的请求
+
+        应在请求实际发出时调用（即已获得限流器名额之后），对冲阈值从此刻开始计时。
+
+        Args:
+            engine: 引擎名称
+            call: 发起一次请求的函数，每次调用返回新的协程
+            hedge_call: 发起对冲请求的函数，为空时使用 call
+            can_hedge: 到达阈值时判断能否对冲，返回 False 时（如限流冷却期、名额已满）
+                不发起对冲，继续等待首个请求
+
+        Returns:
+            Any: 最先成功的请求结果
+        """
+        delay = self.hedge_delay(engine)
+        primary = asyncio.ensure_future(call())
+        pending = {primary}
+        hedge = None
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # 首个请求超过阈值仍未返回，只检查一次是否发起对冲请求
+                    delay = None
+                    if can_hedge is not None and not can_hedge():
+                        self.count(engine, "hedges_skipped")
+                        continue
+                    hedge = asyncio.ensure_future((hedge_call or call)())
+                    pending.add(hedge)
+                    self.count(engine, "hedges")
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.count(engine, "hedge_wins")
+                        return task.result()
+                    if error is None or task is primary:
+                        # 都失败时优先抛出首个请求的错误
+                        error = task.exception()
+                # 首个请求在阈值内失败时不再对冲，由调用方决定是否切换引擎
+                delay = None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各引擎的耗时分位数、当前对冲阈值和对冲/切换次数"""
+        with self._lock:
+            engines = set(self._latencies) | set(self._counts)
+            counts = {engine: dict(self._counts.get(engine, {})) for engine in engines}
+            samples = {engine: len(self._latencies.get(engine, ())) for engine in engines}
+        result = {}
+        for engine in sorted(engines):
+            p50 = self.percentile(engine, 0.5)
+            p95 = self.percentile(engine, 0.95)
+            delay = self.hedge_delay(engine)
+            result[engine] = {
+                "samples": samples[engine],
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+                "hedges": counts[engine].get("hedges", 0),
+                "hedge_wins": counts[engine].get("hedge_wins", 0),
+                "hedges_skipped": counts[engine].get("hedges_skipped", 0),
+                "failovers": counts[engine].get("failovers", 0)
+            }
+        return result
+
+# 创建全局对冲策略实例
+hedging_policy = HedgingPolicy()
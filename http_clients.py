@@ -0,0 +1,100 @@
+import threading
+from typing import Dict
+import httpx
+
+# HTTP/2 依赖 h2 包，未安装时退回 HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 各服务商连接池设置
+PROVIDER_POOL_SETTINGS = {
+    "siliconflow": {"http2": True, "max_connections": 16},
+    "minimax": {"http2": False, "max_connections": 16},
+    "elevenlabs": {"http2": True, "max_connections": 16},
+}
+
+# TTS 合成耗时较长，读超时放宽
+DEFAULT_TIMEOUT = httpx.Timeout(connect=10.0, read=120.0, write=30.0, pool=60.0)
+
+class HTTPClientPool:
+    """按服务商共享的 HTTP 客户端连接池"""
+
+    def __init__(self):
+        """
+        初始化连接池管理器
+
+        同一服务商的所有请求复用同一个客户端，从而复用 TCP/TLS 连接；
+        异步客户端应在应用 lifespan 中创建并在关闭时释放。
+        """
+        self._async_clients: Dict[str, httpx.AsyncClient] = {}
+        self._sync_clients: Dict[str, httpx.Client] = {}
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self, provider: str) -> Dict:
+        settings = PROVIDER_POOL_SETTINGS.get(provider, {"http2": False, "max_connections": 8})
+        return {
+            "http2": settings["http2"] and HTTP2_AVAILABLE,
+            "timeout": DEFAULT_TIMEOUT,
+            "limits": httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_connections"],
+                keepalive_expiry=60.0
+            )
+        }
+
+    def open(self):
+        """为所有已知服务商预先创建异步客户端"""
+        for provider in PROVIDER_POOL_SETTINGS:
+            self.get_async_client(provider)
+
+    def get_async_client(self, provider: str) -> httpx.AsyncClient:
+        """
+        获取服务商共享的异步客户端（不存在时创建）
+
+        Args:
+            provider: 服务商名称，如 "siliconflow"
+
+        Returns:
+            httpx.AsyncClient: 共享的异步客户端
+        """
+        with self._lock:
+            client = self._async_clients.get(provider)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(**self._client_kwargs(provider))
+                self._async_clients[provider] = client
+            return client
+
+    def get_sync_client(self, provider: str) -> httpx.Client:
+        """
+        获取服务商共享的同步客户端（供线程池和命令行脚本使用）
+
+        Args:
+            provider: 服务商名称
+
+        Returns:
+            httpx.Client: 共享的同步客户端
+        """
+        with self._lock:
+            client = self._sync_clients.get(provider)
+            if client is None or client.is_closed:
+                client = httpx.Client(**self._client_kwargs(provider))
+                self._sync_clients[provider] = client
+            return client
+
+    async def aclose(self):
+        """关闭所有客户端"""
+        with self._lock:
+            async_clients = list(self._async_clients.values())
+            sync_clients = list(self._sync_clients.values())
+            self._async_clients.clear()
+            self._sync_clients.clear()
+        for client in async_clients:
+            await client.aclose()
+        for client in sync_clients:
+            client.close()
+
+# 创建全局连接池实例
+http_clients = HTTPClientPool()
@@ -1,7 +1,8 @@
-import requests
+import httpx
 import json
 from typing import Optional
 from config_manager import config_manager
+from http_clients import http_clients
 
 def list_elevenlabs_voices(api_key: Optional[str] = None) -> list:
     """
@@ -34,7 +35,8 @@ def list_elevenlabs_voices(api_key: Optional[str] = None) -> list:
     
     try:
         print("正在发送请求到 ElevenLabs API...")
-        response = requests.get(url, headers=headers, params=params)
+        client = http_clients.get_sync_client("elevenlabs")
+        response = client.get(url, headers=headers, params=params)
         response.raise_for_status()
         
         data = response.json()
@@ -56,7 +58,7 @@ def list_elevenlabs_voices(api_key: Optional[str] = None) -> list:
             
         return formatted_voices
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"请求失败: {str(e)}")
         return []
 
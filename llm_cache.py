@@ -0,0 +1,181 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Any
+from config_manager import config_manager, BASE_DIR
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+class LLMResponseCache:
+    """LLM 响应的持久化缓存（SQLite，支持过期时间和按总大小淘汰）"""
+
+    def __init__(self, db_path: str, ttl_hours: float = 168, max_size_mb: int = 256, enabled: bool = False):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite 数据库路径，相对路径基于项目目录
+            ttl_hours: 缓存有效期(小时)
+            max_size_mb: 缓存总大小上限(MB)，超出时按最近最少使用淘汰
+            enabled: 是否启用缓存
+        """
+        self.db_path = Path(db_path)
+        if not self.db_path.is_absolute():
+            self.db_path = BASE_DIR / self.db_path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if self.enabled:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(_SCHEMA)
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+                )
+
+    @staticmethod
+    def make_key(model: str, base_url: str, system_prompt: str, temperature: float, user_text: str) -> str:
+        """
+        根据模型、接口地址、系统提示词、温度和用户输入生成缓存键
+
+        Returns:
+            str: 十六进制的 sha256 摘要
+        """
+        payload = json.dumps({
+            "model": model,
+            "base_url": str(base_url).rstrip("/"),
+            "system_prompt": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+            "temperature": temperature,
+            "user_text": user_text
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存的响应，不存在或已过期时返回 None
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[str]: 缓存的完整响应文本
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str, model: str = ""):
+        """
+        写入完整响应，并在超出大小上限时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            response: 完整的响应文本
+            model: 生成该响应的模型（仅用于排查）
+        """
+        if not self.enabled or not response:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        """删除过期条目，总大小仍超出上限时按最近最少使用淘汰（调用方需持有锁）"""
+        expired = self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.evictions += max(expired, 0)
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        if not self.enabled:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        entries, size_bytes = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, size_bytes = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "size_bytes": size_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+def _create_llm_cache() -> LLMResponseCache:
+    settings = config_manager.get_config().LLM_CACHE
+    return LLMResponseCache(
+        db_path=settings.path,
+        ttl_hours=settings.ttl_hours,
+        max_size_mb=settings.max_size_mb,
+        enabled=settings.enabled
+    )
+
+# 创建全局 LLM 响应缓存实例
+llm_cache = _create_llm_cache()
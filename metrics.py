@@ -0,0 +1,328 @@
+import time
+import bisect
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from tts_errors import TTSProviderError
+import tracing
+
+# 服务商请求耗时分桶(秒)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+# 对谈渲染各阶段耗时分桶(秒)
+STAGE_BUCKETS = (0.005, 0.025, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 180.0, 600.0)
+
+# Starlette 会为 text/* 自动加上 charset=utf-8
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """带标签的指标基类"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """进入时加一，退出时减一"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(_Metric):
+    """按分桶统计的分布"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> (各分桶计数（不累计）, 总和, 次数)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 块的耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+# 采集时调用的回调，返回 (名称, 类型, 说明, [(标签, 值)])
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+class MetricsRegistry:
+    """指标注册表，按 Prometheus 文本格式输出"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """
+        注册采集回调，用于导出其他模块已有的统计（缓存命中、事件循环延迟等）
+
+        Args:
+            collector: 每次输出时调用，返回 (名称, 类型, 说明, [(标签, 值)]) 的列表
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """按 Prometheus 文本格式输出所有指标"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"采集指标出错: {e}")
+                continue
+            for name, kind, documentation, values in samples:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# 创建全局指标注册表
+registry = MetricsRegistry()
+
+tts_requests = registry.counter(
+    "tts_requests_total", "TTS provider requests by outcome (ok, error, throttled, cancelled)", ("engine", "outcome")
+)
+tts_request_seconds = registry.histogram(
+    "tts_request_duration_seconds", "TTS provider request latency", ("engine",)
+)
+tts_requests_in_flight = registry.gauge(
+    "tts_requests_in_flight", "TTS provider requests currently in progress", ("engine",)
+)
+tts_characters = registry.counter(
+    "tts_characters_total", "Characters sent to TTS providers", ("engine",)
+)
+tts_audio_bytes = registry.counter(
+    "tts_audio_bytes_total", "Audio bytes returned by TTS providers", ("engine",)
+)
+segments_in_flight = registry.gauge(
+    "tts_segments_in_flight", "Dialogue segments being synthesized (including cache lookup and decode)", ("engine",)
+)
+segments_total = registry.counter(
+    "tts_segments_total", "Dialogue segments finished by outcome (ok, failed)", ("engine", "outcome")
+)
+stage_seconds = registry.histogram(
+    "dialogue_stage_duration_seconds", "Time spent in each dialogue render stage", ("stage",), STAGE_BUCKETS
+)
+sse_connections = registry.gauge(
+    "sse_connections", "Open Server-Sent Events connections", ("endpoint",)
+)
+
+def _outcome(error: BaseException) -> str:
+    return "throttled" if isinstance(error, TTSProviderError) and error.throttled else "error"
+
+def _record_result(engine: str, text: Any, result: Any):
+    tts_requests.inc(engine=engine, outcome="ok")
+    if isinstance(text, str):
+        tts_characters.inc(len(text), engine=engine)
+    if isinstance(result, tuple) and result and isinstance(result[0], (bytes, bytearray)):
+        tts_audio_bytes.inc(len(result[0]), engine=engine)
+
+def observe_synthesis(fn: Callable) -> Callable:
+    """
+    记录服务商合成方法（synthesize/asynthesize）的耗时、结果、字符数和返回的字节数
+
+    text_to_speech 调用 synthesize，因此同样被记录。同步和异步方法都可以使用。
+
+    Args:
+        fn: 第一个参数为 text、返回 (音频数据, 格式) 的合成方法
+
+    Returns:
+        Callable: 包装后的方法
+    """
+    def text_of(args, kwargs):
+        return kwargs.get("text", args[0] if args else None)
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(self, *args, **kwargs):
+            engine = self.engine_name
+            started = time.perf_counter()
+            with tts_requests_in_flight.track(engine=engine):
+                try:
+                    result = await fn(self, *args, **kwargs)
+                except BaseException as e:
+                    tts_requests.inc(engine=engine, outcome="cancelled" if isinstance(e, asyncio.CancelledError) else _outcome(e))
+                    raise
+                finally:
+                    tts_request_seconds.observe(time.perf_counter() - started, engine=engine)
+            _record_result(engine, text_of(args, kwargs), result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        engine = self.engine_name
+        started = time.perf_counter()
+        with tts_requests_in_flight.track(engine=engine):
+            try:
+                result = fn(self, *args, **kwargs)
+            except Exception as e:
+                tts_requests.inc(engine=engine, outcome=_outcome(e))
+                raise
+            finally:
+                tts_request_seconds.observe(time.perf_counter() - started, engine=engine)
+        _record_result(engine, text_of(args, kwargs), result)
+        return result
+    return wrapper
+
+async def observe_stream(engine: str, text: Optional[str], stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    observe_synthesis 的流式版本，记录服务商流式请求从发出到读完的耗时、结果、字符数和字节数
+
+    Args:
+        engine: 引擎名称
+        text: 合成的文本
+        stream: 服务商的 astream_audio 生成器
+
+    Yields:
+        bytes: 原始音频数据块
+    """
+    started = time.perf_counter()
+    received = 0
+    with tts_requests_in_flight.track(engine=engine):
+        try:
+            async for chunk in stream:
+                received += len(chunk)
+                yield chunk
+        except BaseException as e:
+            cancelled = isinstance(e, (asyncio.CancelledError, GeneratorExit))
+            tts_requests.inc(engine=engine, outcome="cancelled" if cancelled else _outcome(e))
+            raise
+        finally:
+            tts_request_seconds.observe(time.perf_counter() - started, engine=engine)
+    tts_requests.inc(engine=engine, outcome="ok")
+    if isinstance(text, str):
+        tts_characters.inc(len(text), engine=engine)
+    tts_audio_bytes.inc(received, engine=engine)
+
+@contextmanager
+def time_stage(stage: str):
+    """记录对谈渲染某个阶段（parse、synthesize、assemble、export 等）的耗时，同时记为当前追踪中的区间"""
+    with stage_seconds.time(stage=stage), tracing.span(stage):
+        yield
+
+async def track_connection(endpoint: str, stream: AsyncIterator) -> AsyncIterator:
+    """
+    包装 SSE 事件生成器，连接期间计入 sse_connections
+
+    Args:
+        endpoint: 接口名称，作为标签
+        stream: 原始事件生成器
+
+    Yields:
+        原始事件
+    """
+    with sse_connections.track(endpoint=endpoint):
+        async for event in stream:
+            yield event
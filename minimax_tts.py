@@ -1,22 +1,89 @@
-import requests
 from pathlib import Path
 import json
-from typing import Literal, Union, Dict, List, Tuple
+from typing import Literal, Union, Dict, List, Tuple, Optional, Iterator, AsyncIterator
 import os
 import base64
+import wave
 from config_manager import config_manager  # 使用新的配置管理器
 import re
+from http_clients import http_clients
+from executors import run_blocking
+from tts_errors import TTSProviderError, MINIMAX_STATUS_CODES, raise_for_response
+from metrics import observe_synthesis
+
+class HexAudioStreamDecoder:
+    """逐行解析 MiniMax 流式响应（SSE），把每块十六进制音频立即解码为二进制"""
+
+    def __init__(self, tts: "MiniMaxTTS"):
+        self.tts = tts
+        self.extra_info: Optional[Dict] = None
+        self.finished = False
+        self._carry = ""  # 上一块末尾落单的十六进制字符
+        self._other_lines: List[str] = []
+
+    def feed(self, line: str) -> Optional[bytes]:
+        """
+        处理一行响应
+
+        Args:
+            line: 响应中的一行
+
+        Returns:
+            Optional[bytes]: 该行包含的音频数据，没有时返回 None
+
+        Raises:
+            TTSProviderError: 事件中的业务状态码表示出错
+        """
+        line = line.strip()
+        if not line:
+            return None
+        if not line.startswith("data:"):
+            # 参数错误等情况下返回的是普通 JSON 而不是事件流
+            self._other_lines.append(line)
+            return None
+        event = json.loads(line[5:])
+        if "base_resp" in event:
+            self.tts._check_base_resp(event["base_resp"])
+        data = event.get("data") or {}
+        if data.get("status") == 2:
+            # 最后一块是汇总（已通过 exclude_aggregated_audio 省略音频），只取元信息
+            self.finished = True
+            self.extra_info = event.get("extra_info")
+            return None
+        audio = self._carry + (data.get("audio") or "")
+        if len(audio) % 2:
+            audio, self._carry = audio[:-1], audio[-1]
+        else:
+            self._carry = ""
+        return bytes.fromhex(audio) if audio else None
+
+    def finish(self):
+        """
+        响应结束后检查是否完整
+
+        Raises:
+            TTSProviderError: 返回了错误 JSON，或流在最后一块之前中断（可重试）
+        """
+        if self._other_lines:
+            result = json.loads("".join(self._other_lines))
+            self.tts._check_base_resp(result.get("base_resp", {}))
+        if not self.finished:
+            raise TTSProviderError(self.tts.engine_name, "流式响应在结束前中断", status_code=502)
 
 class MiniMaxTTS:
     """MiniMax T2A V2 API 封装类"""
     
+    engine_name = "minimax"
+    
     def __init__(self):
         """初始化 MiniMax TTS 客户端"""
         config = config_manager.get_config()
         self.group_id = config.API_KEYS.minimax_group_id
         self.api_key = config.API_KEYS.minimax_api_key
         self.default_model = config.MODELS.minimax_default_model
-        self.base_url = "https://api.minimax.chat/v1/t2a_v2"
+        api_root = config.PROVIDER_BASE_URLS.minimax or "https://api.minimax.chat/v1"
+        self.base_url = f"{api_root.rstrip('/')}/t2a_v2"
+        self.stream = config.STREAMING.minimax  # 未指定 stream 时是否使用流式接口
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -101,6 +168,246 @@ class MiniMaxTTS:
         
         return text
     
+    def _build_payload(
+        self,
+        text: str,
+        voice_name: str,
+        model: str,
+        response_format: str,
+        speed: float,
+        gain: float,
+        stream: bool = False
+    ) -> Tuple[Dict, str]:
+        """调整参数并构建请求体，返回 (请求体, 实际请求的格式)"""
+        # 参数验证和调整
+        if not (0.5 <= speed <= 2.0):
+            speed = max(0.5, min(speed, 2.0))  # 限制在可接受范围内
+        
+        # 在MiniMax中gain对应volume参数，转换为可接受的范围
+        volume = min(max(gain + 1.0, 0.0), 2.0)
+        
+        # 确保响应格式是支持的格式
+        supported_formats = ["mp3", "wav", "pcm", "flac"]
+        if response_format not in supported_formats:
+            response_format = "mp3"  # 默认使用mp3
+        # 流式接口只支持 mp3、pcm 和 flac，wav 改为请求 pcm（拼接时无需再解码）
+        if stream and response_format == "wav":
+            response_format = "pcm"
+        
+        # 确保使用支持的模型
+        if model not in self.supported_models:
+            model = self.default_model  # 使用默认模型
+        
+        # 构建请求参数
+        payload = {
+            "model": model,
+            "text": self._preprocess_text(text),
+            "stream": stream,
+            "voice_setting": {
+                "voice_id": voice_name,
+                "speed": speed,
+                "vol": volume,
+                "pitch": 0  # 音高，范围[-12, 12]，默认0
+            },
+            "audio_setting": {
+                "sample_rate": 32000,  # 采样率
+                "bitrate": 128000,     # 比特率
+                "format": response_format,
+                "channel": 1           # 单声道
+            }
+        }
+        if stream:
+            # 最后一块默认是前面所有音频块的汇总，各块已逐块解码，不再重复返回
+            payload["stream_options"] = {"exclude_aggregated_audio": True}
+        return payload, response_format
+
+    def _check_base_resp(self, base_resp: Dict):
+        """检查业务状态码，出错时抛出 TTSProviderError"""
+        status_code = base_resp.get('status_code')
+        if status_code != 0:
+            error_msg = base_resp.get('status_msg', '未知错误')
+            # 业务错误码映射为等价的 HTTP 状态码，便于限流器判断是否重试
+            raise TTSProviderError(
+                self.engine_name,
+                f"API返回错误({status_code}): {error_msg}",
+                status_code=MINIMAX_STATUS_CODES.get(status_code, 400)
+            )
+
+    def _parse_result(self, result: Dict, response_format: str) -> Tuple[bytes, str]:
+        """从响应JSON中取出音频数据"""
+        # 检查返回状态
+        self._check_base_resp(result.get('base_resp', {}))
+        
+        # 从响应中提取音频数据
+        if "data" not in result or "audio" not in result["data"]:
+            raise RuntimeError(f"audio data not found in response: {result}")
+        
+        # 将hex编码的音频数据转换为二进制
+        audio_data = bytes.fromhex(result["data"]["audio"])
+        
+        # 获取实际的音频格式
+        actual_format = result.get('extra_info', {}).get('audio_format', response_format)
+        if actual_format == "pcm":
+            actual_format = "pcm_32000"
+        return audio_data, actual_format
+
+    def stream_audio(
+        self,
+        text: str,
+        voice_name: str = "female-chengshu",
+        model: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "pcm",
+        speed: float = 1.0,
+        gain: float = 0.0
+    ) -> Iterator[bytes]:
+        """
+        使用流式接口合成，边接收边解码，逐块返回二进制音频
+
+        wav 会改为请求 pcm（32kHz 16bit 单声道），实际格式可通过 stream_format 获取。
+
+        Args:
+            参数含义同 text_to_speech
+
+        Yields:
+            bytes: 音频数据块
+
+        Raises:
+            httpx.HTTPError: 网络请求失败
+            TTSProviderError: API 返回错误状态或流在结束前中断
+        """
+        payload, _ = self._build_payload(text, voice_name, model, response_format, speed, gain, stream=True)
+        url = f"{self.base_url}?GroupId={self.group_id}"
+        decoder = HexAudioStreamDecoder(self)
+        
+        client = http_clients.get_sync_client(self.engine_name)
+        with client.stream("POST", url, json=payload, headers=self.headers) as response:
+            if response.is_error:
+                response.read()
+            raise_for_response(self.engine_name, response)
+            for line in response.iter_lines():
+                chunk = decoder.feed(line)
+                if chunk:
+                    yield chunk
+        decoder.finish()
+
+    async def astream_audio(
+        self,
+        text: str,
+        voice_name: str = "female-chengshu",
+        model: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "pcm",
+        speed: float = 1.0,
+        gain: float = 0.0
+    ) -> AsyncIterator[bytes]:
+        """stream_audio 的异步版本，使用共享的异步连接池"""
+        payload, _ = self._build_payload(text, voice_name, model, response_format, speed, gain, stream=True)
+        url = f"{self.base_url}?GroupId={self.group_id}"
+        decoder = HexAudioStreamDecoder(self)
+        
+        client = http_clients.get_async_client(self.engine_name)
+        async with client.stream("POST", url, json=payload, headers=self.headers) as response:
+            if response.is_error:
+                await response.aread()
+            raise_for_response(self.engine_name, response)
+            async for line in response.aiter_lines():
+                chunk = decoder.feed(line)
+                if chunk:
+                    yield chunk
+        decoder.finish()
+
+    @staticmethod
+    def stream_format(response_format: str) -> str:
+        """stream_audio 返回的实际音频格式（与 _build_payload 的格式调整一致）"""
+        if response_format in ("wav", "pcm"):
+            return "pcm_32000"
+        return response_format if response_format == "flac" else "mp3"
+
+    @observe_synthesis
+    def synthesize(
+        self,
+        text: str,
+        voice_name: str = "female-chengshu",
+        model: str = None,  # 默认使用config中的模型
+        response_format: Literal["mp3", "wav", "pcm"] = "mp3",
+        speed: float = 1.0,
+        gain: float = 0.0,
+        stream: Optional[bool] = None
+    ) -> Tuple[bytes, str]:
+        """
+        将文本转换为语音，直接返回音频数据
+
+        流式模式下音频块边接收边解码到缓冲区，不必同时持有完整的十六进制字符串、
+        解析后的 JSON 和二进制音频，峰值内存约为非流式的三分之一。
+
+        Args:
+            参数含义同 text_to_speech
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 实际音频格式)
+
+        Raises:
+            httpx.HTTPError: 网络请求失败
+            TTSProviderError: API 返回错误状态
+            RuntimeError: 响应中没有音频数据
+        """
+        if self.stream if stream is None else stream:
+            buffer = bytearray()
+            for chunk in self.stream_audio(text, voice_name, model, response_format, speed, gain):
+                buffer += chunk
+            return bytes(buffer), self.stream_format(response_format)
+        
+        payload, response_format = self._build_payload(
+            text, voice_name, model, response_format, speed, gain
+        )
+        
+        # 构建完整URL
+        url = f"{self.base_url}?GroupId={self.group_id}"
+        
+        # 发送请求
+        client = http_clients.get_sync_client(self.engine_name)
+        response = client.post(url, json=payload, headers=self.headers)
+        
+        # 检查响应状态
+        raise_for_response(self.engine_name, response)
+        
+        # 解析响应
+        return self._parse_result(response.json(), response_format)
+
+    @observe_synthesis
+    async def asynthesize(
+        self,
+        text: str,
+        voice_name: str = "female-chengshu",
+        model: str = None,
+        response_format: Literal["mp3", "wav", "pcm"] = "mp3",
+        speed: float = 1.0,
+        gain: float = 0.0,
+        stream: Optional[bool] = None
+    ) -> Tuple[bytes, str]:
+        """
+        synthesize 的异步版本，使用共享的异步连接池
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 实际音频格式)
+        """
+        if self.stream if stream is None else stream:
+            buffer = bytearray()
+            async for chunk in self.astream_audio(text, voice_name, model, response_format, speed, gain):
+                buffer += chunk
+            return bytes(buffer), self.stream_format(response_format)
+        
+        payload, response_format = self._build_payload(
+            text, voice_name, model, response_format, speed, gain
+        )
+        url = f"{self.base_url}?GroupId={self.group_id}"
+        
+        client = http_clients.get_async_client(self.engine_name)
+        response = await client.post(url, json=payload, headers=self.headers)
+        raise_for_response(self.engine_name, response)
+        
+        # 较长音频的 JSON 解析和十六进制解码较耗时，放到线程池中执行
+        return await run_blocking(lambda: self._parse_result(response.json(), response_format))
+    
     def text_to_speech(
         self,
         text: str,
@@ -110,7 +417,7 @@ class MiniMaxTTS:
         response_format: Literal["mp3", "wav", "pcm"] = "mp3",
         speed: float = 1.0,
         gain: float = 0.0,
-        stream: bool = False
+        stream: Optional[bool] = None
     ) -> Tuple[bool, str]:
         """
         将文本转换为语音
@@ -123,7 +430,7 @@ class MiniMaxTTS:
             response_format: 输出音频格式，MiniMax支持mp3、wav等格式
             speed: 语速，范围 [0.5, 2.0]，默认 1.0
             gain: 音量增益，范围 [0.0, 2.0]，默认 1.0
-            stream: 是否使用流式传输，此参数在MiniMax中暂不支持
+            stream: 是否使用流式接口（边接收边解码），None 时按 STREAMING.minimax 配置
 
         Returns:
             tuple: (成功状态, 实际格式)
@@ -131,82 +438,27 @@ class MiniMaxTTS:
                 - 第二个元素是str类型，表示实际的音频格式（'mp3'或'wav'等）
         """
         try:
-            # 参数验证和调整
-            if not (0.5 <= speed <= 2.0):
-                speed = max(0.5, min(speed, 2.0))  # 限制在可接受范围内
-            
-            # 在MiniMax中gain对应volume参数，转换为可接受的范围
-            volume = min(max(gain + 1.0, 0.0), 2.0)
-            
-            # 确保响应格式是支持的格式
-            supported_formats = ["mp3", "wav", "pcm", "flac"]
-            if response_format not in supported_formats:
-                response_format = "mp3"  # 默认使用mp3
-            
-            # 确保使用支持的模型
-            if model not in self.supported_models:
-                model = self.default_model  # 使用默认模型
-            
-            # 构建请求参数
-            payload = {
-                "model": model,
-                "text": self._preprocess_text(text),
-                "stream": False,  # 非流式请求
-                "voice_setting": {
-                    "voice_id": voice_name,
-                    "speed": speed,
-                    "vol": volume,
-                    "pitch": 0  # 音高，范围[-12, 12]，默认0
-                },
-                "audio_setting": {
-                    "sample_rate": 32000,  # 采样率
-                    "bitrate": 128000,     # 比特率
-                    "format": response_format,
-                    "channel": 1           # 单声道
-                }
-            }
-            
-            # 构建完整URL
-            url = f"{self.base_url}?GroupId={self.group_id}"
-            
-            # 发送请求
-            response = requests.post(
-                url,
-                json=payload,
-                headers=self.headers
+            audio_data, actual_format = self.synthesize(
+                text, voice_name, model, response_format, speed, gain, stream
             )
             
-            # 检查响应状态
-            response.raise_for_status()
-            
-            # 解析响应
-            result = response.json()
+            # 写入文件
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # 检查返回状态
-            if result.get('base_resp', {}).get('status_code') != 0:
-                error_msg = result.get('base_resp', {}).get('status_msg', '未知错误')
-                print(f"API返回错误: {error_msg}")
-                return False, ""
+            with open(output_path, 'wb') as f:
+                if actual_format.startswith("pcm_") and response_format == "wav":
+                    # 流式接口请求 wav 时返回的是原始 PCM，加上 WAV 文件头再写入
+                    with wave.open(f, 'wb') as wav_file:
+                        wav_file.setnchannels(1)
+                        wav_file.setsampwidth(2)
+                        wav_file.setframerate(int(actual_format.split("_")[1]))
+                        wav_file.writeframes(audio_data)
+                    return True, "wav"
+                f.write(audio_data)
             
-            # 从响应中提取音频数据
-            if "data" in result and "audio" in result["data"]:
-                # 将hex编码的音频数据转换为二进制
-                audio_data = bytes.fromhex(result["data"]["audio"])
-                
-                # 写入文件
-                output_path = Path(output_path)
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(output_path, 'wb') as f:
-                    f.write(audio_data)
-                
-                # 获取实际的音频格式
-                actual_format = result.get('extra_info', {}).get('audio_format', response_format)
-                return True, actual_format
-            else:
-                print(f"Error: audio data not found in response")
-                print(f"Response content: {result}")
-                return False, ""
+            # 保持原有返回值约定，pcm 不带采样率后缀
+            return True, actual_format.split("_")[0]
                 
         except Exception as e:
             print(f"Error occurred during MiniMax API call: {e}")
@@ -0,0 +1,215 @@
+import io
+import math
+import time
+import wave
+import random
+import asyncio
+import hashlib
+from array import array
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Tuple, Union
+from config_manager import config_manager
+from tts_errors import TTSProviderError
+from metrics import observe_synthesis
+
+# 预置音色: 音色ID -> (描述, 基频Hz)
+MOCK_VOICES = {
+    "mock-female": ("模拟女声", 220.0),
+    "mock-male": ("模拟男声", 120.0),
+    "mock-child": ("模拟童声", 300.0),
+}
+
+# 这些字符合成为停顿
+PAUSE_CHARS = set("，。！？、；：,.!?;: \n…—")
+
+# 不同频率的单周期波形缓存: (采样率, 周期采样数) -> bytes
+_cycle_cache: Dict[Tuple[int, int], bytes] = {}
+
+def _cycle(sample_rate: int, frequency: float) -> bytes:
+    """生成一个周期的 16bit 正弦波"""
+    period = max(2, round(sample_rate / frequency))
+    key = (sample_rate, period)
+    cycle = _cycle_cache.get(key)
+    if cycle is None:
+        samples = array('h', (int(6000 * math.sin(2 * math.pi * i / period)) for i in range(period)))
+        cycle = _cycle_cache[key] = samples.tobytes()
+    return cycle
+
+def _base_frequency(voice: str) -> float:
+    """预置音色使用固定基频，其余音色由名称的哈希值决定"""
+    if voice in MOCK_VOICES:
+        return MOCK_VOICES[voice][1]
+    digest = hashlib.sha256(voice.encode("utf-8")).digest()
+    return 110.0 + digest[0]
+
+def synthesize_pcm(
+    text: str,
+    voice: str = "mock-female",
+    sample_rate: int = 24000,
+    chars_per_second: float = 5.0,
+    speed: float = 1.0
+) -> bytes:
+    """
+    确定性地生成与文本长度相符的 16bit 单声道 PCM
+
+    每个字符对应一段固定时长的音调（频率由字符和音色决定），标点和空白对应静音，
+    相同的输入总是得到相同的音频。
+
+    Args:
+        text: 文本
+        voice: 音色
+        sample_rate: 采样率
+        chars_per_second: 每秒朗读的字符数
+        speed: 语速倍率
+
+    Returns:
+        bytes: PCM 数据
+    """
+    char_samples = max(1, int(sample_rate / (chars_per_second * max(speed, 0.1))))
+    base = _base_frequency(voice)
+    silence = b"\x00\x00" * char_samples
+    chunks = []
+    for ch in text.strip() or " ":
+        if ch in PAUSE_CHARS:
+            chunks.append(silence)
+            continue
+        cycle = _cycle(sample_rate, base * (1 + (ord(ch) % 12) / 12))
+        repeats = char_samples * 2 // len(cycle) + 1
+        chunks.append((cycle * repeats)[:char_samples * 2])
+    return b"".join(chunks)
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """为 16bit 单声道 PCM 加上 WAV 文件头"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+def sample_latency(p50_ms: float, p99_ms: float, rng: random.Random) -> float:
+    """
+    按对数正态分布抽取一次请求耗时
+
+    Args:
+        p50_ms: 耗时中位数(毫秒)
+        p99_ms: 耗时 p99(毫秒)
+        rng: 随机数生成器
+
+    Returns:
+        float: 耗时(秒)
+    """
+    if p50_ms <= 0:
+        return 0.0
+    sigma = math.log(max(p99_ms, p50_ms) / p50_ms) / 2.326  # 2.326 为标准正态分布的 p99
+    return rng.lognormvariate(math.log(p50_ms), sigma) / 1000
+
+class MockTTS:
+    """本地模拟 TTS 引擎，用于压测和离线开发，不访问网络也不消耗服务商额度"""
+
+    engine_name = "mock"
+
+    def __init__(self):
+        """初始化模拟引擎，延迟分布、错误率和限流比例取自 AppConfig.MOCK_TTS"""
+        self.settings = config_manager.get_config().MOCK_TTS
+        self.api_key = "mock"
+        self.default_model = "mock-v1"
+        self.rng = random.Random(self.settings.seed)
+        self.preset_voices = {voice_id: description for voice_id, (description, _) in MOCK_VOICES.items()}
+
+    def _next_outcome(self) -> Tuple[float, Optional[TTSProviderError]]:
+        """抽取本次请求的耗时和要注入的错误"""
+        latency = sample_latency(self.settings.latency_p50_ms, self.settings.latency_p99_ms, self.rng)
+        roll = self.rng.random()
+        if roll < self.settings.throttle_rate:
+            return latency * 0.1, TTSProviderError(
+                self.engine_name, "rate limit exceeded", status_code=429,
+                retry_after=self.settings.retry_after
+            )
+        if roll < self.settings.throttle_rate + self.settings.error_rate:
+            return latency, TTSProviderError(self.engine_name, "internal error", status_code=500)
+        return latency, None
+
+    def _render(self, text: str, voice_name: str, response_format: str, speed: float) -> Tuple[bytes, str]:
+        sample_rate = self.settings.sample_rate
+        pcm = synthesize_pcm(text, voice_name, sample_rate, self.settings.chars_per_second, speed)
+        if response_format == "pcm":
+            return pcm, f"pcm_{sample_rate}"
+        # 其他格式一律返回 WAV，不依赖 FFmpeg
+        return pcm_to_wav(pcm, sample_rate), "wav"
+
+    @observe_synthesis
+    def synthesize(
+        self,
+        text: str,
+        voice_name: str = "mock-female",
+        model: str = None,
+        response_format: Literal["wav", "pcm"] = "wav",
+        speed: float = 1.0,
+        gain: float = 0.0,
+        stream: bool = False,
+        stability: float = None,
+        similarity_boost: float = None
+    ) -> Tuple[bytes, str]:
+        """
+        模拟合成：按配置的延迟分布等待后返回确定性的音频
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 音频格式)
+
+        Raises:
+            TTSProviderError: 按配置的比例注入的 500 或 429 错误
+        """
+        latency, error = self._next_outcome()
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return self._render(text, voice_name, response_format, speed)
+
+    @observe_synthesis
+    async def asynthesize(
+        self,
+        text: str,
+        voice_name: str = "mock-female",
+        model: str = None,
+        response_format: Literal["wav", "pcm"] = "wav",
+        speed: float = 1.0,
+        gain: float = 0.0,
+        stream: bool = False,
+        stability: float = None,
+        similarity_boost: float = None
+    ) -> Tuple[bytes, str]:
+        """synthesize 的异步版本"""
+        latency, error = self._next_outcome()
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return self._render(text, voice_name, response_format, speed)
+
+    def text_to_speech(
+        self,
+        text: str,
+        output_path: Union[str, Path],
+        voice_name: str = "mock-female",
+        response_format: Literal["wav", "pcm"] = "wav",
+        speed: float = 1.0
+    ) -> bool:
+        """将模拟音频写入文件"""
+        try:
+            audio_data, _ = self.synthesize(text, voice_name, response_format=response_format, speed=speed)
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(output_path, 'wb') as f:
+                f.write(audio_data)
+            return True
+        except TTSProviderError as e:
+            print(f"Error occurred during mock synthesis: {e}")
+            return False
+
+    def get_voices_for_ui(self) -> List[Dict]:
+        """获取用于UI展示的音色列表"""
+        return [
+            {"id": voice_id, "name": f"{voice_id} ({description})"}
+            for voice_id, description in self.preset_voices.items()
+        ]
@@ -0,0 +1,206 @@
+"""
+模拟 SiliconFlow、MiniMax 和 ElevenLabs 接口的本地 HTTP 服务，用于压测和离线开发
+
+将 config.json 中 PROVIDER_BASE_URLS 的各项设为 http://127.0.0.1:<端口>/v1 后，
+应用会像访问真实服务商一样访问本服务（相同的请求格式、响应格式和错误格式）。
+
+用法:
+    python mock_tts_server.py --port 8900 --latency-p50 300 --latency-p99 1500 --error-rate 0.01 --throttle-rate 0.05
+"""
+
+import io
+import json
+import asyncio
+import random
+import argparse
+from typing import Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydub import AudioSegment
+from mock_tts import synthesize_pcm, pcm_to_wav, sample_latency
+
+class MockServerSettings:
+    """模拟服务的延迟分布与错误注入配置"""
+    latency_p50_ms: float = 300
+    latency_p99_ms: float = 1500
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    chars_per_second: float = 5.0
+
+settings = MockServerSettings()
+rng = random.Random()
+
+app = FastAPI(title="Mock TTS Providers")
+
+async def _simulate() -> Optional[str]:
+    """
+    按配置等待一段时间，并决定是否注入错误
+
+    Returns:
+        Optional[str]: "throttle"、"error" 或 None
+    """
+    latency = sample_latency(settings.latency_p50_ms, settings.latency_p99_ms, rng)
+    roll = rng.random()
+    if roll < settings.throttle_rate:
+        await asyncio.sleep(latency * 0.1)
+        return "throttle"
+    await asyncio.sleep(latency)
+    if roll < settings.throttle_rate + settings.error_rate:
+        return "error"
+    return None
+
+def _retry_after_headers():
+    return {"Retry-After": f"{settings.retry_after:g}"}
+
+def _encode(text: str, voice: str, audio_format: str, sample_rate: int, speed: float = 1.0) -> bytes:
+    """生成指定格式的音频（mp3 等压缩格式需要 FFmpeg）"""
+    pcm = synthesize_pcm(text, voice, sample_rate, settings.chars_per_second, speed)
+    if audio_format == "pcm":
+        return pcm
+    if audio_format == "wav":
+        return pcm_to_wav(pcm, sample_rate)
+    segment = AudioSegment(data=pcm, sample_width=2, frame_rate=sample_rate, channels=1)
+    buffer = io.BytesIO()
+    segment.export(buffer, format=audio_format)
+    return buffer.getvalue()
+
+@app.post("/v1/audio/speech")
+async def siliconflow_speech(request: Request):
+    """SiliconFlow: 请求体为 JSON，响应体为原始音频"""
+    payload = await request.json()
+    outcome = await _simulate()
+    if outcome == "throttle":
+        return JSONResponse(
+            {"code": 50603, "message": "System is too busy now. Please try again later.", "data": None},
+            status_code=429, headers=_retry_after_headers()
+        )
+    if outcome == "error":
+        return JSONResponse({"code": 50500, "message": "Internal Server Error", "data": None}, status_code=500)
+
+    audio_format = payload.get("response_format", "mp3")
+    sample_rate = payload.get("sample_rate") or (44100 if audio_format in ("pcm", "wav") else 32000)
+    audio = await asyncio.to_thread(
+        _encode, payload.get("input", ""), payload.get("voice", ""), audio_format,
+        sample_rate, payload.get("speed", 1.0)
+    )
+    media_type = "audio/mpeg" if audio_format == "mp3" else f"audio/{audio_format}"
+    if payload.get("stream"):
+        async def chunks():
+            for i in range(0, len(audio), 8192):
+                yield audio[i:i + 8192]
+        return StreamingResponse(chunks(), media_type=media_type)
+    return Response(audio, media_type=media_type)
+
+@app.post("/v1/t2a_v2")
+async def minimax_t2a(request: Request):
+    """
+    MiniMax: 音频以十六进制字符串放在 JSON 中，业务错误通过 HTTP 200 + base_resp 返回
+
+    stream 为 true 时以事件流逐块返回十六进制音频（status=1），最后一块（status=2）为汇总，
+    请求 stream_options.exclude_aggregated_audio 时汇总块不含音频。
+    """
+    payload = await request.json()
+    outcome = await _simulate()
+    if outcome == "throttle":
+        return JSONResponse({"base_resp": {"status_code": 1002, "status_msg": "rate limit exceeded(RPM)"}})
+    if outcome == "error":
+        return JSONResponse({"base_resp": {"status_code": 1013, "status_msg": "internal error"}})
+
+    audio_setting = payload.get("audio_setting", {})
+    voice_setting = payload.get("voice_setting", {})
+    audio_format = audio_setting.get("format", "mp3")
+    sample_rate = audio_setting.get("sample_rate", 32000)
+    if payload.get("stream") and audio_format == "wav":
+        return JSONResponse({"base_resp": {"status_code": 2013, "status_msg": "invalid params, wav is not supported in stream mode"}})
+    audio = await asyncio.to_thread(
+        _encode, payload.get("text", ""), voice_setting.get("voice_id", ""), audio_format,
+        sample_rate, voice_setting.get("speed", 1.0)
+    )
+    extra_info = {
+        "audio_length": len(audio),
+        "audio_sample_rate": sample_rate,
+        "audio_size": len(audio),
+        "audio_format": audio_format,
+        "audio_channel": 1,
+        "usage_characters": len(payload.get("text", ""))
+    }
+    trace_id = f"mock-{rng.getrandbits(64):016x}"
+    success = {"status_code": 0, "status_msg": "success"}
+
+    if payload.get("stream"):
+        exclude_aggregated = payload.get("stream_options", {}).get("exclude_aggregated_audio", False)
+
+        async def events():
+            for i in range(0, len(audio), 8192):
+                chunk = {"data": {"audio": audio[i:i + 8192].hex(), "status": 1}, "trace_id": trace_id, "base_resp": success}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0)
+            final = {
+                "data": {"audio": "" if exclude_aggregated else audio.hex(), "status": 2},
+                "extra_info": extra_info, "trace_id": trace_id, "base_resp": success
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return JSONResponse({
+        "data": {"audio": audio.hex(), "status": 2},
+        "extra_info": extra_info,
+        "trace_id": trace_id,
+        "base_resp": success
+    })
+
+@app.post("/v1/text-to-speech/{voice_id}")
+@app.post("/v1/text-to-speech/{voice_id}/stream")
+async def elevenlabs_tts(voice_id: str, request: Request, output_format: str = "mp3_44100_128"):
+    """ElevenLabs: output_format 为 mp3_<采样率>_<码率> 或 pcm_<采样率>"""
+    payload = await request.json()
+    outcome = await _simulate()
+    if outcome == "throttle":
+        return JSONResponse(
+            {"detail": {"status": "too_many_concurrent_requests", "message": "Too many concurrent requests."}},
+            status_code=429, headers=_retry_after_headers()
+        )
+    if outcome == "error":
+        return JSONResponse({"detail": {"status": "internal_error", "message": "Internal error."}}, status_code=500)
+
+    audio_format, _, rest = output_format.partition("_")
+    sample_rate = int(rest.split("_")[0]) if rest else 44100
+    speed = payload.get("voice_settings", {}).get("speed", 1.0)
+    audio = await asyncio.to_thread(_encode, payload.get("text", ""), voice_id, audio_format, sample_rate, speed)
+    media_type = "audio/mpeg" if audio_format == "mp3" else "application/octet-stream"
+    if request.url.path.endswith("/stream"):
+        # 流式接口按块返回（chunked 传输）
+        async def chunks():
+            for offset in range(0, len(audio), 8192):
+                yield audio[offset:offset + 8192]
+                await asyncio.sleep(0)
+        return StreamingResponse(chunks(), media_type=media_type)
+    return Response(audio, media_type=media_type)
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟 TTS 服务商接口的本地服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8900, help='监听端口')
+    parser.add_argument('--latency-p50', type=float, default=300, help='请求耗时中位数(毫秒)')
+    parser.add_argument('--latency-p99', type=float, default=1500, help='请求耗时 p99(毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回服务端错误的比例')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='返回 429 限流的比例')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429 响应的 Retry-After(秒)')
+    parser.add_argument('--chars-per-second', type=float, default=5.0, help='生成音频时每秒朗读的字符数')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子，固定后延迟和错误序列可复现')
+    args = parser.parse_args()
+
+    settings.latency_p50_ms = args.latency_p50
+    settings.latency_p99_ms = args.latency_p99
+    settings.error_rate = args.error_rate
+    settings.throttle_rate = args.throttle_rate
+    settings.retry_after = args.retry_after
+    settings.chars_per_second = args.chars_per_second
+    rng.seed(args.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
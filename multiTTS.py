@@ -1,12 +1,18 @@
-import re
-import os
-import tempfile
-from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+import time
+import asyncio
+from concurrent.futures import Future
+from typing import List, Tuple, Dict, Optional, Any, AsyncIterator, Awaitable
 from pydub import AudioSegment
 from tts_api import SiliconFlowTTS
-from aliyun_tts import AliyunCosyVoiceTTS
-from elevenlabs_tts import ElevenLabsTTS
+from synthesis import (
+    synthesis_pool, synthesize_segment, asynthesize_segment, astream_segment,
+    supports_pcm_stream, get_engine_name
+)
+from audio_stream import wav_stream_header, segment_to_pcm, silence_pcm
+from audio_encoder import MultiFormatExporter
+from executors import run_blocking
+from dialogue_parser import parse_dialogue
+from metrics import time_stage, stage_seconds
 
 class DialogueTTS:
     """对谈模式TTS处理类"""
@@ -22,6 +28,158 @@ class DialogueTTS:
         self.host_tts = host_tts_client
         self.guest_tts = guest_tts_client
         
+    def prepare_segments(
+        self,
+        dialogue_text: str,
+        host_voice: str = "anna",
+        guest_voice: str = "alex",
+        model: str = "FunAudioLLM/CosyVoice2-0.5B",
+        response_format: str = "wav",
+        host_speed: float = 1.0,
+        guest_speed: float = 1.0,
+        host_stability: Optional[float] = None,
+        host_similarity_boost: Optional[float] = None,
+        guest_stability: Optional[float] = None,
+        guest_similarity_boost: Optional[float] = None
+    ) -> List[Tuple[str, Any, Dict]]:
+        """
+        解析对话文本并为每句对话构建合成任务
+        
+        Args:
+            参数含义同 generate_dialogue_audio
+            
+        Returns:
+            List[Tuple[str, Any, Dict]]: 按脚本顺序排列的 (角色, TTS客户端, TTS参数)
+        """
+        # 解析对话文本
+        with time_stage("parse"):
+            parsed_dialogue = self._parse_dialogue(dialogue_text)
+        if not parsed_dialogue:
+            raise ValueError("无法解析对话文本，请检查格式是否正确")
+        
+        return [
+            self.build_segment(
+                role, content, host_voice, guest_voice, model, response_format,
+                host_speed, guest_speed, host_stability, host_similarity_boost,
+                guest_stability, guest_similarity_boost
+            )
+            for role, content in parsed_dialogue
+        ]
+    
+    def build_segment(
+        self,
+        role: str,
+        content: str,
+        host_voice: str = "anna",
+        guest_voice: str = "alex",
+        model: str = "FunAudioLLM/CosyVoice2-0.5B",
+        response_format: str = "wav",
+        host_speed: float = 1.0,
+        guest_speed: float = 1.0,
+        host_stability: Optional[float] = None,
+        host_similarity_boost: Optional[float] = None,
+        guest_stability: Optional[float] = None,
+        guest_similarity_boost: Optional[float] = None
+    ) -> Tuple[str, Any, Dict]:
+        """
+        为单句对话构建合成任务（流水线模式下每解析出一句就立即调用）
+        
+        Args:
+            role: 角色，"主持人" 或 "嘉宾"
+            content: 对话内容
+            其余参数含义同 generate_dialogue_audio
+            
+        Returns:
+            Tuple[str, Any, Dict]: (角色, TTS客户端, TTS参数)
+            
+        Raises:
+            ValueError: 角色不是主持人或嘉宾
+        """
+        if role == "主持人":
+            current_tts = self.host_tts
+            voice = host_voice
+            speed = host_speed
+        elif role == "嘉宾":
+            current_tts = self.guest_tts
+            voice = guest_voice
+            speed = guest_speed
+        else:
+            # 只有两个音色，其他角色不能默认用嘉宾的音色朗读
+            raise ValueError(f"不支持的角色: {role}，对谈模式只支持 [主持人] 和 [嘉宾]")
+            
+        # 判断是否需要进行硅基流动TTS的预处理 (根据当前使用的TTS实例)
+        need_preprocess = isinstance(current_tts, SiliconFlowTTS)
+        
+        # 如果是硅基流动TTS，对内容进行预处理
+        if need_preprocess:
+            content = current_tts._preprocess_text(content)
+        
+        # 构建 TTS 参数字典
+        tts_params = {
+            "text": content,
+            "voice_name": voice,
+            "model": model,
+            "response_format": response_format,
+            "speed": speed
+        }
+        
+        # 添加 ElevenLabs 特定参数
+        if role == "主持人":
+            if host_stability is not None:
+                tts_params["stability"] = host_stability
+            if host_similarity_boost is not None:
+                tts_params["similarity_boost"] = host_similarity_boost
+        else:  # 嘉宾
+            if guest_stability is not None:
+                tts_params["stability"] = guest_stability
+            if guest_similarity_boost is not None:
+                tts_params["similarity_boost"] = guest_similarity_boost
+        
+        return role, current_tts, tts_params
+    
+    def submit_segments(self, tasks: List[Tuple[str, Any, Dict]]) -> List[Future]:
+        """
+        将合成任务按引擎提交到有界线程池
+        
+        Args:
+            tasks: prepare_segments 返回的任务列表
+            
+        Returns:
+            List[Future]: 与任务顺序一致的合成结果，失败的片段结果为 None
+        """
+        return [
+            synthesis_pool.submit(
+                get_engine_name(tts), synthesize_segment,
+                tts, tts_params, True
+            )
+            for role, tts, tts_params in tasks
+        ]
+    
+    def create_segment_tasks(self, tasks: List[Tuple[str, Any, Dict]]) -> List["asyncio.Task"]:
+        """
+        为每个合成任务创建受引擎并发上限约束的异步任务（需在事件循环中调用）
+        
+        Args:
+            tasks: prepare_segments 返回的任务列表
+            
+        Returns:
+            List[asyncio.Task]: 与任务顺序一致的异步任务，失败的片段结果为 None
+        """
+        return [
+            synthesis_pool.create_task(
+                get_engine_name(tts), asynthesize_segment,
+                tts, tts_params, True
+            )
+            for role, tts, tts_params in tasks
+        ]
+    
+    @staticmethod
+    def pause_before(role: str, prev_role: Optional[str], silence_duration: int) -> int:
+        """计算当前片段前的停顿时长(毫秒)，换人说话时多停顿100毫秒"""
+        if prev_role is None:
+            return 0
+        return silence_duration + 100 if role != prev_role else silence_duration
+        
     def generate_dialogue_audio(
         self,
         dialogue_text: str,
@@ -36,10 +194,14 @@ class DialogueTTS:
         host_stability: Optional[float] = None,  # ElevenLabs 参数
         host_similarity_boost: Optional[float] = None,  # ElevenLabs 参数
         guest_stability: Optional[float] = None,  # ElevenLabs 参数
-        guest_similarity_boost: Optional[float] = None  # ElevenLabs 参数
+        guest_similarity_boost: Optional[float] = None,  # ElevenLabs 参数
+        parallel: bool = True,  # 是否并行合成各片段
+        output_format: Optional[str] = None,  # 最终输出格式，默认与 response_format 相同
+        bitrate: Optional[str] = None,  # 有损输出格式的码率，如 "192k"
+        extra_outputs: Optional[List[Tuple[str, str]]] = None  # 同时输出的其他 (路径, 格式)
     ) -> bool:
         """
-        生成对谈音频（逐行生成方式）
+        生成对谈音频（逐行生成，可并行合成）
         
         Args:
             dialogue_text: 带有角色标记的对谈文本
@@ -55,132 +217,294 @@ class DialogueTTS:
             host_similarity_boost: ElevenLabs 参数
             guest_stability: ElevenLabs 参数
             guest_similarity_boost: ElevenLabs 参数
+            parallel: 是否按引擎并发上限并行合成，关闭时逐行串行合成
+            output_format: 最终输出格式（wav、mp3、opus、flac、aac），默认与 response_format 相同
+            bitrate: 有损输出格式的码率
+            extra_outputs: 同一次拼接中同时输出的其他 (路径, 格式)，例如 WAV 母带之外再输出 MP3
             
         Returns:
             bool: 是否成功生成音频
         """
         try:
-            # 解析对话文本
-            parsed_dialogue = self._parse_dialogue(dialogue_text)
-            if not parsed_dialogue:
-                raise ValueError("无法解析对话文本，请检查格式是否正确")
-                
-            # 创建临时目录
-            with tempfile.TemporaryDirectory() as temp_dir:
-                audio_segments = []
-                prev_role = None
-                
-                # 为每句对话单独生成音频
-                for i, (role, content) in enumerate(parsed_dialogue):
-                    temp_file = os.path.join(temp_dir, f'segment_{i}.wav')
-                    
-                    if role == "主持人":
-                        current_tts = self.host_tts
-                        voice = host_voice
-                        speed = host_speed
-                    else: # 嘉宾
-                        current_tts = self.guest_tts
-                        voice = guest_voice
-                        speed = guest_speed
-                        
-                    # 判断是否需要进行硅基流动TTS的预处理 (根据当前使用的TTS实例)
-                    need_preprocess = isinstance(current_tts, SiliconFlowTTS)
-                    
-                    # 如果是硅基流动TTS，对内容进行预处理
-                    if need_preprocess:
-                        content = current_tts._preprocess_text(content)
-                    
-                    # 构建 TTS 参数字典
-                    tts_params = {
-                        "text": content,
-                        "output_path": temp_file,
-                        "voice_name": voice,
-                        "model": model,
-                        "response_format": response_format,
-                        "speed": speed
-                    }
-                    
-                    # 添加 ElevenLabs 特定参数
-                    if role == "主持人":
-                        if host_stability is not None:
-                            tts_params["stability"] = host_stability
-                        if host_similarity_boost is not None:
-                            tts_params["similarity_boost"] = host_similarity_boost
-                    else:  # 嘉宾
-                        if guest_stability is not None:
-                            tts_params["stability"] = guest_stability
-                        if guest_similarity_boost is not None:
-                            tts_params["similarity_boost"] = guest_similarity_boost
-                    
-                    try:
-                        # --- 修正 ElevenLabs 参数名，并移除不适用的 model 参数 ---
-                        if isinstance(current_tts, ElevenLabsTTS):
-                            if 'voice_name' in tts_params:
-                                tts_params['voice_id'] = tts_params.pop('voice_name')
-                            # 如果是 ElevenLabs，移除 model 参数，让 ElevenLabsTTS 内部处理默认值
-                            if 'model' in tts_params:
-                                tts_params.pop('model') 
-                        # --- 修正结束 ---
-                        
-                        # 使用解包操作符传递参数
-                        success = current_tts.text_to_speech(**tts_params)
-                        
-                        if success:
-                            # 读取生成的音频并添加到列表
-                            segment = AudioSegment.from_wav(temp_file)
-                            segment = segment.normalize() # 音量平衡
-                            audio_segments.append((role, segment))
-                        else:
-                            print(f"生成音频失败: {role}, {content}")
-                            audio_segments.append((role, AudioSegment.silent(duration=500)))
-                            
-                    except Exception as e:
-                        print(f"处理片段 '{content}' 时发生错误: {e}")
-                        audio_segments.append((role, AudioSegment.silent(duration=500)))
-                
-                # 拼接所有音频片段
-                if not audio_segments:
-                    raise ValueError("没有成功生成任何音频片段")
-                    
-                final_audio = audio_segments[0][1]
-                prev_role = audio_segments[0][0]
-                
-                for role, segment in audio_segments[1:]:
-                    pause_duration = silence_duration
-                    if role != prev_role:
-                        pause_duration += 100
-                    
-                    silence = AudioSegment.silent(duration=pause_duration)
-                    final_audio += silence + segment
-                    prev_role = role
-                    
-                # 导出最终音频
-                output_path_obj = Path(output_path) # 使用Path对象
-                output_path_obj.parent.mkdir(parents=True, exist_ok=True)
-                final_audio.export(output_path_obj, format=response_format)
-                
+            tasks = self.prepare_segments(
+                dialogue_text, host_voice, guest_voice, model, response_format,
+                host_speed, guest_speed, host_stability, host_similarity_boost,
+                guest_stability, guest_similarity_boost
+            )
+
+            # 并行模式下按引擎提交到有界线程池，结果仍按脚本顺序收集
+            with time_stage("synthesize"):
+                if parallel:
+                    futures = self.submit_segments(tasks)
+                    results = [future.result() for future in futures]
+                else:
+                    results = [
+                        synthesize_segment(tts, tts_params, True)
+                        for role, tts, tts_params in tasks
+                    ]
+            
+            outputs = [(output_path, output_format or response_format)] + list(extra_outputs or [])
+            self.export_segments(tasks, results, outputs, silence_duration, bitrate)
             return True
                 
         except Exception as e:
             print(f"生成对谈音频失败: {e}")
             return False
     
-    def _parse_dialogue(self, text: str) -> List[Tuple[str, str]]:
+    async def generate_dialogue_audio_async(
+        self,
+        dialogue_text: str,
+        output_path: str,
+        host_voice: str = "anna",
+        guest_voice: str = "alex",
+        model: str = "FunAudioLLM/CosyVoice2-0.5B",
+        response_format: str = "wav",
+        host_speed: float = 1.0,
+        guest_speed: float = 1.0,
+        silence_duration: int = 600,  # 静音时长(毫秒)
+        host_stability: Optional[float] = None,  # ElevenLabs 参数
+        host_similarity_boost: Optional[float] = None,  # ElevenLabs 参数
+        guest_stability: Optional[float] = None,  # ElevenLabs 参数
+        guest_similarity_boost: Optional[float] = None,  # ElevenLabs 参数
+        parallel: bool = True,  # 是否并行合成各片段
+        output_format: Optional[str] = None,  # 最终输出格式，默认与 response_format 相同
+        bitrate: Optional[str] = None,  # 有损输出格式的码率，如 "192k"
+        extra_outputs: Optional[List[Tuple[str, str]]] = None  # 同时输出的其他 (路径, 格式)
+    ) -> bool:
         """
-        解析对话文本，保留所有特殊标记
+        生成对谈音频（异步方法，直接 await 各引擎的异步接口）
+        
+        按脚本顺序每完成一个片段就送入编码器，编码与其余片段的合成同时进行。
+        
+        Args:
+            参数含义同 generate_dialogue_audio
+            
+        Returns:
+            bool: 是否成功生成音频
+        """
+        segment_tasks = []
+        try:
+            tasks = self.prepare_segments(
+                dialogue_text, host_voice, guest_voice, model, response_format,
+                host_speed, guest_speed, host_stability, host_similarity_boost,
+                guest_stability, guest_similarity_boost
+            )
+            
+            if parallel:
+                segment_tasks = self.create_segment_tasks(tasks)
+                pending = segment_tasks
+            else:
+                # 串行模式下协程在轮到时才开始执行
+                pending = [asynthesize_segment(tts, tts_params, True) for role, tts, tts_params in tasks]
+            
+            outputs = [(output_path, output_format or response_format)] + list(extra_outputs or [])
+            await self.export_segments_async(tasks, pending, outputs, silence_duration, bitrate)
+            return True
+        
+        except Exception as e:
+            print(f"生成对谈音频失败: {e}")
+            return False
+        finally:
+            for task in segment_tasks:
+                task.cancel()
+    
+    def export_segments(
+        self,
+        tasks: List[Tuple[str, Any, Dict]],
+        results: List[Optional[AudioSegment]],
+        outputs: List[Tuple[str, str]],
+        silence_duration: int,
+        bitrate: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按脚本顺序拼接合成结果并导出，失败的片段用500毫秒静音代替
+        
+        Args:
+            tasks: prepare_segments 返回的任务列表
+            results: 与任务顺序一致的合成结果
+            outputs: (输出路径, 格式) 列表，所有格式在同一次拼接中编码
+            silence_duration: 对话之间的静音时长(毫秒)
+            bitrate: 有损输出格式的码率
+            
+        Returns:
+            Dict: MultiFormatExporter 的导出统计
+        """
+        if not results:
+            raise ValueError("没有成功生成任何音频片段")
+        
+        exporter = MultiFormatExporter(outputs, bitrate)
+        try:
+            with time_stage("assemble"):
+                prev_role = None
+                for (role, _, _), segment in zip(tasks, results):
+                    if segment is None:
+                        segment = AudioSegment.silent(duration=500)
+                    exporter.add_silence(self.pause_before(role, prev_role, silence_duration))
+                    exporter.add_segment(segment)
+                    prev_role = role
+        except BaseException:
+            exporter.abort()
+            raise
+        
+        # 等待编码器处理完剩余数据
+        with time_stage("export"):
+            return exporter.close()
+    
+    async def export_segments_async(
+        self,
+        tasks: List[Tuple[str, Any, Dict]],
+        pending: List[Awaitable[Optional[AudioSegment]]],
+        outputs: List[Tuple[str, str]],
+        silence_duration: int,
+        bitrate: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按脚本顺序等待各片段，每完成一个就送入编码器
+        
+        前面的片段在后面的片段仍在合成时就开始编码，合成结束时只剩最后几段需要编码；
+        PCM 转换和编码器写入在音频线程池中执行，不阻塞事件循环。
+        
+        Args:
+            tasks: prepare_segments 返回的任务列表
+            pending: 与任务顺序一致的合成任务或协程，结果为 None 表示失败
+            其余参数含义同 export_segments
+            
+        Returns:
+            Dict: MultiFormatExporter 的导出统计
+        """
+        if not tasks:
+            raise ValueError("没有成功生成任何音频片段")
+        
+        exporter = await run_blocking(MultiFormatExporter, outputs, bitrate)
+        try:
+            with time_stage("synthesize"):
+                prev_role = None
+                for (role, _, _), item in zip(tasks, pending):
+                    segment = await item
+                    if segment is None:
+                        segment = AudioSegment.silent(duration=500)
+                    await run_blocking(exporter.add_silence, self.pause_before(role, prev_role, silence_duration))
+                    await run_blocking(exporter.add_segment, segment)
+                    prev_role = role
+        except BaseException:
+            await run_blocking(exporter.abort)
+            raise
+        finally:
+            # 出错时关闭尚未执行的协程
+            for item in pending:
+                if asyncio.iscoroutine(item):
+                    item.close()
+        
+        with time_stage("export"):
+            return await run_blocking(exporter.close)
+    
+    @staticmethod
+    async def _buffer_segment_stream(tts, tts_params: Dict, queue: "asyncio.Queue"):
+        """将片段的PCM流写入队列，结束时写入 None"""
+        try:
+            async for chunk in astream_segment(tts, tts_params, True):
+                queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(None)
+    
+    @staticmethod
+    async def _drain(queue: "asyncio.Queue") -> AsyncIterator[bytes]:
+        """按写入顺序读出队列中的数据块，直到 None"""
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            yield chunk
+    
+    async def stream_dialogue_audio(
+        self,
+        tasks: List[Tuple[str, Any, Dict]],
+        silence_duration: int = 600,
+        parallel: bool = True
+    ) -> AsyncIterator[bytes]:
         """
-        # 使用更精确的正则表达式，只匹配角色标记
-        pattern = r'\[(主持人|嘉宾)\]([\s\S]*?)(?=\[主持人\]|\[嘉宾\]|$)'
-        matches = re.findall(pattern, text)
+        边合成边输出对谈音频（WAV流）
         
-        dialogue = []
-        for role, content in matches:
-            # 保留所有特殊标记，只清理首尾空白
-            cleaned_content = content.strip()
-            if cleaned_content:
-                dialogue.append((role, cleaned_content))
+        先输出一个长度不定的WAV头，之后按脚本顺序输出每个片段的PCM数据，
+        前面的片段一旦完成就立即发送，后面的片段仍在后台合成。
+        支持PCM流式接口的引擎（见 supports_pcm_stream）不等整句合成完成，
+        收到的数据块直接转发，长句开头即可播放。
         
-        return dialogue
+        Args:
+            tasks: prepare_segments 返回的任务列表
+            silence_duration: 对话之间的静音时长(毫秒)
+            parallel: 是否并行合成各片段
+            
+        Yields:
+            bytes: WAV头或PCM数据块
+        """
+        segment_tasks = []
+        # 片段序号 -> 流式片段的数据块队列
+        queues: Dict[int, asyncio.Queue] = {}
+        if parallel:
+            for i, (role, tts, tts_params) in enumerate(tasks):
+                if supports_pcm_stream(tts):
+                    queues[i] = asyncio.Queue()
+                    segment_tasks.append(synthesis_pool.create_task(
+                        get_engine_name(tts), self._buffer_segment_stream, tts, tts_params, queues[i]
+                    ))
+                else:
+                    segment_tasks.append(synthesis_pool.create_task(
+                        get_engine_name(tts), asynthesize_segment, tts, tts_params, True
+                    ))
+        started = time.perf_counter()
+        try:
+            yield wav_stream_header()
+            
+            prev_role = None
+            for i, (role, tts, tts_params) in enumerate(tasks):
+                pause_duration = self.pause_before(role, prev_role, silence_duration)
+                if pause_duration:
+                    yield silence_pcm(pause_duration)
+                prev_role = role
+                
+                if i in queues:
+                    chunks = self._drain(queues[i])
+                elif not parallel and supports_pcm_stream(tts):
+                    chunks = astream_segment(tts, tts_params, True)
+                else:
+                    chunks = None
+                
+                if chunks is not None:
+                    received = False
+                    async for pcm in chunks:
+                        if i == 0 and not received:
+                            # 首个片段可以播放前的等待时间
+                            stage_seconds.observe(time.perf_counter() - started, stage="first_segment")
+                        received = True
+                        yield pcm
+                    if received:
+                        continue
+                    segment = None
+                elif parallel:
+                    segment = await segment_tasks[i]
+                else:
+                    segment = await asynthesize_segment(tts, tts_params, True)
+                if segment is None:
+                    segment = AudioSegment.silent(duration=500)
+                
+                pcm = await run_blocking(segment_to_pcm, segment)
+                if i == 0:
+                    stage_seconds.observe(time.perf_counter() - started, stage="first_segment")
+                yield pcm
+        finally:
+            # 客户端断开时取消仍在进行的合成任务
+            for task in segment_tasks:
+                task.cancel()
+    
+    def _parse_dialogue(self, text: str) -> List[Tuple[str, str]]:
+        """
+        解析对话文本，保留所有特殊标记
+        """
+        turns, issues = parse_dialogue(text)
+        for issue in issues:
+            print(f"对话脚本第 {issue.line} 行: {issue.message}")
+        return [(turn.role, turn.content) for turn in turns]
     
     def _group_by_speaker(self, dialogue: List[Tuple[str, str]]) -> Tuple[List[str], List[str], List[Tuple[str, int]]]:
         """
@@ -0,0 +1,67 @@
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional
+
+async def merge_in_order(
+    producers: List[Callable[[], AsyncIterator[str]]],
+    concurrency: Optional[int],
+    separator: str = ""
+) -> AsyncIterator[str]:
+    """
+    并行运行多个流式生成器，并按列表顺序输出结果
+
+    每个生成器的输出先写入各自的队列；输出时依次读取各队列，
+    第一个生成器边生成边输出，后面的生成器在等待期间已在后台运行。
+    任一生成器出错时抛出该异常并取消其余生成器。
+
+    Args:
+        producers: 返回异步生成器的函数列表
+        concurrency: 同时运行的生成器数量上限，为 None 时不限制（由生成器自行限流）
+        separator: 相邻两个生成器的输出之间插入的文本
+
+    Yields:
+        str: 按顺序排列的输出块
+    """
+    semaphore = asyncio.Semaphore(concurrency) if concurrency is not None else None
+    queues = [asyncio.Queue() for _ in producers]
+    done = object()  # 结束标记
+
+    async def run(index: int):
+        async for content in producers[index]():
+            queues[index].put_nowait(content)
+
+    async def worker(index: int):
+        # 任何异常都写入队列，否则读取方会一直等待
+        try:
+            if semaphore is None:
+                await run(index)
+            else:
+                async with semaphore:
+                    await run(index)
+        except Exception as e:
+            queues[index].put_nowait(e)
+            return
+        queues[index].put_nowait(done)
+
+    tasks = [asyncio.ensure_future(worker(i)) for i in range(len(producers))]
+    try:
+        for index, queue in enumerate(queues):
+            first = True
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if first:
+                    # 模型通常会去掉开头的空白，这里统一处理，避免拼接后出现空行
+                    item = item.lstrip()
+                    first = not item
+                    if not item:
+                        continue
+                    if index > 0:
+                        # 分隔符与下一段的首块一起输出，避免调用方把纯空白的块过滤掉
+                        item = separator + item
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,476 @@
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+import httpx
+from config_manager import config_manager
+from tts_errors import TTSProviderError
+
+class TokenBucket:
+    """令牌桶，限制平均请求速率并允许一定的突发"""
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        预定一个令牌
+
+        令牌不足时仍然预定（余量记为负数），由调用方等待返回的时间后再发送请求，
+        这样同步和异步调用方可以共用同一个桶。
+
+        Returns:
+            float: 需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def configure(self, rate: float, capacity: int):
+        """按新的配置调整速率和容量"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def available(self) -> float:
+        """当前可用的令牌数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+class EngineLimiter:
+    """
+    单个引擎 + API Key 的限流器
+
+    请求速率由令牌桶限制；并发数按 AIMD 自适应调整：每次成功加性增加，
+    遇到限流时减半，上限为 AppConfig.TTS_CONCURRENCY 中该引擎的配置。
+    """
+
+    def __init__(self, engine: str, key_id: str, rate: float, burst: int, max_limit: int):
+        """
+        Args:
+            engine: 引擎名称
+            key_id: API Key 的摘要（不保存明文）
+            rate: 每秒请求数
+            burst: 令牌桶容量
+            max_limit: 并发上限
+        """
+        self.engine = engine
+        self.key_id = key_id
+        self.bucket = TokenBucket(rate, burst)
+        self.max_limit = max_limit
+        self.limit = float(max_limit)  # 当前自适应并发上限
+        self.in_flight = 0
+        self.cooldown_until = 0.0  # 收到限流响应后暂停发送请求直到该时刻(monotonic)
+        self.requests = 0
+        self.successes = 0
+        self.throttles = 0
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        # 等待并发名额的调用方: ("sync", threading.Event) 或 ("async", (loop, future))
+        self._waiters: Deque[Tuple[str, Any]] = deque()
+
+    def _capacity(self) -> int:
+        return max(1, int(self.limit))
+
+    def _grant_waiters(self):
+        """在名额允许的范围内唤醒排队的调用方（调用方需持有锁）"""
+        while self._waiters and self.in_flight < self._capacity():
+            kind, waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if kind == "sync":
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(_resolve_future, future)
+
+    def acquire(self):
+        """同步获取一个并发名额"""
+        event = threading.Event()
+        with self._lock:
+            if self.in_flight < self._capacity() and not self._waiters:
+                self.in_flight += 1
+                return
+            self._waiters.append(("sync", event))
+        event.wait()
+
+    async def acquire_async(self):
+        """异步获取一个并发名额"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = ("async", (loop, future))
+        with self._lock:
+            if self.in_flight < self._capacity() and not self._waiters:
+                self.in_flight += 1
+                return
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # 名额已分配但调用方被取消，归还名额
+                    self.in_flight -= 1
+                    self._grant_waiters()
+            raise
+
+    def _has_spare_capacity(self) -> bool:
+        """没有排队的调用方、不在冷却期且并发名额和令牌都有富余（调用方需持有锁）"""
+        return (
+            not self._waiters
+            and self.in_flight < self._capacity()
+            and time.monotonic() >= self.cooldown_until
+            and self.bucket.available() >= 1
+        )
+
+    def can_hedge(self) -> bool:
+        """是否有富余的名额发起对冲请求，冷却期内或名额已满时不对冲"""
+        with self._lock:
+            return self._has_spare_capacity()
+
+    def try_acquire(self) -> bool:
+        """
+        不等待地获取一个并发名额并消耗一个令牌，用于对冲请求
+
+        Returns:
+            bool: 获取成功返回 True，成功后需要调用 release 归还
+        """
+        with self._lock:
+            if not self._has_spare_capacity():
+                return False
+            self.in_flight += 1
+            self.requests += 1
+        self.bucket.reserve()
+        return True
+
+    def release(self):
+        """归还并发名额"""
+        with self._lock:
+            self.in_flight -= 1
+            self._grant_waiters()
+
+    def send_delay(self) -> float:
+        """发送请求前需要等待的秒数（冷却期和令牌桶取较大值）"""
+        with self._lock:
+            self.requests += 1
+            cooldown = self.cooldown_until - time.monotonic()
+        return max(cooldown, self.bucket.reserve())
+
+    def on_success(self):
+        """请求成功：加性增加并发上限"""
+        with self._lock:
+            self.successes += 1
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._grant_waiters()
+
+    def on_failure(self, will_retry: bool):
+        """请求失败：记录重试或最终失败次数"""
+        with self._lock:
+            if will_retry:
+                self.retries += 1
+            else:
+                self.failures += 1
+
+    def on_throttle(self, retry_after: Optional[float], backoff: float):
+        """
+        收到限流响应：并发上限减半，并在冷却期内暂停该 Key 的所有请求
+
+        Args:
+            retry_after: 服务商要求的等待时间(秒)
+            backoff: 没有 Retry-After 时使用的退避时间(秒)
+        """
+        with self._lock:
+            self.throttles += 1
+            self.limit = max(1.0, self.limit / 2)
+            wait = retry_after if retry_after is not None else backoff
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + wait)
+
+    def configure(self, rate: float, burst: int, max_limit: int):
+        """配置变化时同步速率和并发上限"""
+        if (rate, burst) != (self.bucket.rate, self.bucket.capacity):
+            self.bucket.configure(rate, burst)
+        if max_limit != self.max_limit:
+            with self._lock:
+                self.max_limit = max_limit
+                self.limit = min(self.limit, float(max_limit))
+                self._grant_waiters()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回当前限制和计数"""
+        with self._lock:
+            return {
+                "engine": self.engine,
+                "key_id": self.key_id,
+                "concurrency_limit": self._capacity(),
+                "max_concurrency": self.max_limit,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "requests_per_second": self.bucket.rate,
+                "burst": self.bucket.capacity,
+                "tokens": round(self.bucket.available(), 2),
+                "cooldown_seconds": round(max(0.0, self.cooldown_until - time.monotonic()), 2),
+                "requests": self.requests,
+                "successes": self.successes,
+                "throttles": self.throttles,
+                "retries": self.retries,
+                "failures": self.failures
+            }
+
+def _resolve_future(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+def _classify_error(error: Exception) -> Tuple[bool, bool, Optional[float]]:
+    """
+    判断错误是否可以重试
+
+    Returns:
+        Tuple[bool, bool, Optional[float]]: (是否重试, 是否为限流, Retry-After 秒数)
+    """
+    if isinstance(error, TTSProviderError):
+        return error.retryable, error.throttled, error.retry_after
+    if isinstance(error, httpx.TransportError):
+        # 连接失败、超时等网络错误
+        return True, False, None
+    return False, False, None
+
+class RateLimiter:
+    """按引擎和 API Key 共享的限流器，负责限速、自适应并发和失败重试"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], EngineLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, engine: str, api_key: Optional[str] = None) -> EngineLimiter:
+        """
+        获取引擎和 API Key 对应的限流器，同一个 Key 的所有请求共享限额
+
+        Args:
+            engine: 引擎名称
+            api_key: API Key，为空时按引擎共享
+
+        Returns:
+            EngineLimiter: 限流器
+        """
+        key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+        config = config_manager.get_config()
+        settings = getattr(config.RATE_LIMITS, engine, None)
+        rate = settings.requests_per_second if settings else 2.0
+        burst = settings.burst if settings else 4
+        max_limit = getattr(config.TTS_CONCURRENCY, engine, 1)
+        with self._lock:
+            limiter = self._limiters.get((engine, key_id))
+            if limiter is None:
+                limiter = EngineLimiter(engine, key_id, rate, burst, max_limit)
+                self._limiters[(engine, key_id)] = limiter
+        limiter.configure(rate, burst, max_limit)
+        return limiter
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """全抖动指数退避时间"""
+        settings = config_manager.get_config().RATE_LIMITS
+        return random.uniform(0, min(settings.max_backoff, settings.base_backoff * 2 ** attempt))
+
+    def _handle_error(self, limiter: EngineLimiter, error: Exception, attempt: int) -> Optional[float]:
+        """
+        记录失败并计算重试前的等待时间
+
+        Returns:
+            Optional[float]: 等待秒数，不再重试时返回 None
+        """
+        retryable, throttled, retry_after = _classify_error(error)
+        backoff = self._backoff(attempt)
+        if throttled:
+            limiter.on_throttle(retry_after, backoff)
+        settings = config_manager.get_config().RATE_LIMITS
+        will_retry = retryable and attempt < settings.max_retries
+        limiter.on_failure(will_retry)
+        if not will_retry:
+            return None
+        if retry_after is not None:
+            # 遵循服务商给出的等待时间，另加少量抖动避免同时重试
+            return retry_after + random.uniform(0, settings.base_backoff)
+        return backoff
+
+    async def acall(
+        self,
+        engine: str,
+        api_key: Optional[str],
+        fn: Callable[..., Awaitable],
+        *args,
+        **kwargs
+    ) -> Any:
+        """
+        在限流器约束下调用异步函数，可重试的错误按退避时间重试
+
+        Args:
+            engine: 引擎名称
+            api_key: API Key
+            fn: 返回协程的函数
+
+        Returns:
+            Any: fn 的返回值
+        """
+        limiter = self.get(engine, api_key)
+        attempt = 0
+        while True:
+            await limiter.acquire_async()
+            try:
+                delay = limiter.send_delay()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                result = await fn(*args, **kwargs)
+                limiter.on_success()
+                return result
+            except Exception as e:
+                wait = self._handle_error(limiter, e, attempt)
+                if wait is None:
+                    raise
+            finally:
+                limiter.release()
+            attempt += 1
+            print(f"{engine} 请求失败，{wait:.1f} 秒后第 {attempt} 次重试")
+            await asyncio.sleep(wait)
+
+    async def ahedge(
+        self,
+        engine: str,
+        api_key: Optional[str],
+        fn: Callable[..., Awaitable],
+        *args,
+        **kwargs
+    ) -> Any:
+        """
+        以对冲请求的方式调用异步函数：只在有富余名额时立即发送，不排队、不重试
+
+        Args:
+            engine: 引擎名称
+            api_key: API Key
+            fn: 返回协程的函数
+
+        Returns:
+            Any: fn 的返回值
+
+        Raises:
+            RuntimeError: 名额已满或处于冷却期，未发送请求
+        """
+        limiter = self.get(engine, api_key)
+        if not limiter.try_acquire():
+            raise RuntimeError(f"{engine} 没有富余的并发名额，不发起对冲请求")
+        try:
+            result = await fn(*args, **kwargs)
+            limiter.on_success()
+            return result
+        except Exception as e:
+            _, throttled, retry_after = _classify_error(e)
+            if throttled:
+                limiter.on_throttle(retry_after, self._backoff(0))
+            limiter.on_failure(False)
+            raise
+        finally:
+            limiter.release()
+
+    async def astream(
+        self,
+        engine: str,
+        api_key: Optional[str],
+        fn: Callable[..., AsyncIterator],
+        *args,
+        **kwargs
+    ) -> AsyncIterator:
+        """
+        在限流器约束下读取流式响应，整个读取期间占用一个并发名额
+
+        收到第一个数据块之前的可重试错误按退避时间重试；
+        之后的错误直接抛出，已输出的数据无法撤回。
+
+        Args:
+            engine: 引擎名称
+            api_key: API Key
+            fn: 返回异步生成器的函数
+
+        Yields:
+            fn 输出的数据块
+        """
+        limiter = self.get(engine, api_key)
+        attempt = 0
+        while True:
+            received = False
+            await limiter.acquire_async()
+            try:
+                delay = limiter.send_delay()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                async for chunk in fn(*args, **kwargs):
+                    received = True
+                    yield chunk
+                limiter.on_success()
+                return
+            except Exception as e:
+                if received:
+                    limiter.on_failure(False)
+                    raise
+                wait = self._handle_error(limiter, e, attempt)
+                if wait is None:
+                    raise
+            finally:
+                limiter.release()
+            attempt += 1
+            print(f"{engine} 请求失败，{wait:.1f} 秒后第 {attempt} 次重试")
+            await asyncio.sleep(wait)
+
+    def call(self, engine: str, api_key: Optional[str], fn: Callable, *args, **kwargs) -> Any:
+        """acall 的同步版本"""
+        limiter = self.get(engine, api_key)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                delay = limiter.send_delay()
+                if delay > 0:
+                    time.sleep(delay)
+                result = fn(*args, **kwargs)
+                limiter.on_success()
+                return result
+            except Exception as e:
+                wait = self._handle_error(limiter, e, attempt)
+                if wait is None:
+                    raise
+            finally:
+                limiter.release()
+            attempt += 1
+            print(f"{engine} 请求失败，{wait:.1f} 秒后第 {attempt} 次重试")
+            time.sleep(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回所有限流器的当前限制和计数"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {"limiters": [limiter.stats() for limiter in limiters]}
+
+# 创建全局限流器实例
+rate_limiter = RateLimiter()
@@ -0,0 +1,494 @@
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any, AsyncIterator, Awaitable, Set, Tuple
+from config_manager import config_manager, BASE_DIR
+from tts_factory import TTSFactory
+from multiTTS import DialogueTTS
+from dialogue_parser import DialogueTokenizer
+from synthesis import synthesis_pool, asynthesize_segment, get_engine_name
+from story_converter import StoryConverter
+from executors import run_blocking
+from audio_encoder import extension
+import tracing
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    request TEXT NOT NULL,
+    output_path TEXT,
+    error TEXT,
+    timings TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+class JobStore:
+    """基于 SQLite 的渲染任务存储"""
+
+    def __init__(self, db_path: Path):
+        """
+        初始化任务存储
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            # WAL 模式下单条进度更新只需追加日志，足够快，可直接在事件循环中调用
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+            # 旧版本创建的数据库没有 timings 列
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "timings" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN timings TEXT")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        job["timings"] = json.loads(job["timings"]) if job.get("timings") else None
+        return job
+
+    def create(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """新建排队中的任务"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, stage, request, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, STATUS_QUEUED, STATUS_QUEUED,
+                 json.dumps(request, ensure_ascii=False), now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """按创建时间倒序列出最近的任务"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def list_unfinished(self) -> List[Dict[str, Any]]:
+        """按创建顺序列出排队中和执行中的任务（用于重启后恢复）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (STATUS_QUEUED, STATUS_RUNNING)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields) -> Dict[str, Any]:
+        """更新任务字段并返回最新状态"""
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+        return self.get(job_id)
+
+    def delete(self, job_id: str):
+        """删除任务记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RenderJobManager:
+    """后台渲染任务队列"""
+
+    def __init__(self, directory: str, workers: int = 2):
+        """
+        初始化任务队列
+
+        任务状态保存在 SQLite 中，服务重启后排队中和执行到一半的任务会重新入队；
+        已合成的片段会命中片段缓存，重新执行时只需合成剩余的片段。
+
+        Args:
+            directory: 任务数据库和输出文件目录，相对路径基于项目目录
+            workers: 同时渲染的任务数
+        """
+        self.directory = Path(directory)
+        if not self.directory.is_absolute():
+            self.directory = BASE_DIR / self.directory
+        self.workers = workers
+        self.store = JobStore(self.directory / "jobs.db")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        # job_id -> 订阅该任务进度的队列
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # 各任务类型的处理函数
+        self._handlers = {
+            "dialogue": self._render_dialogue,
+            "story": self._render_story
+        }
+        self._story_converter: Optional[StoryConverter] = None
+        self.running = 0  # 正在执行的任务数
+
+    async def start(self):
+        """启动工作协程，并恢复未完成的任务（需在事件循环中调用）"""
+        self._queue = asyncio.Queue()
+        for job in self.store.list_unfinished():
+            print(f"恢复渲染任务: {job['id']} ({job['status']})")
+            self.store.update(job["id"], status=STATUS_QUEUED, stage=STATUS_QUEUED)
+            self._queue.put_nowait(job["id"])
+        self._worker_tasks = [
+            asyncio.ensure_future(self._worker(i)) for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """停止工作协程，执行中的任务保持 running 状态，下次启动时恢复"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        提交渲染任务
+
+        Args:
+            kind: 任务类型，如 "dialogue"
+            request: 任务参数
+
+        Returns:
+            Dict: 新建的任务
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"不支持的任务类型: {kind}")
+        if self._queue is None:
+            raise RuntimeError("渲染任务队列尚未启动")
+        job = self.store.create(kind, request)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    @property
+    def queue_depth(self) -> int:
+        """排队等待执行的任务数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return self.store.list(limit)
+
+    def delete(self, job_id: str) -> bool:
+        """
+        删除已结束的任务及其输出文件
+
+        Returns:
+            bool: 任务不存在或尚未结束时返回 False
+        """
+        job = self.store.get(job_id)
+        if job is None or job["status"] not in FINISHED_STATUSES:
+            return False
+        # 输出音频及故事任务生成的脚本都以任务ID命名
+        for path in self.directory.glob(f"{job_id}.*"):
+            path.unlink(missing_ok=True)
+        self.store.delete(job_id)
+        return True
+
+    async def events(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        订阅任务进度，先返回当前状态，之后每次进度变化返回一次，任务结束后停止
+
+        Args:
+            job_id: 任务ID
+            heartbeat: 无进度时发送心跳的间隔(秒)
+
+        Yields:
+            Dict: 任务状态，心跳为 {"status": "heartbeat"}
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        # 先订阅再读取当前状态，避免漏掉两者之间的进度
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            yield self._event(job)
+            if job["status"] in FINISHED_STATUSES:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield {"status": "heartbeat"}
+                    continue
+                yield event
+                if event["status"] in FINISHED_STATUSES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    @staticmethod
+    def _event(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "completed": job["completed"],
+            "total": job["total"],
+            "error": job["error"]
+        }
+
+    def _update(self, job_id: str, **fields) -> Dict[str, Any]:
+        """更新任务状态并通知所有订阅者"""
+        job = self.store.update(job_id, **fields)
+        event = self._event(job)
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(event)
+        return job
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            self.running += 1
+            try:
+                await self._run_job(job_id)
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return
+        self._update(job_id, status=STATUS_RUNNING, stage="running", completed=0, error=None, timings=None)
+        started = time.perf_counter()
+        with tracing.trace(f"job {job['kind']}", job_id=job_id) as current:
+            try:
+                output_path = await self._handlers[job["kind"]](job)
+            except asyncio.CancelledError:
+                # 服务关闭：保持 running 状态，下次启动时恢复
+                raise
+            except Exception as e:
+                print(f"渲染任务 {job_id} 失败: {e}")
+                self._update(
+                    job_id, status=STATUS_FAILED, stage=STATUS_FAILED, error=str(e),
+                    timings=self._timings(current)
+                )
+                return
+            self._update(
+                job_id, status=STATUS_DONE, stage=STATUS_DONE, output_path=str(output_path),
+                timings=self._timings(current)
+            )
+        print(f"渲染任务 {job_id} 完成，耗时 {time.perf_counter() - started:.1f} 秒")
+
+    @staticmethod
+    def _timings(current: Optional[tracing.Trace]) -> Optional[str]:
+        """各阶段耗时汇总（JSON），未启用追踪时为 None"""
+        return json.dumps(current.timings()) if current is not None else None
+
+    def output_path(self, job: Dict[str, Any], fmt: Optional[str] = None) -> Path:
+        """任务某种输出格式的文件路径，fmt 为空时为主输出格式"""
+        fmt = fmt or job["request"].get("output_format", "wav")
+        return self.directory / f"{job['id']}.{extension(fmt)}"
+
+    def _outputs(self, job: Dict[str, Any]) -> List[Tuple[Path, str]]:
+        """任务的所有 (输出路径, 格式)：主输出格式在前，其后为 extra_formats"""
+        request = job["request"]
+        formats = [request.get("output_format", "wav")]
+        formats += [fmt for fmt in request.get("extra_formats") or [] if fmt not in formats]
+        return [(self.output_path(job, fmt), fmt) for fmt in formats]
+
+    async def _render_dialogue(self, job: Dict[str, Any]) -> Path:
+        """渲染对谈音频任务，参数同 /convert_dialogue"""
+        request = job["request"]
+        outputs = self._outputs(job)
+
+        dialogue_tts = self._create_dialogue_tts(request)
+        tasks = dialogue_tts.prepare_segments(
+            request["dialogue_text"], **self._segment_options(request)
+        )
+        if not tasks:
+            raise ValueError("没有解析到任何对话")
+        total = len(tasks)
+        self._update(job["id"], stage="parsed", total=total)
+
+        pending, segment_tasks = self._start_segments(
+            job["id"], dialogue_tts, tasks, request.get("parallel", True)
+        )
+        try:
+            # 按脚本顺序边合成边编码
+            await dialogue_tts.export_segments_async(
+                tasks, pending, outputs, request["silence_duration"], request.get("bitrate")
+            )
+        finally:
+            for task in segment_tasks:
+                task.cancel()
+        return outputs[0][0]
+
+    @staticmethod
+    def _create_dialogue_tts(request: Dict[str, Any]) -> DialogueTTS:
+        host_tts = TTSFactory.create_tts(request["host_tts_engine"])
+        guest_tts = TTSFactory.create_tts(request["guest_tts_engine"])
+        return DialogueTTS(host_tts, guest_tts)
+
+    @staticmethod
+    def _segment_options(request: Dict[str, Any]) -> Dict[str, Any]:
+        """从任务参数中提取 DialogueTTS.build_segment 的音色参数"""
+        return {
+            "host_voice": request["host_voice"],
+            "guest_voice": request["guest_voice"],
+            "host_speed": request["host_speed"],
+            "guest_speed": request["guest_speed"],
+            "host_stability": request.get("host_stability"),
+            "host_similarity_boost": request.get("host_similarity_boost"),
+            "guest_stability": request.get("guest_stability"),
+            "guest_similarity_boost": request.get("guest_similarity_boost")
+        }
+
+    async def _render_story(self, job: Dict[str, Any]) -> Path:
+        """
+        故事到音频的流水线任务
+
+        LLM 边生成脚本，边把已完整的对话轮次交给 TTS 合成，
+        总耗时约为 max(LLM, TTS)，而不是两者之和。脚本另存为同名 .txt 文件。
+        """
+        request = job["request"]
+        job_id = job["id"]
+        outputs = self._outputs(job)
+        script_path = self.directory / f"{job_id}.txt"
+
+        if self._story_converter is None:
+            self._story_converter = StoryConverter()
+        dialogue_tts = self._create_dialogue_tts(request)
+        options = self._segment_options(request)
+        tokenizer = DialogueTokenizer()
+
+        tasks: List = []
+        segment_tasks: List[asyncio.Task] = []
+        script_parts: List[str] = []
+        completed = 0
+
+        def on_segment_done(task: asyncio.Task):
+            nonlocal completed
+            if not task.cancelled():
+                completed += 1
+                self._update(job_id, completed=completed)
+
+        def dispatch(turns):
+            # 每解析出一句完整的对话就立即开始合成
+            for turn in turns:
+                segment = dialogue_tts.build_segment(turn.role, turn.content, **options)
+                _, tts, tts_params = segment
+                segment_task = synthesis_pool.create_task(
+                    get_engine_name(tts), asynthesize_segment, tts, tts_params, True
+                )
+                segment_task.add_done_callback(on_segment_done)
+                tasks.append(segment)
+                segment_tasks.append(segment_task)
+            if turns:
+                self._update(job_id, total=len(tasks))
+
+        self._update(job_id, stage="generating")
+        try:
+            async for chunk in self._story_converter.convert_story_stream(
+                story_text=request["story_text"],
+                custom_prompt=request.get("custom_prompt"),
+                use_cache=request.get("use_cache"),
+                long_mode=request.get("long_mode")
+            ):
+                script_parts.append(chunk)
+                dispatch(tokenizer.feed(chunk))
+            dispatch(tokenizer.close())
+            for issue in tokenizer.issues:
+                print(f"渲染任务 {job_id} 脚本第 {issue.line} 行: {issue.message}")
+
+            await run_blocking(script_path.write_text, "".join(script_parts), encoding="utf-8")
+            if not tasks:
+                raise ValueError("生成的脚本中没有解析到任何对话")
+
+            # 脚本生成完毕后按顺序边等待合成边编码
+            self._update(job_id, stage="synthesizing")
+            await dialogue_tts.export_segments_async(
+                tasks, segment_tasks, outputs, request["silence_duration"], request.get("bitrate")
+            )
+        finally:
+            for task in segment_tasks:
+                task.cancel()
+        return outputs[0][0]
+
+    def _start_segments(
+        self,
+        job_id: str,
+        dialogue_tts: DialogueTTS,
+        tasks: List,
+        parallel: bool
+    ) -> Tuple[List[Awaitable], List[asyncio.Task]]:
+        """
+        开始合成所有片段，每完成一个片段上报一次进度
+
+        Returns:
+            Tuple: (与任务顺序一致的待完成片段, 需要在结束时取消的异步任务)
+        """
+        self._update(job_id, stage="synthesizing", completed=0)
+        completed = 0
+
+        def report():
+            nonlocal completed
+            completed += 1
+            if completed == len(tasks):
+                # 合成全部完成，剩余片段的编码仍在进行
+                self._update(job_id, stage="assembling", completed=completed)
+            else:
+                self._update(job_id, completed=completed)
+
+        if not parallel:
+            async def synthesize(tts, tts_params):
+                segment = await asynthesize_segment(tts, tts_params, True)
+                report()
+                return segment
+            # 串行模式下协程在轮到时才开始执行
+            return [synthesize(tts, tts_params) for role, tts, tts_params in tasks], []
+
+        segment_tasks = dialogue_tts.create_segment_tasks(tasks)
+        for task in segment_tasks:
+            task.add_done_callback(lambda task: None if task.cancelled() else report())
+        return segment_tasks, segment_tasks
+
+def _create_render_job_manager() -> RenderJobManager:
+    settings = config_manager.get_config().RENDER_JOBS
+    return RenderJobManager(directory=settings.directory, workers=settings.workers)
+
+# 创建全局渲染任务队列实例
+render_job_manager = _create_render_job_manager()
@@ -0,0 +1,218 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Any
+from pydub import AudioSegment
+from config_manager import config_manager, BASE_DIR
+
+# 缓存文件头: 魔数、采样率、声道数、采样宽度，之后紧跟原始PCM数据
+_HEADER = struct.Struct("<4sIHH")
+_MAGIC = b"TTSC"
+
+class SegmentCache:
+    """基于内容寻址的TTS片段磁盘缓存（按总大小进行LRU淘汰）"""
+
+    def __init__(self, cache_dir: str, max_size_mb: int = 2048, enabled: bool = True):
+        """
+        初始化片段缓存
+
+        Args:
+            cache_dir: 缓存目录，相对路径基于项目目录
+            max_size_mb: 缓存总大小上限(MB)
+            enabled: 是否启用缓存
+        """
+        self.cache_dir = Path(cache_dir)
+        if not self.cache_dir.is_absolute():
+            self.cache_dir = BASE_DIR / self.cache_dir
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> 文件大小，按最近使用时间从旧到新排列
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    def _load_index(self):
+        """扫描缓存目录，按修改时间恢复LRU顺序"""
+        files = sorted(self.cache_dir.glob("*.pcm"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pcm"
+
+    @staticmethod
+    def make_key(engine: str, params: Dict[str, Any]) -> str:
+        """
+        根据引擎和全部合成参数生成缓存键
+
+        Args:
+            engine: TTS引擎名称
+            params: 影响合成结果的全部参数（文本、音色、模型、语速等）
+
+        Returns:
+            str: sha256 十六进制摘要
+        """
+        payload = json.dumps(
+            {"engine": engine, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _touch(self, key: str):
+        """标记为最近使用（同时更新文件时间，使LRU顺序在重启后仍然有效）"""
+        self._entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def get_pcm(self, key: str) -> Optional[Tuple[memoryview, Dict[str, int]]]:
+        """
+        以内存映射方式读取缓存的PCM数据，不复制音频内容
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[Tuple[memoryview, Dict]]: (PCM数据视图, 音频参数)，未命中时返回 None
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # 文件已被外部删除或损坏
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+
+            try:
+                magic, frame_rate, channels, sample_width = _HEADER.unpack_from(mapped, 0)
+            except (struct.error, ValueError):
+                # 文件头不完整
+                magic = None
+            if magic != _MAGIC:
+                mapped.close()
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._touch(key)
+            self.hits += 1
+
+        params = {
+            "frame_rate": frame_rate,
+            "channels": channels,
+            "sample_width": sample_width
+        }
+        return memoryview(mapped)[_HEADER.size:], params
+
+    def get(self, key: str) -> Optional[AudioSegment]:
+        """读取缓存的音频片段，未命中时返回 None"""
+        cached = self.get_pcm(key)
+        if cached is None:
+            return None
+        pcm, params = cached
+        return AudioSegment(data=pcm.tobytes(), **params)
+
+    def put(self, key: str, segment: AudioSegment):
+        """
+        写入音频片段，超过大小上限时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            segment: 解码后的音频片段
+        """
+        if not self.enabled:
+            return
+
+        header = _HEADER.pack(_MAGIC, segment.frame_rate, segment.channels, segment.sample_width)
+        path = self._path(key)
+        temp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(header)
+                f.write(segment.raw_data)
+            # 原子替换，避免并发读到写了一半的文件
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"写入片段缓存失败: {e}")
+            if temp_path.exists():
+                temp_path.unlink()
+            return
+
+        size = len(header) + len(segment.raw_data)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._total_bytes += size
+            self._evict()
+
+    def _remove(self, key: str):
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+def _create_segment_cache() -> SegmentCache:
+    settings = config_manager.get_config().SEGMENT_CACHE
+    return SegmentCache(
+        cache_dir=settings.directory,
+        max_size_mb=settings.max_size_mb,
+        enabled=settings.enabled
+    )
+
+# 创建全局片段缓存实例
+segment_cache = _create_segment_cache()
@@ -1,9 +1,99 @@
 from openai import OpenAI, Timeout, AsyncOpenAI
 import os
+import re
 import time
 import asyncio  # 导入 asyncio
 import httpx  # 导入 httpx
 from config_manager import config_manager  # 使用新的配置管理器
+from llm_cache import llm_cache
+from executors import run_blocking
+from token_counter import count_tokens
+from ordered_stream import merge_in_order
+from tracing import traced_stream
+
+# 命中缓存时回放的每块字符数，模拟流式输出
+CACHE_REPLAY_CHUNK_SIZE = 32
+
+# 长故事分段转换时追加到系统提示词后的说明
+SECTION_PROMPT = """
+
+# 分段转换说明
+这是一篇长故事的第{index}/{total}部分，请只把【本段内容】转换成对话脚本。
+【前情提要】和【上文衔接】只用于保持人物和情节连贯，不要重复讲述其中的内容。
+{position}"""
+SECTION_POSITION_FIRST = "这是开头部分：按要求由主持人开场，介绍故事最吸引人的地方，但不要收尾。"
+SECTION_POSITION_MIDDLE = "这是中间部分：不要重新开场或打招呼，也不要收尾，直接接着上文继续对话。"
+SECTION_POSITION_LAST = "这是结尾部分：不要重新开场，直接接着上文继续对话，并按要求以高潮和点评收尾。"
+
+# 生成段落概要的系统提示词
+SUMMARY_PROMPT = "请用不超过{limit}字概括下面这段故事中出场的人物和情节进展，只输出概要本身。"
+
+def _split_units(text, max_tokens, model=""):
+    """把文本切成不超过 max_tokens 的最小单元：先按行，过长的行再按句子，仍过长时按字符硬切"""
+    units = []
+    for line in text.splitlines(keepends=True):
+        if count_tokens(line, model) <= max_tokens:
+            units.append(line)
+            continue
+        for sentence in re.split(r'(?<=[。！？!?；;…])', line):
+            if not sentence:
+                continue
+            while count_tokens(sentence, model) > max_tokens:
+                # 没有标点的超长句子，按上限（中文约每字 1 个 token）硬切
+                units.append(sentence[:max_tokens])
+                sentence = sentence[max_tokens:]
+            if sentence:
+                units.append(sentence)
+    return units
+
+def _take_tail(units, max_tokens, model=""):
+    """从末尾向前取完整的单元，直到达到 token 上限"""
+    tail, tail_tokens = [], 0
+    for unit in reversed(units):
+        unit_tokens = count_tokens(unit, model)
+        if tail_tokens + unit_tokens > max_tokens:
+            break
+        tail.insert(0, unit)
+        tail_tokens += unit_tokens
+    return "".join(tail)
+
+def split_story(text, max_tokens, overlap_tokens=200, model=""):
+    """
+    把长故事切成若干段，每段附带上一段结尾的一小段原文用于衔接
+    
+    Args:
+        text: 故事原文
+        max_tokens: 每段的 token 上限
+        overlap_tokens: 衔接原文的 token 上限
+        model: 用于计算 token 数的模型名称
+        
+    Returns:
+        List[Tuple[str, str]]: 按顺序排列的 (上文衔接, 本段内容)
+    """
+    sections = []
+    current, current_tokens = [], 0
+    for unit in _split_units(text, max_tokens, model):
+        unit_tokens = count_tokens(unit, model)
+        if current and current_tokens + unit_tokens > max_tokens:
+            sections.append(current)
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        sections.append(current)
+    
+    result = []
+    for i, units in enumerate(sections):
+        overlap = ""
+        if i > 0 and overlap_tokens > 0:
+            overlap = _take_tail(sections[i - 1], overlap_tokens, model)
+            if not overlap:
+                # 最后一行过长时改为取完整的句子，仍不够时按字符截取
+                last_line = sections[i - 1][-1]
+                sentences = [s for s in re.split(r'(?<=[。！？!?；;…])', last_line) if s]
+                overlap = _take_tail(sentences, overlap_tokens, model) or last_line[-overlap_tokens:]
+        result.append((overlap.strip(), "".join(units)))
+    return [(overlap, section) for overlap, section in result if section.strip()]
 
 class StoryConverter:
     def __init__(self):
@@ -36,6 +126,7 @@ class StoryConverter:
         # --- 修改结束 ---
         
         self.model = config.API_KEYS.openai_model
+        self.temperature = 0.7
         
         print(f"初始化 StoryConverter:")
         print(f"使用模型: {self.model}")
@@ -88,19 +179,9 @@ class StoryConverter:
                 http_client=async_http_client # 传递自定义的AsyncClient
             )
             print("异步 OpenAI 客户端创建成功")
-            
-            # --- 修改：添加 await ---
-            try:
-                # 需要在异步上下文中运行 await
-                # 注意：直接在这里运行 asyncio.run 可能不是最佳实践，
-                # 但为了修复警告，暂时这样做。
-                # 更好的方式是在应用的整体异步循环中处理关闭。
-                async def close_async_client():
-                    await async_http_client.aclose() # <--- 修改这里
-                asyncio.run(close_async_client())
-            except Exception:
-                pass
-            
+            # 注意：async_http_client 由 async_client 持续使用，不能在这里关闭，
+            # 否则所有流式请求都会报 "client has been closed"；应用关闭时由 aclose 释放
+
         except Exception as e:
             print(f"创建 OpenAI 客户端失败: {str(e)}")
             # 如果创建失败，尝试关闭已创建的http客户端
@@ -195,14 +276,41 @@ class StoryConverter:
    
 记住格式要求： 每一行对话必须以[主持人]或[嘉宾]标签开头，不允许出现没有角色标签的对话行，角色标签必须紧贴对话内容，中间不能有空格"""
     
+    async def aclose(self):
+        """关闭同步和异步 OpenAI 客户端及其 HTTP 连接池（应用关闭时调用）"""
+        await self.async_client.close()
+        self.client.close()
+    
+    def _cache_key(self, story_text, custom_prompt=None, use_cache=None):
+        """
+        计算响应缓存键，未启用缓存或本次请求不使用缓存时返回 None
+        
+        Args:
+            story_text: 故事文本
+            custom_prompt: 自定义系统提示词
+            use_cache: 本次请求是否使用缓存，None 时按 LLM_CACHE 配置
+        """
+        if not llm_cache.enabled or use_cache is False:
+            return None
+        return llm_cache.make_key(
+            self.model, self.async_client.base_url,
+            custom_prompt or self.system_prompt, self.temperature, story_text
+        )
+    
     # 新增异步流式方法
-    async def convert_story_stream(self, story_text, custom_prompt=None):
+    async def convert_story_stream(self, story_text, custom_prompt=None, use_cache=None, long_mode=None):
         """
         将故事文本转换为对话形式（异步流式输出）
         
+        启用 LLM_CACHE 时，相同模型、提示词、温度和故事的结果直接从缓存按块回放，
+        调用方看到的输出与实时生成相同。超过 LONG_STORY_SETTINGS.max_section_tokens 的长故事
+        会分段并行转换，各段脚本按顺序输出。
+        
         Args:
             story_text: 要转换的故事文本
             custom_prompt: 自定义系统提示词（可选）
+            use_cache: 是否使用响应缓存，None 时按配置
+            long_mode: 是否对长故事分段转换，None 时按配置
             
         Yields:
             str: 对话脚本的数据块 (content chunk)
@@ -210,18 +318,41 @@ class StoryConverter:
         Raises:
             Exception: 如果 OpenAI API 调用失败或其他错误发生
         """
+        sections = self._split_long_story(story_text, long_mode)
+        if len(sections) > 1:
+            stream = self._convert_sections_stream(sections, custom_prompt, use_cache)
+        else:
+            stream = self._stream_chat(story_text, custom_prompt, use_cache)
+        
+        # 记录脚本生成总耗时和首个数据块的等待时间
+        async for content in traced_stream("llm", stream, model=self.model, sections=len(sections)):
+            yield content
+    
+    async def _stream_chat(self, user_content, system_prompt=None, use_cache=None):
+        """流式调用模型（带响应缓存），system_prompt 为空时使用默认提示词"""
+        cache_key = self._cache_key(user_content, system_prompt, use_cache)
+        if cache_key is not None:
+            cached = await run_blocking(llm_cache.get, cache_key)
+            if cached is not None:
+                print(f"LLM 调用命中缓存，输入长度: {len(user_content)}")
+                for i in range(0, len(cached), CACHE_REPLAY_CHUNK_SIZE):
+                    yield cached[i:i + CACHE_REPLAY_CHUNK_SIZE]
+                    await asyncio.sleep(0)
+                return
+        
+        parts = []
         try:
             # --- 新增：打印连接的 Base URL --- 
             print(f"StoryConverter: 尝试连接 Base URL: {self.async_client.base_url}")
             # --- 新增结束 ---
-            print(f"调用异步流式转换，模型: {self.model}, 文本长度: {len(story_text)}")
+            print(f"调用异步流式转换，模型: {self.model}, 文本长度: {len(user_content)}")
             response = await self.async_client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": custom_prompt or self.system_prompt},
-                    {"role": "user", "content": story_text}
+                    {"role": "system", "content": system_prompt or self.system_prompt},
+                    {"role": "user", "content": user_content}
                 ],
-                temperature=0.7,
+                temperature=self.temperature,
                 stream=True  # 启用流式输出
             )
             
@@ -229,25 +360,40 @@ class StoryConverter:
                 if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content is not None:
                     content = chunk.choices[0].delta.content
                     if content:
+                        parts.append(content)
                         yield content  # 直接 yield 内容块
                         
         except Exception as e:
             print(f"异步流式转换错误: {e}")
             # 让异常向上冒泡，由调用者处理
             raise
+        
+        # 只缓存完整生成的结果
+        if cache_key is not None:
+            await run_blocking(llm_cache.put, cache_key, "".join(parts), self.model)
     
     # 保留原有的同步方法，以保持兼容性
-    def convert_story(self, story_text, custom_prompt=None):
+    def convert_story(self, story_text, custom_prompt=None, use_cache=None):
         """
         将故事文本转换为对话形式（同步方法）
         
         Args:
             story_text: 要转换的故事文本
             custom_prompt: 自定义系统提示词（可选）
+            use_cache: 是否使用响应缓存，None 时按配置
             
         Returns:
             dict: 包含转换结果的字典
         """
+        cache_key = self._cache_key(story_text, custom_prompt, use_cache)
+        if cache_key is not None:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return {
+                    "success": True,
+                    "dialogue_text": cached
+                }
+        
         try:
             # 使用流式输出
             response = self.client.chat.completions.create(
@@ -256,7 +402,7 @@ class StoryConverter:
                     {"role": "system", "content": custom_prompt or self.system_prompt},
                     {"role": "user", "content": story_text}  # 直接使用故事文本作为用户输入
                 ],
-                temperature=0.7,
+                temperature=self.temperature,
                 stream=True
             )
             
@@ -275,6 +421,9 @@ class StoryConverter:
                     full_response += content
                     last_update_time = current_time
             
+            if cache_key is not None:
+                llm_cache.put(cache_key, full_response, self.model)
+            
             return {
                 "success": True,
                 "dialogue_text": full_response
@@ -294,30 +443,29 @@ class StoryConverter:
             }
     
     # 新增异步非流式方法
-    async def convert_story_async(self, story_text, custom_prompt=None):
+    async def convert_story_async(self, story_text, custom_prompt=None, use_cache=None, long_mode=None):
         """
         将故事文本转换为对话形式（异步非流式方法）
         
         Args:
             story_text: 要转换的故事文本
             custom_prompt: 自定义系统提示词（可选）
+            use_cache: 是否使用响应缓存，None 时按配置
+            long_mode: 是否对长故事分段转换，None 时按配置
             
         Returns:
             dict: 包含转换结果的字典
         """
         try:
-            # 使用异步客户端，非流式输出
-            response = await self.async_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": custom_prompt or self.system_prompt},
-                    {"role": "user", "content": story_text}
-                ],
-                temperature=0.7,
-                stream=False # 非流式
-            )
-            
-            full_response = response.choices[0].message.content
+            sections = self._split_long_story(story_text, long_mode)
+            if len(sections) > 1:
+                parts = [
+                    content async for content in
+                    self._convert_sections_stream(sections, custom_prompt, use_cache)
+                ]
+                full_response = "".join(parts)
+            else:
+                full_response = await self._complete_chat(story_text, custom_prompt, use_cache)
             
             return {
                 "success": True,
@@ -330,4 +478,112 @@ class StoryConverter:
                 "success": False,
                 "error": str(e),
                 "partial_result": None
-            } 
\ No newline at end of file
+            }
+    
+    async def _complete_chat(self, user_content, system_prompt=None, use_cache=None):
+        """非流式调用模型（带响应缓存），返回完整回复"""
+        cache_key = self._cache_key(user_content, system_prompt, use_cache)
+        if cache_key is not None:
+            cached = await run_blocking(llm_cache.get, cache_key)
+            if cached is not None:
+                return cached
+        
+        # 使用异步客户端，非流式输出
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt or self.system_prompt},
+                {"role": "user", "content": user_content}
+            ],
+            temperature=self.temperature,
+            stream=False # 非流式
+        )
+        
+        full_response = response.choices[0].message.content
+        
+        if cache_key is not None:
+            await run_blocking(llm_cache.put, cache_key, full_response, self.model)
+        return full_response
+    
+    def _split_long_story(self, story_text, long_mode=None):
+        """
+        按配置判断是否需要分段，需要时返回 (上文衔接, 本段内容) 列表，否则返回空列表
+        """
+        settings = config_manager.get_config().LONG_STORY_SETTINGS
+        if long_mode is None:
+            long_mode = settings.enabled
+        if not long_mode or count_tokens(story_text, self.model) <= settings.max_section_tokens:
+            return []
+        return split_story(
+            story_text, settings.max_section_tokens, settings.overlap_tokens, self.model
+        )
+    
+    async def _convert_sections_stream(self, sections, custom_prompt=None, use_cache=None):
+        """
+        分段并行转换长故事（map-reduce）
+        
+        先并行为每段生成简短概要；第 i 段等前面各段的概要就绪后，带着前情提要和上文衔接开始转换，
+        因此第一段可以立即开始。各段并行转换，脚本按原文顺序流式输出并拼接。
+        概要和转换共用一个信号量，同时进行的模型请求不超过 LONG_STORY_SETTINGS.concurrency。
+        
+        Args:
+            sections: split_story 返回的 (上文衔接, 本段内容) 列表
+            custom_prompt: 自定义系统提示词（可选）
+            use_cache: 是否使用响应缓存
+            
+        Yields:
+            str: 对话脚本的数据块
+        """
+        settings = config_manager.get_config().LONG_STORY_SETTINGS
+        base_prompt = custom_prompt or self.system_prompt
+        total = len(sections)
+        print(f"长故事分段转换: {total} 段, 并发 {settings.concurrency}")
+        
+        summary_prompt = SUMMARY_PROMPT.format(limit=settings.summary_chars)
+        semaphore = asyncio.Semaphore(settings.concurrency)
+        
+        async def summarize(section):
+            async with semaphore:
+                return await self._complete_chat(section, summary_prompt, use_cache)
+        
+        # 第一段不需要前情提要，先为它占一个名额，不必排在各段概要之后
+        await semaphore.acquire()
+        # 最后一段的概要不会被用到
+        summary_tasks = [
+            asyncio.ensure_future(summarize(section)) for _, section in sections[:-1]
+        ]
+        
+        async def convert_section(index):
+            overlap, section = sections[index]
+            summaries = await asyncio.gather(*summary_tasks[:index])
+            if index == 0:
+                position = SECTION_POSITION_FIRST
+            elif index == total - 1:
+                position = SECTION_POSITION_LAST
+            else:
+                position = SECTION_POSITION_MIDDLE
+            system_prompt = base_prompt + SECTION_PROMPT.format(
+                index=index + 1, total=total, position=position
+            )
+            user_content = ""
+            if summaries:
+                user_content += "【前情提要】\n" + "\n".join(summaries) + "\n\n"
+            if overlap:
+                user_content += "【上文衔接】\n" + overlap + "\n\n"
+            user_content += "【本段内容】\n" + section
+            if index > 0:
+                await semaphore.acquire()
+            try:
+                async for content in self._stream_chat(user_content, system_prompt, use_cache):
+                    yield content
+            finally:
+                semaphore.release()
+        
+        producers = [lambda index=index: convert_section(index) for index in range(total)]
+        try:
+            # 并发由上面的信号量控制，等待概要的段落不占用名额
+            async for content in merge_in_order(producers, None, separator="\n"):
+                yield content
+        finally:
+            for task in summary_tasks:
+                task.cancel()
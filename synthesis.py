@@ -0,0 +1,400 @@
+import io
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Awaitable, AsyncIterator, Dict, Optional, Any, Tuple
+from pydub import AudioSegment
+from config_manager import config_manager
+from segment_cache import segment_cache
+from executors import run_blocking
+from rate_limiter import rate_limiter
+from hedging import hedging_policy
+from tts_factory import TTSFactory
+from metrics import segments_in_flight, segments_total, observe_stream
+from tracing import span, traced_stream
+from audio_stream import STREAM_FRAME_RATE, STREAM_SAMPLE_WIDTH, segment_to_pcm
+
+class SynthesisPool:
+    """按TTS引擎划分的有界并发合成线程池"""
+
+    def __init__(self):
+        """
+        初始化合成线程池
+
+        每个引擎使用独立的线程池，池大小取自 AppConfig.TTS_CONCURRENCY，
+        这样多个片段可以同时请求，又不会超出各服务商允许的并发数。
+        """
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # 异步合成使用的信号量: engine -> (信号量, 并发上限, 所属事件循环)
+        self._semaphores: Dict[str, Tuple[asyncio.Semaphore, int, asyncio.AbstractEventLoop]] = {}
+
+    def get_limit(self, engine: str) -> int:
+        """获取指定引擎的并发上限（未配置的引擎按1处理）"""
+        limits = config_manager.get_config().TTS_CONCURRENCY
+        return getattr(limits, engine, 1)
+
+    def _get_executor(self, engine: str) -> ThreadPoolExecutor:
+        """获取引擎对应的线程池，配置变化时按新的并发上限重建"""
+        limit = self.get_limit(engine)
+        with self._lock:
+            executor = self._executors.get(engine)
+            if executor is None or self._sizes.get(engine) != limit:
+                if executor is not None:
+                    # 旧线程池中已提交的任务会继续执行完
+                    executor.shutdown(wait=False)
+                executor = ThreadPoolExecutor(
+                    max_workers=limit,
+                    thread_name_prefix=f"tts-{engine}"
+                )
+                self._executors[engine] = executor
+                self._sizes[engine] = limit
+            return executor
+
+    def submit(self, engine: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        向指定引擎的线程池提交合成任务
+
+        Args:
+            engine: TTS引擎名称
+            fn: 要执行的函数
+
+        Returns:
+            Future: 任务结果
+        """
+        # 在提交时上下文的副本中执行，线程中记录的追踪区间归入当前请求
+        context = contextvars.copy_context()
+        return self._get_executor(engine).submit(context.run, fn, *args, **kwargs)
+
+    def _get_semaphore(self, engine: str) -> asyncio.Semaphore:
+        """获取引擎对应的异步信号量，并发上限或事件循环变化时重建"""
+        limit = self.get_limit(engine)
+        loop = asyncio.get_running_loop()
+        entry = self._semaphores.get(engine)
+        if entry is None or entry[1] != limit or entry[2] is not loop:
+            entry = (asyncio.Semaphore(limit), limit, loop)
+            self._semaphores[engine] = entry
+        return entry[0]
+
+    async def run(self, engine: str, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """
+        在引擎并发上限内执行异步合成任务
+
+        Args:
+            engine: TTS引擎名称
+            fn: 返回协程的函数
+
+        Returns:
+            Any: fn 的返回值
+        """
+        async with self._get_semaphore(engine):
+            return await fn(*args, **kwargs)
+
+    def create_task(self, engine: str, fn: Callable[..., Awaitable], *args, **kwargs) -> "asyncio.Task":
+        """创建受引擎并发上限约束的异步任务，需在事件循环中调用"""
+        return asyncio.ensure_future(self.run(engine, fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        """关闭所有线程池"""
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=wait)
+            self._executors.clear()
+            self._sizes.clear()
+
+def get_engine_name(tts_client: Any) -> str:
+    """获取TTS客户端对应的引擎名称"""
+    return getattr(tts_client, "engine_name", type(tts_client).__name__.lower())
+
+def _adapt_params(tts_client: Any, tts_params: Dict) -> Dict:
+    """修正不同引擎之间不一致的参数名"""
+    params = dict(tts_params)
+    if get_engine_name(tts_client) == "elevenlabs":
+        if 'voice_name' in params:
+            params['voice_id'] = params.pop('voice_name')
+        # ElevenLabs 的 model 参数由 ElevenLabsTTS 内部使用默认值
+        params.pop('model', None)
+    return params
+
+def get_cache_key(tts_client: Any, params: Dict) -> str:
+    """
+    计算片段缓存键
+
+    除请求参数外还包含引擎内部使用的默认模型，
+    避免修改默认模型后仍命中旧模型生成的音频。
+    """
+    key_params = dict(params)
+    key_params["default_model"] = (
+        getattr(tts_client, "default_model", None)
+        or getattr(tts_client, "default_model_id", None)
+    )
+    return segment_cache.make_key(get_engine_name(tts_client), key_params)
+
+def decode_audio(audio_data: bytes, audio_format: str) -> AudioSegment:
+    """
+    在内存中解码音频数据
+
+    Args:
+        audio_data: 服务商返回的音频数据
+        audio_format: 音频格式，原始PCM使用 "pcm_<采样率>" 表示（16bit 单声道）
+
+    Returns:
+        AudioSegment: 解码后的音频片段
+    """
+    if audio_format.startswith("pcm"):
+        _, _, rate = audio_format.partition("_")
+        return AudioSegment(
+            data=audio_data,
+            frame_rate=int(rate) if rate else 44100,
+            channels=1,
+            sample_width=2
+        )
+    if audio_format == "wav":
+        # 直接解析内存中的 WAV，不经过 FFmpeg
+        return AudioSegment(data=audio_data)
+    return AudioSegment.from_file(io.BytesIO(audio_data), format=audio_format)
+
+def _finish_segment(
+    cache_key: Optional[str],
+    audio_data: bytes,
+    audio_format: str,
+    normalize: bool
+) -> AudioSegment:
+    """解码服务商返回的音频、写入片段缓存（cache_key 为空时不写入）并按需进行音量平衡"""
+    with span("decode", format=audio_format, bytes=len(audio_data)):
+        segment = decode_audio(audio_data, audio_format)
+    if cache_key:
+        with span("cache_write"):
+            segment_cache.put(cache_key, segment)
+    if normalize:
+        with span("normalize"):
+            segment = segment.normalize() # 音量平衡
+    return segment
+
+def _load_cached(cache_key: str, normalize: bool) -> Optional[AudioSegment]:
+    """从片段缓存读取音频并按需进行音量平衡，未命中返回 None"""
+    with span("cache_read") as current:
+        segment = segment_cache.get(cache_key)
+        if current is not None:
+            current.set(hit=segment is not None)
+    if segment is not None and normalize:
+        with span("normalize"):
+            segment = segment.normalize()
+    return segment
+
+def _request_audio(tts_client: Any, params: Dict) -> Tuple[bytes, str]:
+    """经过限流器请求服务商合成音频"""
+    engine = get_engine_name(tts_client)
+    with span("provider", engine=engine):
+        return rate_limiter.call(engine, getattr(tts_client, "api_key", None), tts_client.synthesize, **params)
+
+async def _arequest_audio(tts_client: Any, params: Dict) -> Tuple[bytes, str]:
+    """经过限流器请求服务商合成音频，耗时过长时发起对冲请求"""
+    engine = get_engine_name(tts_client)
+    api_key = getattr(tts_client, "api_key", None)
+    if hasattr(tts_client, "asynthesize"):
+        fn = tts_client.asynthesize
+    else:
+        async def fn(**kwargs):
+            return await asyncio.to_thread(tts_client.synthesize, **kwargs)
+    timed_fn = hedging_policy.timed(engine, fn)
+    limiter = rate_limiter.get(engine, api_key)
+
+    async def hedged(**kwargs):
+        # 在限流器名额内执行，对冲阈值从请求实际发出时开始计时；
+        # 对冲请求需要另一个富余名额，冷却期内或名额已满时不对冲
+        return await hedging_policy.run(
+            engine,
+            lambda: timed_fn(**kwargs),
+            hedge_call=lambda: rate_limiter.ahedge(engine, api_key, timed_fn, **kwargs),
+            can_hedge=limiter.can_hedge
+        )
+
+    # 包含限流等待、重试和对冲请求
+    with span("provider", engine=engine):
+        return await rate_limiter.acall(engine, api_key, hedged, **params)
+
+def _astream_audio(tts_client: Any, params: Dict) -> AsyncIterator[bytes]:
+    """经过限流器以流式模式请求服务商合成音频（不发起对冲请求）"""
+    engine = get_engine_name(tts_client)
+
+    def request(**kwargs):
+        return observe_stream(engine, kwargs.get("text"), tts_client.astream_audio(**kwargs))
+
+    stream = rate_limiter.astream(engine, getattr(tts_client, "api_key", None), request, **params)
+    return traced_stream("provider", stream, engine=engine)
+
+def _get_failover(tts_client: Any, tts_params: Dict, error: Exception) -> Optional[Tuple[Any, Dict]]:
+    """主引擎合成失败时获取备用引擎及其参数，未配置时返回 None"""
+    engine = get_engine_name(tts_client)
+    failover = TTSFactory.create_failover(engine, tts_params)
+    if failover is not None:
+        fallback_tts, fallback_params = failover
+        hedging_policy.count(engine, "failovers")
+        print(f"{engine} 合成失败（{error}），改用备用引擎 {get_engine_name(fallback_tts)}")
+        failover = (fallback_tts, _adapt_params(fallback_tts, fallback_params))
+    return failover
+
+def synthesize_segment(
+    tts_client: Any,
+    tts_params: Dict,
+    normalize: bool = False
+) -> Optional[AudioSegment]:
+    """
+    合成单个片段并在内存中解码为 AudioSegment
+
+    相同引擎与参数的片段直接从片段缓存读取，不再请求服务商；
+    请求服务商时经过全局限流器，限流和临时错误会自动重试，
+    仍然失败时改用 RESILIENCE.failover 中配置的备用引擎（备用引擎的结果不写入缓存）。
+
+    Args:
+        tts_client: TTS客户端实例
+        tts_params: synthesize 参数
+        normalize: 是否进行音量平衡
+
+    Returns:
+        Optional[AudioSegment]: 合成成功返回音频片段，失败返回 None
+    """
+    engine = get_engine_name(tts_client)
+    params = _adapt_params(tts_client, tts_params)
+    cache_key = get_cache_key(tts_client, params)
+
+    try:
+        with segments_in_flight.track(engine=engine):
+            segment = _load_cached(cache_key, normalize)
+            if segment is None:
+                try:
+                    audio_data, audio_format = _request_audio(tts_client, params)
+                except Exception as e:
+                    failover = _get_failover(tts_client, tts_params, e)
+                    if failover is None:
+                        raise
+                    cache_key = None
+                    audio_data, audio_format = _request_audio(*failover)
+                segment = _finish_segment(cache_key, audio_data, audio_format, normalize)
+        segments_total.inc(engine=engine, outcome="ok")
+        return segment
+
+    except Exception as e:
+        segments_total.inc(engine=engine, outcome="failed")
+        print(f"处理片段 '{tts_params.get('text')}' 时发生错误: {e}")
+        return None
+
+async def asynthesize_segment(
+    tts_client: Any,
+    tts_params: Dict,
+    normalize: bool = False
+) -> Optional[AudioSegment]:
+    """
+    synthesize_segment 的异步版本
+
+    引擎提供 asynthesize 时直接 await，否则在线程中调用同步的 synthesize；
+    请求耗时超过该引擎近期 p95 时发起对冲请求，先返回者胜出；
+    缓存读写、解码和音量平衡都在音频线程池中执行，不阻塞事件循环。
+
+    Args:
+        tts_client: TTS客户端实例
+        tts_params: synthesize 参数
+        normalize: 是否进行音量平衡
+
+    Returns:
+        Optional[AudioSegment]: 合成成功返回音频片段，失败返回 None
+    """
+    engine = get_engine_name(tts_client)
+    params = _adapt_params(tts_client, tts_params)
+    cache_key = get_cache_key(tts_client, params)
+
+    try:
+        with segments_in_flight.track(engine=engine):
+            segment = await run_blocking(_load_cached, cache_key, normalize)
+            if segment is None:
+                try:
+                    audio_data, audio_format = await _arequest_audio(tts_client, params)
+                except Exception as e:
+                    failover = _get_failover(tts_client, tts_params, e)
+                    if failover is None:
+                        raise
+                    cache_key = None
+                    audio_data, audio_format = await _arequest_audio(*failover)
+                segment = await run_blocking(_finish_segment, cache_key, audio_data, audio_format, normalize)
+        segments_total.inc(engine=engine, outcome="ok")
+        return segment
+
+    except Exception as e:
+        segments_total.inc(engine=engine, outcome="failed")
+        print(f"处理片段 '{tts_params.get('text')}' 时发生错误: {e}")
+        return None
+
+def supports_pcm_stream(tts_client: Any) -> bool:
+    """引擎能否以对谈流式输出的PCM格式逐块返回音频（受 STREAMING.progressive_segments 控制）"""
+    if not config_manager.get_config().STREAMING.progressive_segments:
+        return False
+    if not hasattr(tts_client, "astream_audio") or not hasattr(tts_client, "stream_format"):
+        return False
+    return tts_client.stream_format("pcm") == f"pcm_{STREAM_FRAME_RATE}"
+
+async def astream_segment(
+    tts_client: Any,
+    tts_params: Dict,
+    normalize: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    合成单个片段，边接收边输出对谈流式输出格式的PCM数据（引擎需满足 supports_pcm_stream）
+
+    缓存命中时一次输出整个片段；否则以流式模式请求 PCM，每收到一块就输出，
+    读完后将完整片段写入片段缓存。边收边播的片段无法预知峰值，不进行音量平衡。
+    收到第一块之前失败时按 synthesize_segment 的方式重试或改用备用引擎，
+    之后失败则在已输出的位置结束。失败时不抛出异常，调用方可根据是否收到数据决定补静音。
+
+    Args:
+        tts_client: TTS客户端实例
+        tts_params: synthesize 参数
+        normalize: 缓存命中或改用备用引擎时是否进行音量平衡
+
+    Yields:
+        bytes: 44.1kHz 单声道 16bit PCM 数据块
+    """
+    engine = get_engine_name(tts_client)
+    params = _adapt_params(tts_client, tts_params)
+    # 缓存键与整句合成相同，两种方式共用缓存
+    cache_key = get_cache_key(tts_client, params)
+
+    try:
+        with segments_in_flight.track(engine=engine):
+            segment = await run_blocking(_load_cached, cache_key, normalize)
+            if segment is not None:
+                yield await run_blocking(segment_to_pcm, segment)
+            else:
+                buffer = bytearray()
+                sent = 0
+                try:
+                    async for chunk in _astream_audio(tts_client, dict(params, response_format="pcm")):
+                        buffer += chunk
+                        # 只输出完整的采样，不完整的字节留到下一块
+                        end = len(buffer) - len(buffer) % STREAM_SAMPLE_WIDTH
+                        if end > sent:
+                            yield bytes(buffer[sent:end])
+                            sent = end
+                except Exception as e:
+                    if buffer:
+                        raise
+                    failover = _get_failover(tts_client, tts_params, e)
+                    if failover is None:
+                        raise
+                    audio_data, audio_format = await _arequest_audio(*failover)
+                    segment = await run_blocking(_finish_segment, None, audio_data, audio_format, normalize)
+                    yield await run_blocking(segment_to_pcm, segment)
+                else:
+                    await run_blocking(
+                        _finish_segment, cache_key, bytes(buffer[:sent]), tts_client.stream_format("pcm"), False
+                    )
+        segments_total.inc(engine=engine, outcome="ok")
+
+    except Exception as e:
+        segments_total.inc(engine=engine, outcome="failed")
+        print(f"处理片段 '{tts_params.get('text')}' 时发生错误: {e}")
+
+# 创建全局合成线程池实例
+synthesis_pool = SynthesisPool()
@@ -0,0 +1,21 @@
+import unittest
+from tts_api import SiliconFlowTTS
+
+class BuildPayloadTest(unittest.TestCase):
+    """SiliconFlowTTS._build_payload 的音色名称拼接"""
+
+    def setUp(self):
+        self.tts = SiliconFlowTTS(api_key="test-key")
+
+    def build(self, voice_name):
+        return self.tts._build_payload("你好", voice_name, "FunAudioLLM/CosyVoice2-0.5B", "wav", 1.0, 0.0, False)
+
+    def test_preset_voice_gets_model_prefix(self):
+        self.assertEqual(self.build("anna")["voice"], "FunAudioLLM/CosyVoice2-0.5B:anna")
+
+    def test_uploaded_voice_uri_passed_through(self):
+        uri = "speech:my-voice:abc123:xyz"
+        self.assertEqual(self.build(uri)["voice"], uri)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+from functools import lru_cache
+
+# tiktoken 为可选依赖，未安装时使用估算值
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数：中日韩字符按每字 1 个计算，其余字符按每 4 个字符 1 个计算
+    """
+    cjk = sum(1 for ch in text if '\u3000' <= ch <= '\u9fff' or '\uff00' <= ch <= '\uffef')
+    return cjk + (len(text) - cjk + 3) // 4
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # 非 OpenAI 官方模型名（如各类兼容接口）使用通用编码
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str = "") -> int:
+    """
+    计算文本的 token 数
+
+    安装了 tiktoken 时按模型对应的编码精确计算，否则使用 estimate_tokens 估算。
+
+    Args:
+        text: 文本
+        model: 模型名称
+
+    Returns:
+        int: token 数
+    """
+    if not TIKTOKEN_AVAILABLE:
+        return estimate_tokens(text)
+    try:
+        return len(_get_encoding(model or "gpt-3.5-turbo").encode(text, disallowed_special=()))
+    except Exception:
+        # 编码文件下载失败等情况
+        return estimate_tokens(text)
@@ -0,0 +1,322 @@
+import re
+import json
+import time
+import queue
+import secrets
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import httpx
+from config_manager import config_manager, BASE_DIR
+
+class Span:
+    """一个计时区间"""
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None  # 秒，结束前为 None
+
+    def set(self, **attributes):
+        """添加属性"""
+        self.attributes.update(attributes)
+
+    def end(self):
+        """结束计时（重复调用无效）"""
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+            self.trace._add(self)
+
+    @property
+    def end_ns(self) -> int:
+        return self.start_ns + int((self.duration or 0.0) * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_nano": self.start_ns,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attributes": self.attributes
+        }
+
+class Trace:
+    """一次请求或一个渲染任务中记录的所有区间"""
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = Span(self, name, None, attributes)
+
+    def _add(self, span: Span):
+        # 区间可能在音频线程池中结束
+        with self._lock:
+            self.spans.append(span)
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        """
+        按区间名称汇总耗时
+
+        并行合成时同名区间的耗时会累加，因此各项之和可能大于总耗时。
+
+        Returns:
+            Dict: 区间名称 -> {"ms": 累计毫秒, "count": 次数}，另含 total（从开始到现在的总耗时）
+        """
+        with self._lock:
+            spans = [span for span in self.spans if span is not self.root]
+        result: Dict[str, Dict[str, float]] = {}
+        for span in spans:
+            entry = result.setdefault(span.name, {"ms": 0.0, "count": 0})
+            entry["ms"] += span.duration * 1000
+            entry["count"] += 1
+        for entry in result.values():
+            entry["ms"] = round(entry["ms"], 1)
+        elapsed = self.root.duration if self.root.duration is not None else time.perf_counter() - self.root._started
+        result["total"] = {"ms": round(elapsed * 1000, 1), "count": 1}
+        return result
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头的值"""
+        metrics = []
+        for name, entry in self.timings().items():
+            metric = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+            if entry["count"] > 1:
+                metrics.append(f'{metric};dur={entry["ms"]};desc="{entry["count"]}x"')
+            else:
+                metrics.append(f'{metric};dur={entry["ms"]}')
+        return ", ".join(metrics)
+
+    def finish(self):
+        """结束追踪，按配置导出"""
+        self.root.end()
+        with self._lock:
+            has_children = len(self.spans) > 1
+        # 只有根区间的请求（如静态文件、统计接口）不导出
+        if has_children:
+            span_exporter.export(self)
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    """当前上下文中的追踪，未在追踪中时返回 None"""
+    return _current_trace.get()
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Optional[Trace]]:
+    """
+    开始一次追踪，退出时结束并导出
+
+    Args:
+        name: 追踪名称，如 "POST /convert_dialogue"
+        attributes: 根区间属性
+
+    Yields:
+        Optional[Trace]: 追踪对象，TRACING.enabled 为 false 时为 None
+    """
+    if not config_manager.get_config().TRACING.enabled:
+        yield None
+        return
+    current = Trace(name, **attributes)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(current.root)
+    try:
+        yield current
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        current.finish()
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """
+    开始一个区间但不设为当前区间，需调用 end() 结束
+
+    用于跨越 yield 的异步生成器，不在追踪中时返回 None。
+
+    Args:
+        name: 区间名称
+        attributes: 区间属性
+
+    Returns:
+        Optional[Span]: 新区间
+    """
+    current = _current_trace.get()
+    if current is None:
+        return None
+    parent = _current_span.get()
+    return Span(current, name, parent.span_id if parent else None, attributes)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    记录 with 块的耗时，块内开始的区间以它为父区间
+
+    不在追踪中时不做任何记录。
+
+    Args:
+        name: 区间名称，如 "parse"、"provider"、"decode"
+        attributes: 区间属性
+
+    Yields:
+        Optional[Span]: 当前区间
+    """
+    current = start_span(name, **attributes)
+    if current is None:
+        yield None
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+class SpanExporter:
+    """在后台线程中把追踪写入 JSONL 文件或发送给 OTLP 收集器，不阻塞请求"""
+
+    def __init__(self, max_pending: int = 1000):
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, finished: Trace):
+        """将结束的追踪加入导出队列，未配置导出目标时直接忽略"""
+        settings = config_manager.get_config().TRACING
+        if not settings.jsonl_path and not settings.otlp_endpoint:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        with httpx.Client(timeout=5.0) as client:
+            while True:
+                finished = self._queue.get()
+                settings = config_manager.get_config().TRACING
+                try:
+                    if settings.jsonl_path:
+                        self._write_jsonl(settings.jsonl_path, finished)
+                    if settings.otlp_endpoint:
+                        self._send_otlp(client, settings.otlp_endpoint, settings.service_name, finished)
+                except Exception as e:
+                    print(f"导出追踪出错: {e}")
+
+    @staticmethod
+    def _write_jsonl(path: str, finished: Trace):
+        path = Path(path)
+        if not path.is_absolute():
+            path = BASE_DIR / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for item in finished.spans:
+                f.write(json.dumps(item.to_dict(), ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def _send_otlp(client: httpx.Client, endpoint: str, service_name: str, finished: Trace):
+        spans = [{
+            "traceId": finished.trace_id,
+            "spanId": item.span_id,
+            "parentSpanId": item.parent_id or "",
+            "name": item.name,
+            "kind": 2 if item is finished.root else 1,  # SERVER / INTERNAL
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns),
+            "attributes": _otlp_attributes(item.attributes)
+        } for item in finished.spans]
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}]
+        }]}
+        response = client.post(endpoint, json=payload)
+        response.raise_for_status()
+
+# 创建全局追踪导出器实例
+span_exporter = SpanExporter()
+
+class ServerTimingMiddleware:
+    """为每个 HTTP 请求开始一次追踪，并在响应头中返回各阶段耗时（Server-Timing）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with trace(f"{scope['method']} {scope['path']}", method=scope["method"], path=scope["path"]) as current:
+            if current is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    current.root.set(status_code=message["status"])
+                    if config_manager.get_config().TRACING.server_timing:
+                        # 流式响应的响应头先于合成完成发出，只包含此前已结束的阶段
+                        headers = list(message.get("headers", []))
+                        headers.append((b"server-timing", current.server_timing().encode("latin-1")))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+async def traced_stream(name: str, stream: AsyncIterator, **attributes) -> AsyncIterator:
+    """
+    包装异步生成器，记录从开始到结束的区间（name）和等到第一个数据块的区间（name_first_chunk）
+
+    Args:
+        name: 区间名称，如 "llm"
+        stream: 原始异步生成器
+        attributes: 区间属性
+
+    Yields:
+        原始数据块
+    """
+    whole = start_span(name, **attributes)
+    first = start_span(f"{name}_first_chunk")
+    chunks = 0
+    try:
+        async for chunk in stream:
+            if chunks == 0 and first is not None:
+                first.end()
+            chunks += 1
+            yield chunk
+    finally:
+        if whole is not None:
+            whole.set(chunks=chunks)
+            whole.end()
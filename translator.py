@@ -2,7 +2,49 @@ from openai import Timeout, AsyncOpenAI
 import json # Import json for potential future use if yielding structured data
 import httpx # 导入 httpx
 import asyncio # <-- 导入 asyncio
+from typing import List, Optional, AsyncIterator
 from config_manager import config_manager  # 使用新的配置管理器
+from dialogue_parser import parse_dialogue
+from token_counter import count_tokens
+from ordered_stream import merge_in_order
+from tracing import traced_stream
+
+def split_script(text: str, max_tokens: int, model: str = "") -> List[str]:
+    """
+    在对话轮次边界把脚本切成不超过 max_tokens 的若干块
+
+    每块都是原文的连续片段，角色标签和富文本标记原样保留；
+    单个轮次超过上限时独占一块，不会被从中间切开。没有角色标签的文本按行切分。
+
+    Args:
+        text: 要切分的脚本
+        max_tokens: 每块的 token 上限
+        model: 用于计算 token 数的模型名称
+
+    Returns:
+        List[str]: 按原文顺序排列的文本块
+    """
+    turns, _ = parse_dialogue(text)
+    if turns:
+        # 切分点取在每轮对话内容的末尾，下一块以换行和角色标签开头
+        boundaries = [turn.end for turn in turns[:-1]]
+    else:
+        boundaries = [i + 1 for i, ch in enumerate(text) if ch == '\n']
+
+    chunks = []
+    chunk_start = 0
+    unit_start = 0
+    chunk_tokens = 0
+    for boundary in boundaries + [len(text)]:
+        unit_tokens = count_tokens(text[unit_start:boundary], model)
+        if chunk_tokens and chunk_tokens + unit_tokens > max_tokens:
+            chunks.append(text[chunk_start:unit_start])
+            chunk_start = unit_start
+            chunk_tokens = 0
+        chunk_tokens += unit_tokens
+        unit_start = boundary
+    chunks.append(text[chunk_start:])
+    return [chunk for chunk in chunks if chunk.strip()]
 
 class Translator:
     def __init__(self):
@@ -64,12 +106,16 @@ Please follow these rules:
 4. Ensure the accuracy of the content translation while maintaining the natural tone of spoken dialogue
 5. According to English conversation habits, appropriately refine the original text into a more native English oral dialogue script for gossip scenes"""
 
-    async def translate_stream(self, text_to_translate: str):
+    async def translate_stream(self, text_to_translate: str, chunked: Optional[bool] = None):
         """
         将中文对话脚本翻译成英文 (流式输出)
         
+        超过 TRANSLATION_SETTINGS.max_chunk_tokens 的长脚本会在对话轮次边界切块并行翻译，
+        结果仍按原文顺序流式输出。
+        
         Args:
             text_to_translate: 要翻译的中文文本
+            chunked: 是否分块并行翻译，None 时使用配置
             
         Yields:
             str: 翻译结果的数据块 (content chunk)
@@ -77,13 +123,38 @@ Please follow these rules:
         Raises:
             Exception: 如果 OpenAI API 调用失败或其他错误发生
         """
+        settings = config_manager.get_config().TRANSLATION_SETTINGS
+        if chunked is None:
+            chunked = settings.chunked
+        
+        chunks = split_script(text_to_translate, settings.max_chunk_tokens, self.model) if chunked else []
+        if len(chunks) <= 1:
+            stream = self._stream_completion(text_to_translate)
+        else:
+            print(f"长脚本分块翻译: {len(chunks)} 块, 并发 {settings.concurrency}")
+            stream = self._translate_chunks(chunks, settings.concurrency)
+        
+        # 记录翻译总耗时和首个数据块的等待时间
+        async for content in traced_stream("translate", stream, model=self.model, chunks=max(len(chunks), 1)):
+            yield content
+
+    def _translate_chunks(self, chunks: List[str], concurrency: int) -> AsyncIterator[str]:
+        """并行翻译各块并按原文顺序输出，各块译文之间补回轮次之间的换行"""
+        producers = [
+            lambda chunk=chunk: self._stream_completion(chunk)
+            for chunk in chunks
+        ]
+        return merge_in_order(producers, concurrency, separator="\n")
+
+    async def _stream_completion(self, text: str) -> AsyncIterator[str]:
+        """调用模型流式翻译一段文本"""
         try:
             # --- 修改：使用 self.async_client ---
             response = await self.async_client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": text_to_translate}
+                    {"role": "user", "content": text}
                 ],
                 temperature=0.7,
                 stream=True  # 启用流式输出
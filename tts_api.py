@@ -1,21 +1,30 @@
-import requests
+import httpx
 from pathlib import Path
 import base64
-from typing import Literal, Optional, Union, Dict, List
+from typing import Literal, Optional, Union, Dict, List, Tuple, Iterator, AsyncIterator
 import os
 import re
+from http_clients import http_clients
+from tts_errors import TTSProviderError, raise_for_response
+from metrics import observe_synthesis
 
 class SiliconFlowTTS:
     """硅基流动 TTS API 封装类"""
     
-    def __init__(self, api_key: str):
+    engine_name = "siliconflow"
+    
+    # 请求 pcm 时使用的采样率（16bit 单声道），与对谈流式输出的格式一致，可直接转发
+    PCM_SAMPLE_RATE = 44100
+    
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
         """
         初始化 TTS 客户端
         
         Args:
             api_key: 从 https://cloud.siliconflow.cn/account/ak 获取的 API 密钥
+            base_url: 接口根地址，默认 https://api.siliconflow.cn/v1
         """
-        self.base_url = "https://api.siliconflow.cn/v1/audio/speech"
+        self.base_url = f"{(base_url or 'https://api.siliconflow.cn/v1').rstrip('/')}/audio/speech"
         self.api_key = api_key
         self.headers = {
             "Authorization": f"Bearer {api_key}",
@@ -65,6 +74,175 @@ class SiliconFlowTTS:
             
         return text
     
+    def _build_payload(
+        self,
+        text: str,
+        voice_name: str,
+        model: str,
+        response_format: str,
+        speed: float,
+        gain: float,
+        stream: bool
+    ) -> Dict:
+        """校验参数并构建请求体"""
+        # 参数验证
+        if not (0.25 <= speed <= 4.0):
+            raise ValueError("speed must be between 0.25 and 4.0")
+        if not (-10 <= gain <= 10):
+            raise ValueError("gain must be between -10 and 10")
+        
+        # 预处理文本
+        processed_text = self._preprocess_text(text)
+            
+        # 构建完整的语音名称；上传的自定义音色（uri 形如 speech:...）直接使用，不加模型前缀
+        if voice_name.startswith("speech:"):
+            full_voice_name = voice_name
+        else:
+            full_voice_name = f"{model}:{voice_name}"
+        
+        # 构建请求参数
+        payload = {
+            "model": model,
+            "voice": full_voice_name,
+            "input": processed_text,
+            "response_format": response_format,
+            "stream": stream,
+            "speed": speed,
+            "gain": gain
+        }
+        if response_format == "pcm":
+            payload["sample_rate"] = self.PCM_SAMPLE_RATE
+        return payload
+
+    def stream_format(self, response_format: str) -> str:
+        """synthesize/stream_audio 返回的实际音频格式，pcm 表示为 pcm_<采样率>"""
+        return f"pcm_{self.PCM_SAMPLE_RATE}" if response_format == "pcm" else response_format
+
+    def stream_audio(
+        self,
+        text: str,
+        voice_name: str = "anna",
+        model: str = "FunAudioLLM/CosyVoice2-0.5B",
+        response_format: Literal["mp3", "wav", "pcm", "opus"] = "pcm",
+        speed: float = 1.0,
+        gain: float = 0.0
+    ) -> Iterator[bytes]:
+        """
+        以流式模式合成，逐块返回音频数据（格式见 stream_format）
+
+        Args:
+            参数含义同 text_to_speech
+
+        Yields:
+            bytes: 音频数据块
+
+        Raises:
+            httpx.HTTPError: 网络请求失败
+            TTSProviderError: API 返回错误状态
+        """
+        payload = self._build_payload(text, voice_name, model, response_format, speed, gain, True)
+        client = http_clients.get_sync_client(self.engine_name)
+        with client.stream("POST", self.base_url, json=payload, headers=self.headers) as response:
+            # 检查响应状态（出错时读取响应体以便输出错误信息）
+            if response.is_error:
+                response.read()
+            raise_for_response(self.engine_name, response)
+            yield from response.iter_bytes(chunk_size=8192)
+
+    async def astream_audio(
+        self,
+        text: str,
+        voice_name: str = "anna",
+        model: str = "FunAudioLLM/CosyVoice2-0.5B",
+        response_format: Literal["mp3", "wav", "pcm", "opus"] = "pcm",
+        speed: float = 1.0,
+        gain: float = 0.0
+    ) -> AsyncIterator[bytes]:
+        """
+        stream_audio 的异步版本，使用共享的异步连接池
+
+        pcm 数据块可以直接拼接播放，对谈流式输出时边接收边转发给客户端。
+        """
+        payload = self._build_payload(text, voice_name, model, response_format, speed, gain, True)
+        client = http_clients.get_async_client(self.engine_name)
+        async with client.stream("POST", self.base_url, json=payload, headers=self.headers) as response:
+            if response.is_error:
+                await response.aread()
+            raise_for_response(self.engine_name, response)
+            async for chunk in response.aiter_bytes(chunk_size=8192):
+                yield chunk
+
+    @observe_synthesis
+    def synthesize(
+        self,
+        text: str,
+        voice_name: str = "anna",
+        model: str = "FunAudioLLM/CosyVoice2-0.5B",
+        response_format: Literal["mp3", "wav", "pcm", "opus"] = "wav",
+        speed: float = 1.0,
+        gain: float = 0.0,
+        stream: bool = False
+    ) -> Tuple[bytes, str]:
+        """
+        将文本转换为语音，直接返回音频数据
+
+        Args:
+            参数含义同 text_to_speech
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 音频格式)
+
+        Raises:
+            httpx.HTTPError: 网络请求失败
+            TTSProviderError: API 返回错误状态
+        """
+        # 发送请求
+        if stream:
+            audio_data = b"".join(self.stream_audio(text, voice_name, model, response_format, speed, gain))
+        else:
+            payload = self._build_payload(text, voice_name, model, response_format, speed, gain, stream)
+            client = http_clients.get_sync_client(self.engine_name)
+            response = client.post(self.base_url, json=payload, headers=self.headers)
+            # 检查响应状态
+            raise_for_response(self.engine_name, response)
+            audio_data = response.content
+            
+        return audio_data, self.stream_format(response_format)
+
+    @observe_synthesis
+    async def asynthesize(
+        self,
+        text: str,
+        voice_name: str = "anna",
+        model: str = "FunAudioLLM/CosyVoice2-0.5B",
+        response_format: Literal["mp3", "wav", "pcm", "opus"] = "wav",
+        speed: float = 1.0,
+        gain: float = 0.0,
+        stream: bool = False
+    ) -> Tuple[bytes, str]:
+        """
+        synthesize 的异步版本，使用共享的异步连接池
+
+        Returns:
+            Tuple[bytes, str]: (音频数据, 音频格式)
+
+        Raises:
+            httpx.HTTPError: 网络请求失败
+            TTSProviderError: API 返回错误状态
+        """
+        if stream:
+            audio_data = b"".join([
+                chunk async for chunk in self.astream_audio(text, voice_name, model, response_format, speed, gain)
+            ])
+        else:
+            payload = self._build_payload(text, voice_name, model, response_format, speed, gain, stream)
+            client = http_clients.get_async_client(self.engine_name)
+            response = await client.post(self.base_url, json=payload, headers=self.headers)
+            raise_for_response(self.engine_name, response)
+            audio_data = response.content
+
+        return audio_data, self.stream_format(response_format)
+
     def text_to_speech(
         self,
         text: str,
@@ -92,57 +270,21 @@ class SiliconFlowTTS:
         Returns:
             bool: 转换是否成功
         """
-        # 参数验证
-        if not (0.25 <= speed <= 4.0):
-            raise ValueError("speed must be between 0.25 and 4.0")
-        if not (-10 <= gain <= 10):
-            raise ValueError("gain must be between -10 and 10")
-        
-        # 预处理文本
-        processed_text = self._preprocess_text(text)
-            
-        # 构建完整的语音名称
-        full_voice_name = f"{model}:{voice_name}"
-        
-        # 构建请求参数
-        payload = {
-            "model": model,
-            "voice": full_voice_name,
-            "input": processed_text,
-            "response_format": response_format,
-            "stream": stream,
-            "speed": speed,
-            "gain": gain
-        }
-
         try:
-            # 发送请求
-            response = requests.post(
-                self.base_url,
-                json=payload,
-                headers=self.headers,
-                stream=stream
+            audio_data, _ = self.synthesize(
+                text, voice_name, model, response_format, speed, gain, stream
             )
             
-            # 检查响应状态
-            response.raise_for_status()
-            
             # 将响应内容写入文件
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            if stream:
-                with open(output_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-            else:
-                with open(output_path, 'wb') as f:
-                    f.write(response.content)
+            with open(output_path, 'wb') as f:
+                f.write(audio_data)
                     
             return True
             
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, TTSProviderError) as e:
             print(f"Error occurred during API call: {e}")
             if hasattr(e, 'response') and e.response is not None and hasattr(e.response, 'text'):
                 print(f"API response: {e.response.text}")
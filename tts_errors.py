@@ -0,0 +1,89 @@
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import httpx
+
+# 可以重试的 HTTP 状态码：超时、限流和服务端错误
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# MiniMax 在 HTTP 200 的响应体 base_resp 中返回业务错误码，这里映射为等价的 HTTP 状态码
+MINIMAX_STATUS_CODES = {
+    1000: 503,  # 未知错误
+    1001: 504,  # 超时
+    1002: 429,  # 触发 RPM 限流
+    1004: 401,  # 鉴权失败
+    1008: 402,  # 余额不足
+    1013: 503,  # 服务内部错误
+    1039: 429,  # 触发 TPM 限流
+    2013: 400,  # 参数错误
+}
+
+class TTSProviderError(RuntimeError):
+    """TTS 服务商返回的错误"""
+
+    def __init__(
+        self,
+        engine: str,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None
+    ):
+        """
+        Args:
+            engine: 引擎名称
+            message: 错误信息
+            status_code: HTTP 状态码（MiniMax 业务错误码已映射为等价的 HTTP 状态码）
+            retry_after: 服务商要求的重试等待时间(秒)
+        """
+        super().__init__(f"{engine} API Error ({status_code}): {message}")
+        self.engine = engine
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def throttled(self) -> bool:
+        """是否为限流错误"""
+        return self.status_code == 429
+
+    @property
+    def retryable(self) -> bool:
+        """是否值得重试"""
+        return self.status_code in RETRYABLE_STATUS_CODES
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头
+
+    Args:
+        value: 秒数或 HTTP 日期
+
+    Returns:
+        Optional[float]: 需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def raise_for_response(engine: str, response: httpx.Response):
+    """
+    响应状态为 4xx/5xx 时抛出 TTSProviderError（调用前需已读取响应体）
+
+    Args:
+        engine: 引擎名称
+        response: HTTP 响应
+    """
+    if response.is_success:
+        return
+    raise TTSProviderError(
+        engine,
+        response.text,
+        status_code=response.status_code,
+        retry_after=parse_retry_after(response.headers.get("Retry-After"))
+    )
@@ -1,17 +1,26 @@
-from typing import Union, List, Dict, Optional
+import threading
+from typing import Union, List, Dict, Optional, Tuple, Any
 from tts_api import SiliconFlowTTS
 from aliyun_tts import AliyunCosyVoiceTTS
 from minimax_tts import MiniMaxTTS
 from elevenlabs_tts import ElevenLabsTTS
+from mock_tts import MockTTS
 from config_manager import config_manager  # 使用新的配置管理器
 
 class TTSFactory:
-    """TTS工厂类，负责创建不同的TTS客户端实例"""
+    """TTS工厂类，负责创建和复用不同的TTS客户端实例"""
     
-    @staticmethod
-    def create_tts(engine: Optional[str] = None) -> Union[SiliconFlowTTS, AliyunCosyVoiceTTS, MiniMaxTTS, ElevenLabsTTS]:
+    # 已创建的客户端实例: (引擎名称, 配置版本号) -> 实例
+    _instances: Dict[Tuple[str, int], Any] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def create_tts(cls, engine: Optional[str] = None) -> Union[SiliconFlowTTS, AliyunCosyVoiceTTS, MiniMaxTTS, ElevenLabsTTS]:
         """
-        创建TTS客户端实例
+        获取TTS客户端实例
+        
+        同一引擎在配置未变化时复用同一个实例；保存设置后配置版本号增加，
+        下次调用时按新配置重建。正在进行的渲染继续使用已取得的旧实例。
         
         Args:
             engine: TTS引擎名称，如果不指定则使用默认引擎
@@ -19,9 +28,28 @@ class TTSFactory:
         Returns:
             TTS客户端实例
         """
+        # 先取版本号再取配置：两者之间配置被更新时，新配置的实例只会记在旧版本号下
+        version = config_manager.version
         config = config_manager.get_config()
         engine = engine or config.DEFAULT_TTS_ENGINE
+        
+        with cls._lock:
+            tts = cls._instances.get((engine, version))
+        if tts is not None:
+            return tts
+        
+        tts = cls._build_tts(engine, config)
+        with cls._lock:
+            # 丢弃该引擎旧版本的实例
+            for key in [key for key in cls._instances if key[0] == engine and key[1] != version]:
+                del cls._instances[key]
+            return cls._instances.setdefault((engine, version), tts)
+    
+    @staticmethod
+    def _build_tts(engine: str, config) -> Union[SiliconFlowTTS, AliyunCosyVoiceTTS, MiniMaxTTS, ElevenLabsTTS]:
+        """按配置创建新的TTS客户端实例"""
         api_keys = config.API_KEYS # 获取 API Keys 配置
+        base_urls = config.PROVIDER_BASE_URLS
         
         if engine == "minimax":
             # MiniMaxTTS 内部会自行读取配置，无需传递参数
@@ -31,13 +59,45 @@ class TTSFactory:
             raise NotImplementedError("阿里云TTS暂未实现")
         elif engine == "elevenlabs":
             # 传递 ElevenLabs API Key (配置正确)
-            return ElevenLabsTTS(api_key=api_keys.elevenlabs)
+            return ElevenLabsTTS(api_key=api_keys.elevenlabs, base_url=base_urls.elevenlabs)
         elif engine == "siliconflow":
             # 传递 SiliconFlow API Key (已修正)
-            return SiliconFlowTTS(api_key=api_keys.siliconflow_api_key)
+            return SiliconFlowTTS(api_key=api_keys.siliconflow_api_key, base_url=base_urls.siliconflow)
+        elif engine == "mock":
+            # 本地模拟引擎，用于压测和离线开发
+            return MockTTS()
         else:
             raise ValueError(f"不支持的TTS引擎: {engine}")
             
+    @staticmethod
+    def create_failover(engine: str, tts_params: Dict) -> Optional[Tuple[Any, Dict]]:
+        """
+        按 RESILIENCE.failover 配置创建备用引擎及对应的合成参数
+        
+        Args:
+            engine: 合成失败的主引擎名称
+            tts_params: 主引擎的合成参数
+            
+        Returns:
+            Optional[Tuple[Any, Dict]]: (备用TTS客户端, 合成参数)，未配置备用引擎时返回 None
+        """
+        failover = config_manager.get_config().RESILIENCE.failover.get(engine)
+        if failover is None or failover.engine == engine:
+            return None
+        
+        tts = TTSFactory.create_tts(failover.engine)
+        params = {key: tts_params[key] for key in ("text", "speed", "response_format") if key in tts_params}
+        voice = tts_params.get("voice_name")
+        params["voice_name"] = failover.voices.get(voice) or failover.default_voice or voice
+        if failover.model:
+            params["model"] = failover.model
+        if failover.engine == "elevenlabs":
+            # ElevenLabs 特有参数只在备用引擎也是 ElevenLabs 时保留
+            for key in ("stability", "similarity_boost"):
+                if key in tts_params:
+                    params[key] = tts_params[key]
+        return tts, params
+            
     @staticmethod
     def get_voices_for_ui(engine: str) -> List[Dict]:
         """
@@ -49,6 +109,6 @@ class TTSFactory:
         Returns:
             音色列表，包含id和name
         """
-        # 这里创建实例时也需要传递 API Key，否则 get_voices_for_ui 内部可能失败
+        # 音色表是静态数据，直接使用复用的实例，不再为此新建客户端
         tts = TTSFactory.create_tts(engine)
         return tts.get_voices_for_ui() 
\ No newline at end of file
@@ -1,8 +1,10 @@
 import os
-import requests
+import httpx
 import argparse
 import base64
 from pathlib import Path
+from http_clients import http_clients
+from voice_catalog import register_custom_voice
 
 def encode_audio_to_base64(audio_file_path):
     """将音频文件转换为base64编码"""
@@ -34,10 +36,11 @@ def upload_voice_file(api_key, audio_file_path, custom_name, text_content, model
     }
     
     try:
-        response = requests.post(url, headers=headers, files=files, data=data)
+        client = http_clients.get_sync_client("siliconflow")
+        response = client.post(url, headers=headers, files=files, data=data)
         response.raise_for_status()  # 检查响应状态
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"上传失败: {str(e)}")
         return None
     finally:
@@ -64,10 +67,11 @@ def upload_voice_base64(api_key, audio_file_path, custom_name, text_content, mod
     }
     
     try:
-        response = requests.post(url, headers=headers, json=data)
+        client = http_clients.get_sync_client("siliconflow")
+        response = client.post(url, headers=headers, json=data)
         response.raise_for_status()  # 检查响应状态
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"上传失败: {str(e)}")
         return None
 
@@ -90,6 +94,8 @@ def main():
     if result:
         print("上传成功！")
         print(f"音色URI: {result.get('uri')}")
+        # 登记到本地音色目录，服务端的 /api/voices 会自动包含该音色
+        register_custom_voice("siliconflow", result.get('uri'), args.name, model=args.model, text=args.text)
     else:
         print("上传失败！")
 
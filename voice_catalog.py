@@ -0,0 +1,259 @@
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from config_manager import config_manager, BASE_DIR
+from http_clients import http_clients
+from tts_factory import TTSFactory
+from tts_errors import raise_for_response
+
+ENGINES = ("siliconflow", "minimax", "elevenlabs", "aliyun", "mock")
+
+# 未配置 PROVIDER_BASE_URLS 时使用的官方接口根地址
+DEFAULT_BASE_URLS = {
+    "elevenlabs": "https://api.elevenlabs.io/v1",
+    "siliconflow": "https://api.siliconflow.cn/v1",
+    "minimax": "https://api.minimax.chat/v1",
+}
+
+def _base_url(engine: str) -> str:
+    """服务商接口根地址，与各TTS客户端一样优先使用 PROVIDER_BASE_URLS 中的配置"""
+    base_url = getattr(config_manager.get_config().PROVIDER_BASE_URLS, engine) or DEFAULT_BASE_URLS[engine]
+    return base_url.rstrip("/")
+
+def _elevenlabs_voices_url() -> str:
+    """ElevenLabs 的音色列表使用 v2 接口，将根地址末尾的 /v1 换成 /v2"""
+    base_url = _base_url("elevenlabs")
+    if base_url.endswith("/v1"):
+        base_url = base_url[:-len("/v1")]
+    return f"{base_url}/v2/voices"
+
+def _resolve_path(path: str) -> Path:
+    path = Path(path)
+    return path if path.is_absolute() else BASE_DIR / path
+
+def load_custom_voices(path: Optional[str] = None) -> List[Dict]:
+    """
+    读取本地自定义音色登记表
+
+    Args:
+        path: 登记表路径，默认取 VOICE_CATALOG.custom_voices_path
+
+    Returns:
+        List[Dict]: 音色列表，每项包含 engine、id、name
+    """
+    registry = _resolve_path(path or config_manager.get_config().VOICE_CATALOG.custom_voices_path)
+    if not registry.exists():
+        return []
+    try:
+        with open(registry, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取自定义音色登记表出错: {e}")
+        return []
+
+def register_custom_voice(engine: str, voice_id: str, name: str, path: Optional[str] = None, **extra):
+    """
+    在本地登记表中添加或更新一个自定义音色（upload_voice.py 上传成功后调用）
+
+    Args:
+        engine: 引擎名称
+        voice_id: 合成时使用的音色ID（SiliconFlow 为上传返回的 uri）
+        name: 显示名称
+        path: 登记表路径，默认取 VOICE_CATALOG.custom_voices_path
+        extra: 其他需要保存的信息，如 model、text
+    """
+    registry = _resolve_path(path or config_manager.get_config().VOICE_CATALOG.custom_voices_path)
+    voices = [v for v in load_custom_voices(str(registry)) if (v.get("engine"), v.get("id")) != (engine, voice_id)]
+    voices.append({"engine": engine, "id": voice_id, "name": name, "created_at": time.time(), **extra})
+    registry.parent.mkdir(parents=True, exist_ok=True)
+    # 先写临时文件再替换，避免服务端读到写了一半的文件
+    temp_path = registry.with_suffix(registry.suffix + ".tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(voices, f, indent=4, ensure_ascii=False)
+    temp_path.replace(registry)
+
+def _has_api_key(tts: Any) -> bool:
+    """是否配置了真实的 API Key（忽略示例配置中的占位符）"""
+    api_key = getattr(tts, "api_key", None)
+    return bool(api_key) and not api_key.startswith("your_")
+
+async def _fetch_elevenlabs(tts: Any, page_size: int) -> List[Dict]:
+    """分页获取 ElevenLabs 账号下的全部音色（v2 接口按游标翻页）"""
+    client = http_clients.get_async_client("elevenlabs")
+    voices = []
+    params = {"page_size": page_size, "include_total_count": False}
+    while True:
+        response = await client.get(_elevenlabs_voices_url(), headers=tts.headers, params=params)
+        raise_for_response("elevenlabs", response)
+        data = response.json()
+        for voice in data.get("voices", []):
+            category = voice.get("category")
+            voices.append({
+                "id": voice["voice_id"],
+                "name": f"{voice['name']} - {category}" if category else voice["name"]
+            })
+        if not data.get("has_more") or not data.get("next_page_token"):
+            return voices
+        params["next_page_token"] = data["next_page_token"]
+
+async def _fetch_siliconflow(tts: Any, page_size: int) -> List[Dict]:
+    """获取 SiliconFlow 账号下上传的自定义音色"""
+    client = http_clients.get_async_client("siliconflow")
+    response = await client.get(f"{_base_url('siliconflow')}/audio/voice/list", headers=tts.headers)
+    raise_for_response("siliconflow", response)
+    return [
+        {"id": voice["uri"], "name": voice.get("customName") or voice["uri"]}
+        for voice in response.json().get("result", [])
+    ]
+
+async def _fetch_minimax(tts: Any, page_size: int) -> List[Dict]:
+    """获取 MiniMax 的系统音色、复刻音色和生成音色"""
+    client = http_clients.get_async_client("minimax")
+    response = await client.post(
+        f"{_base_url('minimax')}/get_voice?GroupId={tts.group_id}", json={"voice_type": "all"}, headers=tts.headers
+    )
+    raise_for_response("minimax", response)
+    data = response.json()
+    voices = []
+    for voice_type in ("system_voice", "voice_cloning", "voice_generation"):
+        for voice in data.get(voice_type) or []:
+            voices.append({"id": voice["voice_id"], "name": voice.get("voice_name") or voice["voice_id"]})
+    return voices
+
+REMOTE_FETCHERS = {
+    "elevenlabs": _fetch_elevenlabs,
+    "siliconflow": _fetch_siliconflow,
+    "minimax": _fetch_minimax,
+}
+
+class VoiceCatalog:
+    """合并预设音色、服务商账号音色和本地自定义音色的音色目录，在后台定期刷新"""
+
+    def __init__(self):
+        self._remote: Dict[str, List[Dict]] = {}  # engine -> 最近一次成功获取的远程音色
+        self._entries: Dict[str, Tuple[List[Dict], str]] = {}  # engine -> (合并后的音色列表, ETag)
+        self._custom_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_refresh: Optional[float] = None
+        self.errors: Dict[str, str] = {}
+
+    def _custom_changed(self) -> bool:
+        """自定义音色登记表是否在上次合并后被修改过"""
+        registry = _resolve_path(config_manager.get_config().VOICE_CATALOG.custom_voices_path)
+        mtime = registry.stat().st_mtime if registry.exists() else None
+        if mtime != self._custom_mtime:
+            self._custom_mtime = mtime
+            return True
+        return False
+
+    @staticmethod
+    def _presets(engine: str) -> List[Dict]:
+        try:
+            return TTSFactory.get_voices_for_ui(engine)
+        except NotImplementedError:
+            return []
+        except Exception as e:
+            print(f"获取 {engine} 预设音色出错: {e}")
+            return []
+
+    def _build(self, engine: str, custom: List[Dict]) -> Tuple[List[Dict], str]:
+        """合并三类音色（按音色ID去重，自定义音色优先），并计算 ETag"""
+        voices: Dict[str, Dict] = {}
+        for source, items in (
+            ("custom", [v for v in custom if v.get("engine") == engine]),
+            ("remote", self._remote.get(engine, [])),
+            ("preset", self._presets(engine))
+        ):
+            for voice in items:
+                voices.setdefault(voice["id"], {"id": voice["id"], "name": voice["name"], "source": source})
+        result = list(voices.values())
+        body = json.dumps(result, ensure_ascii=False, sort_keys=True)
+        etag = '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:16] + '"'
+        return result, etag
+
+    def _rebuild_all(self):
+        custom = load_custom_voices()
+        entries = {engine: self._build(engine, custom) for engine in ENGINES}
+        with self._lock:
+            self._entries = entries
+
+    def get(self, engine: str) -> Tuple[List[Dict], str]:
+        """
+        获取指定引擎的音色列表
+
+        Args:
+            engine: 引擎名称
+
+        Returns:
+            Tuple[List[Dict], str]: (音色列表, ETag)
+        """
+        if self._custom_changed():
+            self._rebuild_all()
+        with self._lock:
+            entry = self._entries.get(engine)
+        if entry is None:
+            entry = self._build(engine, load_custom_voices())
+            with self._lock:
+                self._entries[engine] = entry
+        return entry
+
+    async def refresh(self):
+        """并发获取各引擎的远程音色，失败的引擎保留上一次的结果"""
+        page_size = config_manager.get_config().VOICE_CATALOG.page_size
+
+        async def fetch(engine: str):
+            try:
+                tts = TTSFactory.create_tts(engine)
+                if not _has_api_key(tts):
+                    return
+                self._remote[engine] = await REMOTE_FETCHERS[engine](tts, page_size)
+                self.errors.pop(engine, None)
+            except Exception as e:
+                self.errors[engine] = str(e)
+                print(f"刷新 {engine} 音色列表出错: {e}")
+
+        await asyncio.gather(*(fetch(engine) for engine in REMOTE_FETCHERS))
+        self.last_refresh = time.time()
+        self._custom_changed()
+        self._rebuild_all()
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(config_manager.get_config().VOICE_CATALOG.refresh_minutes * 60)
+
+    def start(self):
+        """启动后台刷新（需在事件循环中调用）"""
+        if not config_manager.get_config().VOICE_CATALOG.remote:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """停止后台刷新"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各引擎的音色数量、上次刷新时间和出错信息"""
+        with self._lock:
+            counts = {engine: len(entry[0]) for engine, entry in self._entries.items()}
+        return {
+            "voices": counts,
+            "remote": {engine: len(voices) for engine, voices in self._remote.items()},
+            "last_refresh": self.last_refresh,
+            "errors": dict(self.errors)
+        }
+
+# 创建全局音色目录实例
+voice_catalog = VoiceCatalog()